@@ -0,0 +1,67 @@
+"""
+Throughput of the vectorized batch cost engine versus the per-call path.
+
+    python benchmarks/bench_batch.py [records]
+"""
+import random
+import sys
+import time
+
+from openai_usage.accumulator import UsageDict
+from openai_usage.batch_costs import price_batch, price_columns, to_columns
+from openai_usage.usage import _accumulate, _usage_items
+
+MODELS = ["gpt-4o", "gpt-4o-mini", "o3", "gpt-4.1", "gpt-4.1-nano", "o4-mini-2025-04-16"]
+
+
+def make_records(n):
+    rng = random.Random(0)
+    return [
+        {
+            "model": rng.choice(MODELS),
+            "usage": {
+                "input_tokens": rng.randint(0, 20_000),
+                "input_tokens_details": {"cached_tokens": rng.randint(0, 1000)},
+                "output_tokens": rng.randint(0, 4000),
+                "total_tokens": 0,
+            },
+        }
+        for _ in range(n)
+    ]
+
+
+def _rate(n, seconds):
+    return f"{n / seconds:14,.0f} records/s  ({seconds:.3f} s)"
+
+
+def main(n: int = 1_000_000) -> None:
+    records = make_records(n)
+
+    start = time.perf_counter()
+    usage = UsageDict()
+    for record in records:
+        _accumulate(usage, _usage_items(record["usage"]), record["model"])
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = to_columns(records)
+    convert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    costs = price_columns(columns)
+    costs.totals_by_model()
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    price_batch(records).totals_by_model()
+    end_to_end = time.perf_counter() - start
+
+    print(f"records: {n}")
+    print(f"scalar path:            {_rate(n, scalar)}")
+    print(f"to_columns:             {_rate(n, convert)}")
+    print(f"price_columns + totals: {_rate(n, vectorized)}")
+    print(f"price_batch end to end: {_rate(n, end_to_end)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
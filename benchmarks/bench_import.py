@@ -0,0 +1,48 @@
+"""
+Import time of openai_usage, in fresh interpreters.
+
+Reports the cost of importing openai_usage.usage, of the first price lookup
+(which parses data/pricing.json), and, for comparison, of the SDK import the
+package used to pay eagerly.
+
+    python benchmarks/bench_import.py [runs]
+"""
+import subprocess
+import sys
+import time
+
+CASES = (
+    ("interpreter startup", "pass"),
+    ("import openai_usage.usage", "import openai_usage.usage"),
+    ("... + first price lookup", "import openai_usage.usage as u; u.get_model_price('gpt-4o')"),
+    ("openai ResponseUsage (old eager import)", "import openai.types.responses.response_usage"),
+)
+
+
+def _time(code: str, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(runs: int = 10) -> None:
+    baseline = None
+    for label, code in CASES:
+        elapsed = _time(code, runs)
+        if baseline is None:
+            baseline = elapsed
+            print(f"{label:42} {elapsed * 1e3:8.1f} ms")
+        else:
+            print(f"{label:42} {(elapsed - baseline) * 1e3:8.1f} ms on top of startup")
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, openai_usage.usage; print('openai' in sys.modules)"],
+        check=True, capture_output=True, text=True,
+    ).stdout.strip()
+    print(f"openai imported by openai_usage.usage: {loaded}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
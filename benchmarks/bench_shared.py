@@ -0,0 +1,76 @@
+"""
+Update cost of SharedUsage versus a multiprocessing.Manager dict.
+
+Both record the same per-model metrics for every call; the Manager dict
+does it the usual way, one proxied get/set per metric under a shared lock.
+
+    python benchmarks/bench_shared.py [calls]
+"""
+import multiprocessing
+import sys
+import time
+import uuid
+
+from openai_usage.shared import METRICS, SharedUsage
+from openai_usage.usage import CallRecord
+
+CALL = CallRecord("gpt-4o", "responses.create", 0.0, 120, 64, 48, 16, 0.00078, 0.4)
+
+
+def _time_shared(calls: int) -> float:
+    shared = SharedUsage(f"ou-bench-{uuid.uuid4().hex[:12]}")
+    try:
+        record = shared.record
+        start = time.perf_counter()
+        for _ in range(calls):
+            record(CALL)
+        elapsed = time.perf_counter() - start
+        assert shared.totals()["calls"] == calls
+        return elapsed
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def _time_manager(calls: int) -> float:
+    values = (1, CALL.input_tokens, CALL.cached_tokens, CALL.output_tokens,
+              CALL.reasoning_tokens, CALL.cost, CALL.latency)
+    with multiprocessing.Manager() as manager:
+        totals = manager.dict()
+        lock = manager.Lock()
+        start = time.perf_counter()
+        for _ in range(calls):
+            with lock:
+                for metric, value in zip(METRICS, values):
+                    key = (CALL.model, metric)
+                    totals[key] = totals.get(key, 0) + value
+        elapsed = time.perf_counter() - start
+        assert totals[(CALL.model, "calls")] == calls
+        return elapsed
+
+
+def _time_snapshot(repeat: int = 1000) -> float:
+    shared = SharedUsage(f"ou-bench-{uuid.uuid4().hex[:12]}")
+    try:
+        shared.record(CALL)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            shared.snapshot()
+        return (time.perf_counter() - start) / repeat
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def main(calls: int = 20_000) -> None:
+    shared = _time_shared(calls)
+    manager = _time_manager(calls)
+    print(f"calls: {calls}")
+    print(f"SharedUsage.record: {shared / calls * 1e6:10.3f} us/call")
+    print(f"Manager dict:       {manager / calls * 1e6:10.3f} us/call")
+    print(f"speedup:            {manager / shared:10.1f}x")
+    print(f"snapshot (256 shards): {_time_snapshot() * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,64 @@
+"""
+Per-call overhead of the OpenAIUsage wrapper.
+
+Times a dummy client returning a real ResponseUsage with and without the
+context manager and prints the difference per call.
+
+    python benchmarks/bench_wrap.py [calls]
+"""
+import sys
+import time
+
+from openai.types.responses.response_usage import ResponseUsage
+
+from openai_usage.usage import OpenAIUsage
+
+USAGE = ResponseUsage(
+    input_tokens=120,
+    input_tokens_details={"cached_tokens": 64},
+    output_tokens=48,
+    output_tokens_details={"reasoning_tokens": 16},
+    total_tokens=168,
+)
+
+
+class BenchResponse:
+    def __init__(self, usage):
+        self.usage = usage
+
+
+class BenchResponses:
+    def create(self, *args, **kwargs):
+        return BenchResponse(USAGE)
+
+    def parse(self, *args, **kwargs):
+        return BenchResponse(USAGE)
+
+
+class BenchClient:
+    def __init__(self):
+        self.responses = BenchResponses()
+
+
+def _time_calls(client, calls):
+    create = client.responses.create
+    start = time.perf_counter()
+    for _ in range(calls):
+        create(model="gpt-4o", input="hi")
+    return time.perf_counter() - start
+
+
+def main(calls: int = 200_000) -> None:
+    client = BenchClient()
+    raw = min(_time_calls(client, calls) for _ in range(3))
+    with OpenAIUsage(client):
+        wrapped = min(_time_calls(client, calls) for _ in range(3))
+    overhead_us = (wrapped - raw) / calls * 1e6
+    print(f"calls: {calls}")
+    print(f"raw call:      {raw / calls * 1e6:8.3f} us")
+    print(f"wrapped call:  {wrapped / calls * 1e6:8.3f} us")
+    print(f"overhead:      {overhead_us:8.3f} us/call")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,305 @@
+"""
+Offline benchmark suite for the usage wrapper, with JSON output.
+
+Measures per-call overhead, scope entry/exit, thread and asyncio scaling,
+memory per tracked call, import time, and the real OpenAI client against a
+local stub HTTP server. Lower is better for every number; only the
+*_per_second results are throughputs.
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --quick --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_wrap import USAGE, BenchClient
+
+from openai_usage.ledger import UsageLedger
+from openai_usage.usage import AsyncOpenAIUsage, OpenAIUsage
+
+DICT_USAGE = USAGE.model_dump()
+
+
+class DictResponses:
+    def create(self, *args, **kwargs):
+        return type("R", (), {"usage": DICT_USAGE})()
+
+    def parse(self, *args, **kwargs):
+        return self.create()
+
+
+class DictClient:
+    def __init__(self):
+        self.responses = DictResponses()
+
+
+class AsyncBenchResponses:
+    async def create(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        return type("R", (), {"usage": USAGE})()
+
+    async def parse(self, *args, **kwargs):
+        return await self.create()
+
+
+class AsyncBenchClient:
+    def __init__(self):
+        self.responses = AsyncBenchResponses()
+
+
+def _best(func: typing.Callable[[], float], repeat: int = 3) -> float:
+    return min(func() for _ in range(repeat))
+
+
+def _time_calls(client, calls: int) -> float:
+    create = client.responses.create
+    start = time.perf_counter()
+    for _ in range(calls):
+        create(model="gpt-4o", input="hi")
+    return time.perf_counter() - start
+
+
+def bench_overhead(calls: int) -> typing.Dict[str, float]:
+    """
+    Microseconds added per call, by usage type and nesting depth.
+    """
+    results = {}
+    for label, client in (("typed_usage", BenchClient()), ("dict_usage", DictClient())):
+        raw = _best(lambda: _time_calls(client, calls))
+        with OpenAIUsage(client):
+            wrapped = _best(lambda: _time_calls(client, calls))
+        results[f"overhead_{label}_us"] = (wrapped - raw) / calls * 1e6
+
+    client = BenchClient()
+    raw = _best(lambda: _time_calls(client, calls))
+    for depth in (5,):
+        scopes = [OpenAIUsage(client) for _ in range(depth)]
+        for scope in scopes:
+            scope.__enter__()
+        nested = _best(lambda: _time_calls(client, calls))
+        for scope in reversed(scopes):
+            scope.__exit__(None, None, None)
+        results[f"overhead_depth_{depth}_us"] = (nested - raw) / calls * 1e6
+
+    with OpenAIUsage(client, exact_costs=True):
+        exact = _best(lambda: _time_calls(client, calls))
+    results["overhead_exact_costs_us"] = (exact - raw) / calls * 1e6
+
+    with OpenAIUsage(client, sinks=[UsageLedger(calls * 3)]):
+        with_sink = _best(lambda: _time_calls(client, calls))
+    results["overhead_ledger_sink_us"] = (with_sink - raw) / calls * 1e6
+    return results
+
+
+def bench_scopes(scopes: int) -> typing.Dict[str, float]:
+    """
+    Microseconds to enter and exit an (outer, then nested) scope.
+    """
+    client = BenchClient()
+
+    def enter_exit() -> float:
+        start = time.perf_counter()
+        for _ in range(scopes):
+            with OpenAIUsage(client):
+                pass
+        return time.perf_counter() - start
+
+    results = {"scope_enter_exit_us": _best(enter_exit) / scopes * 1e6}
+    with OpenAIUsage(client):
+        results["nested_scope_enter_exit_us"] = _best(enter_exit) / scopes * 1e6
+    return results
+
+
+def bench_threads(calls: int) -> typing.Dict[str, float]:
+    """
+    Wrapped calls per second with 1..8 threads sharing one client and scope.
+    """
+    results = {}
+    client = BenchClient()
+    for threads in (1, 2, 4, 8):
+        per_thread = calls // threads
+
+        def run() -> float:
+            with OpenAIUsage(client) as usage:
+                start = time.perf_counter()
+                with ThreadPoolExecutor(threads) as pool:
+                    for f in [pool.submit(_time_calls, client, per_thread) for _ in range(threads)]:
+                        f.result()
+                elapsed = time.perf_counter() - start
+            assert usage["input_tokens"] == USAGE.input_tokens * per_thread * threads
+            return elapsed
+
+        results[f"threads_{threads}_calls_per_second"] = per_thread * threads / _best(run)
+    return results
+
+
+def bench_tasks(calls: int) -> typing.Dict[str, float]:
+    """
+    Wrapped calls per second with 1..100 asyncio tasks, each in its own scope.
+    """
+    results = {}
+    client = AsyncBenchClient()
+
+    async def task(n: int) -> None:
+        async with AsyncOpenAIUsage(client):
+            for _ in range(n):
+                await client.responses.create(model="gpt-4o", input="hi")
+
+    for tasks in (1, 10, 100):
+        per_task = calls // tasks
+
+        async def main() -> float:
+            start = time.perf_counter()
+            await asyncio.gather(*(task(per_task) for _ in range(tasks)))
+            return time.perf_counter() - start
+
+        results[f"tasks_{tasks}_calls_per_second"] = per_task * tasks / _best(lambda: asyncio.run(main()))
+    return results
+
+
+def bench_memory(calls: int) -> typing.Dict[str, float]:
+    """
+    Bytes retained per call: the usage dict alone should retain nothing.
+    """
+    results = {}
+    for label, sinks in (("usage_dict", ()), ("ledger", (UsageLedger(calls),))):
+        client = BenchClient()
+        with OpenAIUsage(client, sinks=sinks):
+            _time_calls(client, 100)  # warm up shards and lookup caches
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            _time_calls(client, calls)
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        grown = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        results[f"memory_{label}_bytes_per_call"] = max(grown, 0) / calls
+    return results
+
+
+def bench_import(repeat: int) -> typing.Dict[str, float]:
+    """
+    Milliseconds to import openai_usage.usage in a fresh interpreter, on
+    top of interpreter startup.
+    """
+    def run(code: str) -> float:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        return time.perf_counter() - start
+
+    baseline = min(run("pass") for _ in range(repeat))
+    package = min(run("import openai_usage.usage") for _ in range(repeat))
+    return {"import_ms": (package - baseline) * 1e3}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    body = json.dumps({
+        "id": "resp_1", "object": "response", "created_at": 0, "model": "gpt-4o",
+        "status": "completed", "output": [], "parallel_tool_calls": False, "tool_choice": "auto",
+        "tools": [], "usage": DICT_USAGE,
+    }).encode()
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def bench_http(calls: int) -> typing.Dict[str, float]:
+    """
+    Per-call time of the real OpenAI client against a local stub server,
+    bare, wrapped, and with transport interception.
+    """
+    from openai import OpenAI
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = OpenAI(api_key="bench", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0)
+
+        def run() -> float:
+            start = time.perf_counter()
+            for _ in range(calls):
+                client.responses.create(model="gpt-4o", input="hi")
+            return (time.perf_counter() - start) / calls * 1e6
+
+        run()  # open the connection
+        results = {"http_bare_us": _best(run)}
+        with OpenAIUsage(client):
+            results["http_wrapped_us"] = _best(run)
+        with OpenAIUsage(client, transport=True):
+            results["http_transport_us"] = _best(run)
+        results["http_transport_idle_us"] = _best(run)  # hook installed, no scope
+        return results
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_suite(quick: bool = False) -> typing.Dict[str, typing.Any]:
+    scale = 10 if quick else 1
+    results: typing.Dict[str, float] = {}
+    results.update(bench_overhead(100_000 // scale))
+    results.update(bench_scopes(20_000 // scale))
+    results.update(bench_threads(80_000 // scale))
+    results.update(bench_tasks(40_000 // scale))
+    results.update(bench_memory(50_000 // scale))
+    results.update(bench_import(3 if quick else 10))
+    results.update(bench_http(2_000 // scale))
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def compare(current: typing.Dict[str, float], baseline: typing.Dict[str, float]) -> typing.List[str]:
+    lines = []
+    for key, value in current.items():
+        old = baseline.get(key)
+        if old:
+            lines.append(f"{key:42} {old:14.3f} -> {value:14.3f}  ({(value - old) / old * 100:+6.1f}%)")
+    return lines
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare against")
+    parser.add_argument("--quick", action="store_true", help="run a tenth of the iterations")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.quick)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print("\n".join(compare(report["results"], baseline)))
+    else:
+        for key, value in report["results"].items():
+            print(f"{key:42} {value:14.3f}")
+
+
+if __name__ == "__main__":
+    main()
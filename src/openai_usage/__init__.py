@@ -1,2 +1,6 @@
 def main() -> None:
-    print("Hello from openai-usage!")
+    import sys
+
+    from .cli import main as cli_main
+
+    sys.exit(cli_main())
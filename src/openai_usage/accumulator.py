@@ -0,0 +1,481 @@
+import threading
+import typing
+from decimal import Decimal
+
+from .model_costs import NANODOLLARS_PER_USD
+
+# Closed children kept per node for tree() and folded(), by name; beyond
+# that, closed scopes are summarized under OTHER_SCOPES.
+MAX_CLOSED_CHILDREN = 256
+OTHER_SCOPES = "(other)"
+
+# Keys that dicts with exact costs accumulate as integer nano-dollars
+EXACT_COST_KEYS = frozenset((
+    "cost_input_tokens", "cost_input_cached_tokens", "cost_output_tokens", "cost_total", "cost",
+))
+
+
+def _add_nanos(nanos: typing.Dict[str, int], key: str, value: int) -> float:
+    """
+    Adds value to an integer total and returns the new total in dollars.
+    """
+    total = nanos[key] = nanos.get(key, 0) + value
+    return total / NANODOLLARS_PER_USD
+
+
+def _add_counts(into: typing.Dict[str, float], counts: typing.Mapping[str, float]) -> None:
+    for k, v in counts.items():
+        into[k] = into.get(k, 0) + v
+
+
+def _add_closed(closed: typing.Dict[typing.Optional[str], typing.Dict[str, typing.Any]],
+                summary: typing.Dict[str, typing.Any]) -> None:
+    """
+    Adds the summary of a closed scope to its parent's, merging it with
+    earlier scopes of the same name.
+    """
+    name = summary["name"]
+    if name not in closed and name != OTHER_SCOPES and len(closed) >= MAX_CLOSED_CHILDREN - 1:
+        name = OTHER_SCOPES
+        summary = dict(summary, name=name)
+    existing = closed.get(name)
+    if existing is None:
+        closed[name] = summary
+        return
+    existing["scopes"] += summary["scopes"]
+    _add_counts(existing["totals"], summary["totals"])
+    _add_counts(existing["own"], summary["own"])
+    for child in summary["children"].values():
+        _add_closed(existing["children"], child)
+
+
+def _copy_summary(summary: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    return dict(
+        summary,
+        totals=dict(summary["totals"]),
+        own=dict(summary["own"]),
+        children={name: _copy_summary(child) for name, child in summary["children"].items()},
+    )
+
+
+def _summary_tree(summary: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    return {
+        "name": summary["name"],
+        "scopes": summary["scopes"],
+        "totals": dict(summary["totals"]),
+        "children": [_summary_tree(child) for child in summary["children"].values()],
+    }
+
+
+def _fold_summary(summary: typing.Dict[str, typing.Any], stack: typing.Tuple[str, ...], metric: str,
+                  scale: float, lines: typing.List[str]) -> None:
+    stack = stack + ((summary["name"] or "scope").replace(";", "_"),)
+    value = round(summary["own"].get(metric, 0) * scale)
+    if value:
+        lines.append(f"{';'.join(stack)} {value}")
+    for child in summary["children"].values():
+        _fold_summary(child, stack, metric, scale, lines)
+
+
+class _Shard:
+    """
+    Per-thread counters. Only the owning thread writes to them; the lock is
+    uncontended except while the shards are being folded into the dict.
+    """
+    __slots__ = ("counts", "lock")
+
+    def __init__(self) -> None:
+        self.counts: typing.Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+
+class UsageDict(dict):
+    """
+    Dict of usage totals that is safe to update from many threads at once.
+
+    Each call's counts go to a shard of the writing thread (add()), so
+    concurrent calls never do unsynchronized read-modify-writes on shared
+    keys and never wait for each other. Right after writing, a thread folds
+    the shards into the dict's storage if the dict's lock is free; if it is
+    not, the thread holding it folds them when it is done folding, or the
+    next call or read does. So the storage is also current for readers that
+    bypass the dict's methods (json.dumps, dict.get(usage, ...)), except for
+    calls landing while another thread reads the dict. Writes through the
+    dict methods keep the exact totals below in step.
+
+    Nested scopes form a tree of UsageDicts (see child()): every dict holds
+    the totals of its whole subtree, own() the part recorded at the node
+    itself. Counts of open children are rolled up when the parent is read
+    through its methods. A closed child (close()) hands its counts to the
+    parent and leaves the tree; the parent keeps a summary per child name,
+    so long-lived roots stay cheap to read however many scopes they saw.
+
+    With exact set, writers add the cost keys as integer nano-dollars. They
+    are summed as integers, so totals do not drift and do not depend on the
+    order calls were merged in, and only converted to float dollars in the
+    dict; exact_total() returns them as a Decimal.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._local = threading.local()
+        self._shards: typing.List[_Shard] = []
+        self._merge_lock = threading.Lock()
+        self.name: typing.Optional[str] = None
+        self.parent: typing.Optional["UsageDict"] = None
+        self.children: typing.List["UsageDict"] = []
+        self.closed = False
+        self._detached = False
+        self._closed_children: typing.Dict[typing.Optional[str], typing.Dict[str, typing.Any]] = {}
+        self.exact = False
+        self._dirty = False
+        self._nanos: typing.Dict[str, int] = {}
+        # Counts rolled up from the children, and counts not yet rolled up
+        # into the parent, in the units written (nano-dollars for exact costs)
+        self._from_children: typing.Dict[str, float] = {}
+        self._pending: typing.Dict[str, float] = {}
+
+    def child(self, name: typing.Optional[str] = None) -> "UsageDict":
+        """
+        Returns a new, empty node below this one. Counts written to the child
+        are rolled up into this dict (and its ancestors) when they are read,
+        so writers only ever touch the innermost node.
+        """
+        node = UsageDict()
+        node.name = name
+        node.parent = self
+        node.exact = self.exact
+        with self._merge_lock:
+            self.children.append(node)
+        return node
+
+    def shard(self) -> _Shard:
+        """
+        Returns the calling thread's shard, creating it on first use.
+        """
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            # list.append is atomic; taking the merge lock here would make
+            # a new writer wait for it
+            self._shards.append(shard)
+            return shard
+
+    def add(self, counts: typing.Mapping[str, float]) -> None:
+        """
+        Adds one call's counts to the dict if its lock is free, and otherwise
+        to the calling thread's shard, for the lock's holder to fold in.
+        """
+        lock = self._merge_lock
+        if lock.acquire(blocking=False):
+            try:
+                forward = self._apply_locked(counts, from_child=False)
+            finally:
+                lock.release()
+            if forward:
+                self.parent._apply(counts, from_child=True)
+            if self._dirty:
+                self._fold_shards()
+            return
+        shard = self.shard()
+        with shard.lock:
+            _add_counts(shard.counts, counts)
+        # Set after the write: whoever folds next clears it before reading
+        # the shards, so a count can never be left behind unflagged
+        self._dirty = True
+        self._fold_shards()
+
+    def _fold_shards(self, wait: bool = False) -> None:
+        """
+        Folds the thread shards into the dict's storage. Writers do not wait
+        for the lock; whoever holds it folds again while counts arrived
+        meanwhile.
+        """
+        lock = self._merge_lock
+        while lock.acquire(blocking=wait):
+            try:
+                self._dirty = False
+                forward = []
+                for shard in self._shards:
+                    with shard.lock:
+                        counts, shard.counts = shard.counts, {}
+                    if counts and self._apply_locked(counts, from_child=False):
+                        forward.append(counts)
+            finally:
+                lock.release()
+            for counts in forward:
+                # Calls that were in flight when this scope closed
+                self.parent._apply(counts, from_child=True)
+            if not self._dirty:
+                return
+            wait = False
+
+    def _apply(self, counts: typing.Mapping[str, float], from_child: bool) -> None:
+        with self._merge_lock:
+            forward = self._apply_locked(counts, from_child)
+        if forward:
+            self.parent._apply(counts, from_child=True)
+
+    def _apply_locked(self, counts: typing.Mapping[str, float], from_child: bool) -> bool:
+        """
+        Adds counts to the storage; returns whether they must also go to the
+        parent directly, because this node already left the tree.
+        """
+        get = dict.get
+        totals = {k: get(self, k, 0) + v for k, v in counts.items()}
+        if self.exact:
+            for k in EXACT_COST_KEYS.intersection(counts):
+                totals[k] = _add_nanos(self._nanos, k, counts[k])
+        dict.update(self, totals)
+        if from_child:
+            _add_counts(self._from_children, counts)
+        if self.parent is None:
+            return False
+        if self._detached:
+            return True
+        _add_counts(self._pending, counts)
+        return False
+
+    def _take_pending(self) -> typing.Dict[str, float]:
+        with self._merge_lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def merge_shards(self) -> None:
+        """
+        Rolls up the counts of the children into the dict, and folds in any
+        counts written to thread shards.
+        """
+        with self._merge_lock:
+            children = list(self.children)
+        for node in children:
+            node.merge_shards()
+            pending = node._take_pending()
+            if pending:
+                self._apply(pending, from_child=True)
+        self._fold_shards(wait=True)
+
+    def close(self) -> None:
+        """
+        Marks the node closed. Once its children are closed too, it hands
+        its counts to the parent and is replaced there by a summary.
+        """
+        self.closed = True
+        self._detach_if_done()
+
+    def _detach_if_done(self) -> None:
+        parent = self.parent
+        self.merge_shards()
+        if parent is None:
+            return
+        with self._merge_lock:
+            if not self.closed or self.children or self._detached:
+                return
+            self._detached = True
+        summary = self._summary()
+        with parent._merge_lock:
+            parent.children.remove(self)
+            _add_closed(parent._closed_children, summary)
+        pending = self._take_pending()
+        if pending:
+            parent._apply(pending, from_child=True)
+        if parent.closed:
+            parent._detach_if_done()
+
+    def _summary(self) -> typing.Dict[str, typing.Any]:
+        totals = self.snapshot()
+        with self._merge_lock:
+            return {
+                "name": self.name,
+                "scopes": 1,
+                "totals": totals,
+                "own": self._own_locked(),
+                # Copied: summaries are merged into in place later
+                "children": {name: _copy_summary(child) for name, child in self._closed_children.items()},
+            }
+
+    def exact_total(self, key: str = "cost_total") -> Decimal:
+        """
+        Returns a cost total in dollars as an exact Decimal. Only available
+        when the dict accumulates exact costs.
+        """
+        if not self.exact:
+            raise ValueError("exact totals need exact_costs=True on the outermost scope")
+        self.merge_shards()
+        with self._merge_lock:
+            return Decimal(self._nanos.get(key, 0)) / NANODOLLARS_PER_USD
+
+    def own(self) -> typing.Dict[str, float]:
+        """
+        Returns the totals recorded at this node itself, without its children.
+        """
+        self.merge_shards()
+        with self._merge_lock:
+            return self._own_locked()
+
+    def _own_locked(self) -> typing.Dict[str, float]:
+        own: typing.Dict[str, float] = {}
+        for k, v in dict.items(self):
+            received = self._from_children.get(k)
+            if received is not None:
+                if self.exact and k in EXACT_COST_KEYS:
+                    v = (self._nanos.get(k, 0) - received) / NANODOLLARS_PER_USD
+                else:
+                    v -= received
+                if not v:
+                    continue
+            own[k] = v
+        return own
+
+    def tree(self) -> typing.Dict[str, typing.Any]:
+        """
+        Returns this node and its descendants as nested plain dicts with the
+        subtree totals of each node.
+        """
+        totals = self.snapshot()
+        with self._merge_lock:
+            children = list(self.children)
+            closed = list(self._closed_children.values())
+        return {
+            "name": self.name,
+            "scopes": 1,
+            "totals": totals,
+            "children": [node.tree() for node in children] + [_summary_tree(summary) for summary in closed],
+        }
+
+    def folded(self, metric: str = "cost_total", scale: float = 1_000_000) -> str:
+        """
+        Exports the tree in the folded-stack format read by flamegraph.pl and
+        speedscope: one "root;child;grandchild value" line per node, where the
+        value is the node's own metric times scale (cost in micro-dollars by
+        default), rounded to an integer.
+        """
+        self.merge_shards()
+        lines: typing.List[str] = []
+        self._fold((), metric, scale, lines)
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def _fold(self, stack: typing.Tuple[str, ...], metric: str, scale: float, lines: typing.List[str]) -> None:
+        stack = stack + ((self.name or "scope").replace(";", "_"),)
+        with self._merge_lock:
+            value = round(self._own_locked().get(metric, 0) * scale)
+            children = list(self.children)
+            closed = list(self._closed_children.values())
+        if value:
+            lines.append(f"{';'.join(stack)} {value}")
+        for node in children:
+            node._fold(stack, metric, scale, lines)
+        for summary in closed:
+            _fold_summary(summary, stack, metric, scale, lines)
+
+    def snapshot(self) -> typing.Dict[str, float]:
+        """
+        Returns the merged totals as a plain dict.
+        """
+        self.merge_shards()
+        with self._merge_lock:
+            # dict.copy() would call back into the overridden keys()
+            return dict(dict.items(self))
+
+    def _sync_exact(self, key) -> None:
+        # Called with the merge lock held after a write through the dict API
+        if self.exact and key in EXACT_COST_KEYS:
+            if dict.__contains__(self, key):
+                self._nanos[key] = round(dict.__getitem__(self, key) * NANODOLLARS_PER_USD)
+            else:
+                self._nanos.pop(key, None)
+
+    def __setitem__(self, key, value) -> None:
+        self.merge_shards()
+        with self._merge_lock:
+            dict.__setitem__(self, key, value)
+            self._sync_exact(key)
+
+    def __delitem__(self, key) -> None:
+        self.merge_shards()
+        with self._merge_lock:
+            dict.__delitem__(self, key)
+            self._sync_exact(key)
+
+    def pop(self, key, *default):
+        self.merge_shards()
+        with self._merge_lock:
+            value = dict.pop(self, key, *default)
+            self._sync_exact(key)
+            return value
+
+    def popitem(self):
+        self.merge_shards()
+        with self._merge_lock:
+            key, value = dict.popitem(self)
+            self._sync_exact(key)
+            return key, value
+
+    def setdefault(self, key, default=None):
+        self.merge_shards()
+        with self._merge_lock:
+            value = dict.setdefault(self, key, default)
+            self._sync_exact(key)
+            return value
+
+    def update(self, *args, **kwargs) -> None:
+        self.merge_shards()
+        with self._merge_lock:
+            for key, value in dict(*args, **kwargs).items():
+                dict.__setitem__(self, key, value)
+                self._sync_exact(key)
+
+    def clear(self) -> None:
+        self.merge_shards()
+        with self._merge_lock:
+            dict.clear(self)
+            self._nanos.clear()
+            self._from_children.clear()
+
+    # Read access always sees the merged totals. Iteration goes over a
+    # snapshot, so readers are not disturbed by concurrent merges.
+    def __getitem__(self, key):
+        self.merge_shards()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self.merge_shards()
+        return dict.get(self, key, default)
+
+    def __contains__(self, key) -> bool:
+        self.merge_shards()
+        return dict.__contains__(self, key)
+
+    def __len__(self) -> int:
+        self.merge_shards()
+        return dict.__len__(self)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def keys(self):
+        return self.snapshot().keys()
+
+    def values(self):
+        return self.snapshot().values()
+
+    def items(self):
+        return self.snapshot().items()
+
+    def copy(self) -> typing.Dict[str, float]:
+        return self.snapshot()
+
+    def __eq__(self, other) -> bool:
+        return self.snapshot() == other
+
+    def __ne__(self, other) -> bool:
+        return self.snapshot() != other
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return repr(self.snapshot())
+
+    def __reduce__(self):
+        return (dict, (self.snapshot(),))
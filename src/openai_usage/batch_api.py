@@ -0,0 +1,135 @@
+"""
+Pricing of OpenAI Batch API output and error files.
+
+Files are streamed through a memory map one line at a time. The input
+requests.jsonl is only indexed (custom_id -> byte offset), so neither file
+is ever loaded into memory.
+"""
+import json
+import mmap
+import os
+import re
+import typing
+
+from .report import BATCH_DISCOUNT, Aggregates, add_to_aggregates, iter_lines, price_record
+
+_CUSTOM_ID = re.compile(rb'"custom_id"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def _custom_id(line: bytes) -> typing.Optional[str]:
+    """
+    Extracts custom_id without parsing the (possibly large) request body.
+    """
+    match = _CUSTOM_ID.search(line)
+    if match is None:
+        return None
+    return json.loads(match.group(1))
+
+
+def _iter_file_lines(path: str) -> typing.Iterator[bytes]:
+    """
+    Yields the non-empty lines of a file through a memory map.
+    """
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield from iter_lines(mm, 0, len(mm))
+
+
+def index_requests(path: str) -> typing.Dict[str, int]:
+    """
+    Maps every custom_id of a Batch API input file to the byte offset of its line.
+    """
+    index = {}
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            custom_id = _custom_id(line)
+            if custom_id is not None:
+                index[custom_id] = offset
+            offset += len(line)
+    return index
+
+
+def read_request(path: str, offset: int) -> typing.Dict[str, typing.Any]:
+    """
+    Reads the input request line starting at offset.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+
+class BatchReport(typing.NamedTuple):
+    """
+    Aggregates of one batch, rows laid out as report.METRICS.
+    """
+    by_model: Aggregates
+    by_prefix: Aggregates
+    errors_by_prefix: typing.Dict[str, int]
+    unmatched: int
+    missing: typing.List[str]
+    skipped: int = 0
+
+
+def _prefix(custom_id: str, sep: str) -> str:
+    head, found, _ = custom_id.rpartition(sep)
+    return head if found else custom_id
+
+
+def ingest_batch(
+    output_path: typing.Optional[str],
+    error_path: typing.Optional[str] = None,
+    requests_path: typing.Optional[str] = None,
+    discount: float = BATCH_DISCOUNT,
+    prefix_sep: str = "-",
+) -> BatchReport:
+    """
+    Prices every line of a Batch API output file at the batch discount and
+    counts the failed requests of the error file.
+
+    Rows are grouped by model and by custom_id prefix (custom_id up to its
+    last prefix_sep, e.g. "job-7-req-42" -> "job-7-req"). When requests_path
+    is given, custom_ids are matched back to the input lines: outputs with
+    no matching request are counted as unmatched, and requests with neither
+    an output nor an error are returned as missing. Lines that are not JSON
+    objects, or successful ones without usage, are counted as skipped.
+    """
+    index = index_requests(requests_path) if requests_path else None
+    by_model: Aggregates = {}
+    by_prefix: Aggregates = {}
+    errors_by_prefix: typing.Dict[str, int] = {}
+    unmatched = 0
+    skipped = 0
+
+    for path in (output_path, error_path):
+        if path is None:
+            continue
+        for line in _iter_file_lines(path):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(record, dict):
+                skipped += 1
+                continue
+            custom_id = record.get("custom_id") or ""
+            prefix = _prefix(custom_id, prefix_sep)
+            if index is not None and index.pop(custom_id, None) is None:
+                unmatched += 1
+
+            response = record.get("response") or {}
+            body = response.get("body") if isinstance(response, dict) else None
+            if record.get("error") is not None or not isinstance(body, dict) or (response.get("status_code") or 200) >= 400:
+                errors_by_prefix[prefix] = errors_by_prefix.get(prefix, 0) + 1
+                continue
+            priced = price_record(body, discount)
+            if priced is None:
+                skipped += 1
+                continue
+            add_to_aggregates(by_model, (body.get("model"),), *priced)
+            add_to_aggregates(by_prefix, (prefix,), *priced)
+
+    missing = list(index) if index is not None else []
+    return BatchReport(by_model, by_prefix, errors_by_prefix, unmatched, missing, skipped)
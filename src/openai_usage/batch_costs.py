@@ -0,0 +1,149 @@
+"""
+Vectorized pricing for large batches of logged usage records.
+
+Requires NumPy (pip install "openai-usage[numpy]").
+"""
+import typing
+
+import numpy as np
+
+from .model_costs import get_model_price
+from .usage import _COST_SLOTS, _slot_tokens, _usage_items
+
+# (flattened key, its top-level part, the field below it or None, slot)
+_PRICED_KEYS = tuple(
+    (key, *(key.split(".", 1) if "." in key else (key, None)), slot) for key, slot in _COST_SLOTS.items()
+)
+
+
+def _dict_slot_tokens(usage: typing.Mapping[str, typing.Any]) -> typing.List[float]:
+    """
+    Same result as _slot_tokens(_usage_items(usage)) for a usage dict, without
+    flattening it: priced keys are top-level or one level down (cached
+    tokens), in nested or already flattened form.
+    """
+    tokens = [0, 0, 0]
+    for key, parent, field, slot in _PRICED_KEYS:
+        if field is None:
+            v = usage.get(key)
+        else:
+            details = usage.get(parent)
+            v = details.get(field) if isinstance(details, dict) else usage.get(key)
+        if v is not None and isinstance(v, (int, float)):
+            tokens[slot] += v
+    return tokens
+
+
+class UsageColumns(typing.NamedTuple):
+    """
+    Usage records in columnar form. model_codes index into models.
+    """
+    models: typing.List[str]
+    model_codes: np.ndarray
+    input_tokens: np.ndarray
+    cached_tokens: np.ndarray
+    output_tokens: np.ndarray
+
+
+class BatchCosts(typing.NamedTuple):
+    """
+    Per-record costs (USD) plus the columns they were computed from.
+    """
+    columns: UsageColumns
+    cost_input_tokens: np.ndarray
+    cost_input_cached_tokens: np.ndarray
+    cost_output_tokens: np.ndarray
+    cost_total: np.ndarray
+
+    def totals_by_model(self) -> typing.Dict[str, typing.Dict[str, float]]:
+        """
+        Returns token and cost sums per model, keyed like report.METRICS.
+        """
+        columns = self.columns
+        n = len(columns.models)
+        codes = columns.model_codes
+        sums = {
+            "calls": np.bincount(codes, minlength=n),
+            "input_tokens": np.bincount(codes, weights=columns.input_tokens, minlength=n),
+            "cached_tokens": np.bincount(codes, weights=columns.cached_tokens, minlength=n),
+            "output_tokens": np.bincount(codes, weights=columns.output_tokens, minlength=n),
+            "cost_input_tokens": np.bincount(codes, weights=self.cost_input_tokens, minlength=n),
+            "cost_input_cached_tokens": np.bincount(codes, weights=self.cost_input_cached_tokens, minlength=n),
+            "cost_output_tokens": np.bincount(codes, weights=self.cost_output_tokens, minlength=n),
+            "cost_total": np.bincount(codes, weights=self.cost_total, minlength=n),
+        }
+        return {
+            model: {key: sums[key][code].item() for key in sums}
+            for code, model in enumerate(columns.models)
+        }
+
+
+def to_columns(records: typing.Iterable[typing.Mapping[str, typing.Any]]) -> UsageColumns:
+    """
+    Converts records of the form {"model": ..., "usage": {...}} into columns.
+    usage may be nested (as returned by the API) or already flattened.
+    """
+    model_index: typing.Dict[str, int] = {}
+    codes: typing.List[int] = []
+    tokens: typing.List[typing.List[float]] = []
+    for record in records:
+        model = record.get("model") or ""
+        code = model_index.get(model)
+        if code is None:
+            code = model_index[model] = len(model_index)
+        codes.append(code)
+        usage = record.get("usage")
+        if isinstance(usage, dict):
+            tokens.append(_dict_slot_tokens(usage))
+        else:
+            items = _usage_items(usage)
+            tokens.append(_slot_tokens(items) if items else [0, 0, 0])
+
+    token_array = np.array(tokens, dtype=np.float64).reshape(-1, 3)
+    return UsageColumns(
+        models=list(model_index),
+        model_codes=np.array(codes, dtype=np.intp),
+        input_tokens=token_array[:, 0],
+        cached_tokens=token_array[:, 1],
+        output_tokens=token_array[:, 2],
+    )
+
+
+def _price_arrays(models: typing.Sequence[str]) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns (input, cached input, output) per-1k prices, indexed by model code.
+    Unknown models are priced at 0; models without a cached rate bill cached
+    input at the input rate.
+    """
+    prices = [get_model_price(model) if model else None for model in models]
+    return (
+        np.array([p.input if p else 0.0 for p in prices], dtype=np.float64),
+        np.array([(p.input if p.cached_input is None else p.cached_input) if p else 0.0 for p in prices],
+                 dtype=np.float64),
+        np.array([p.output if p else 0.0 for p in prices], dtype=np.float64),
+    )
+
+
+def price_columns(columns: UsageColumns) -> BatchCosts:
+    """
+    Prices columnar usage with array gathers; matches OpenAIUsage per record.
+    """
+    input_price, cached_price, output_price = _price_arrays(columns.models)
+    codes = columns.model_codes
+    cost_input = ((columns.input_tokens - columns.cached_tokens) / 1000.0) * input_price[codes]
+    cost_cached = (columns.cached_tokens / 1000.0) * cached_price[codes]
+    cost_output = (columns.output_tokens / 1000.0) * output_price[codes]
+    return BatchCosts(
+        columns=columns,
+        cost_input_tokens=cost_input,
+        cost_input_cached_tokens=cost_cached,
+        cost_output_tokens=cost_output,
+        cost_total=cost_input + cost_cached + cost_output,
+    )
+
+
+def price_batch(records: typing.Iterable[typing.Mapping[str, typing.Any]]) -> BatchCosts:
+    """
+    Prices an iterable of {"model": ..., "usage": {...}} records.
+    """
+    return price_columns(to_columns(records))
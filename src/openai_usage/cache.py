@@ -0,0 +1,282 @@
+"""
+Opt-in response cache for repeated, deterministic calls.
+
+Pass a ResponseCache as OpenAIUsage(client, cache=...). Non-streaming
+responses.create/parse calls are keyed on a canonical hash of the endpoint,
+model and parameters; a hit returns the stored response without calling the
+API, and the scope's usage dict counts it under cache_hits,
+cache_tokens_avoided, cache_cost_avoided and cache_latency_saved instead of
+the token and cost keys.
+
+The SQLite tier never stores pickles, since a pickle from the file could run
+code when read: it keeps responses that are pydantic models (as the SDK's
+are) as JSON with their class name, and only rebuilds them with classes that
+are already imported. Other responses are only cached in memory.
+"""
+import collections
+import hashlib
+import json
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+import typing
+
+from .model_costs import get_model_price
+from .usage import _slot_costs, _slot_tokens
+
+# Transport options, which change how a request is sent but not what it
+# returns. extra_body and extra_query reach the API and stay in the key.
+IGNORED_PARAMS = frozenset(("extra_headers", "timeout", "stream"))
+
+
+def _json_default(value):
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    model_dump = getattr(value, "model_dump", None)
+    if model_dump is not None:
+        return model_dump()
+    return repr(value)
+
+
+def request_key(endpoint: str, model: typing.Optional[str], args: typing.Sequence[typing.Any],
+                kwargs: typing.Mapping[str, typing.Any]) -> str:
+    """
+    Returns the canonical hash of a request: same endpoint, model and
+    parameters (in any order) give the same key.
+    """
+    params = {k: v for k, v in kwargs.items() if k not in IGNORED_PARAMS}
+    params.pop("model", None)
+    canonical = json.dumps([endpoint, model, list(args), params], sort_keys=True,
+                           separators=(",", ":"), default=_json_default)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CacheEntry(typing.NamedTuple):
+    """
+    A stored response and what the original call cost. value is the pickled
+    response in memory and its JSON on disk.
+    """
+    value: typing.Union[bytes, str]
+    expires_at: float
+    tokens: float
+    cost: float
+    latency: float
+
+
+class _MemoryTier:
+    """
+    LRU of entries bounded by count and total size.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: "collections.OrderedDict[str, CacheEntry]" = collections.OrderedDict()
+
+    def get(self, key: str) -> typing.Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        self.pop(key)
+        if len(entry.value) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += len(entry.value)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.value)
+            self.evictions += 1
+
+    def pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.value)
+
+
+def _model_json(response) -> typing.Optional[typing.Tuple[str, str]]:
+    """
+    Returns (class name, JSON) of a pydantic response, or None.
+    """
+    cls = type(response)
+    dump = getattr(response, "model_dump_json", None)
+    if dump is None or not hasattr(cls, "model_validate_json") or "<" in cls.__qualname__:
+        return None
+    try:
+        return f"{cls.__module__}:{cls.__qualname__}", dump()
+    except Exception:
+        return None
+
+
+def _model_class(name: str) -> typing.Any:
+    """
+    Returns the pydantic class named by _model_json(), looked up among the
+    modules already imported only, or None.
+    """
+    module_name, _, qualname = name.partition(":")
+    value = sys.modules.get(module_name)
+    for part in qualname.split("."):
+        value = getattr(value, part, None)
+    if isinstance(value, type) and hasattr(value, "model_validate_json"):
+        return value
+    return None
+
+
+class _SQLiteTier:
+    """
+    Entries on disk. Values are (class name, JSON) pairs from _model_json().
+    """
+
+    def __init__(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A new table: the pickled rows of the old response_cache table are never read
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache_json (key TEXT PRIMARY KEY, type TEXT, value TEXT, "
+            "expires_at REAL, tokens REAL, cost REAL, latency REAL)"
+        )
+
+    def get(self, key: str) -> typing.Optional[typing.Tuple[str, CacheEntry]]:
+        row = self._conn.execute(
+            "SELECT type, value, expires_at, tokens, cost, latency FROM response_cache_json WHERE key = ?", (key,)
+        ).fetchone()
+        return (row[0], CacheEntry(*row[1:])) if row is not None else None
+
+    def put(self, key: str, type_name: str, entry: CacheEntry) -> None:
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO response_cache_json VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (key, type_name) + entry)
+
+    def pop(self, key: str) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM response_cache_json WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: an in-memory LRU (max_entries, max_bytes) in
+    front of an optional SQLite file at path, for pydantic responses. Entries
+    expire after ttl seconds (None for never).
+
+    when restricts which calls are cached: a mapping of required parameter
+    values, e.g. {"temperature": 0}, or a predicate over the call's kwargs.
+    By default every non-streaming call is cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 << 20,
+        ttl: typing.Optional[float] = 3600.0,
+        path: typing.Optional[str] = None,
+        when: typing.Union[typing.Mapping[str, typing.Any], typing.Callable[[typing.Mapping[str, typing.Any]], bool], None] = None,
+        clock: typing.Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = ttl
+        self.when = when
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._memory = _MemoryTier(max_entries, max_bytes)
+        self._disk = _SQLiteTier(path) if path else None
+        self._lock = threading.Lock()
+
+    @property
+    def evictions(self) -> int:
+        return self._memory.evictions
+
+    def cacheable(self, kwargs: typing.Mapping[str, typing.Any]) -> bool:
+        if kwargs.get("stream"):
+            return False
+        when = self.when
+        if when is None:
+            return True
+        if callable(when):
+            return bool(when(kwargs))
+        return all(k in kwargs and kwargs[k] == v for k, v in when.items())
+
+    def key(self, endpoint: str, model: typing.Optional[str], args, kwargs) -> typing.Optional[str]:
+        """
+        Returns the cache key of a call, or None if it must not be cached.
+        """
+        if not self.cacheable(kwargs):
+            return None
+        return request_key(endpoint, model, args, kwargs)
+
+    def get(self, key: str) -> typing.Optional[typing.Tuple[typing.Any, CacheEntry]]:
+        """
+        Returns (response, entry) for a live entry, or None.
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._disk is not None:
+                stored = self._disk.get(key)
+                if stored is not None:
+                    entry = self._from_disk(*stored)
+                    if entry is not None:
+                        self._memory.put(key, entry)
+            if entry is not None and entry.expires_at and entry.expires_at <= now:
+                self._memory.pop(key)
+                if self._disk is not None:
+                    self._disk.pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Memory entries are only ever pickled in this process
+        return pickle.loads(entry.value), entry
+
+    @staticmethod
+    def _from_disk(type_name: str, stored: CacheEntry) -> typing.Optional[CacheEntry]:
+        cls = _model_class(type_name)
+        if cls is None:
+            return None
+        try:
+            response = cls.model_validate_json(stored.value)
+        except Exception:
+            return None
+        return stored._replace(value=pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @property
+    def on_disk(self) -> bool:
+        """
+        Whether get() and put() may do file I/O.
+        """
+        return self._disk is not None
+
+    def put(self, key: str, response, model: typing.Optional[str], usage_items, latency: float) -> None:
+        """
+        Stores a response with the tokens and cost of the call that produced it.
+        Responses that can't be pickled are not cached, and only pydantic ones
+        are written to disk.
+        """
+        try:
+            value = pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        tokens = _slot_tokens(usage_items or ())
+        cost = sum(_slot_costs(get_model_price(model), tokens)) if model else 0.0
+        expires_at = self._clock() + self.ttl if self.ttl is not None else 0.0
+        entry = CacheEntry(value, expires_at, tokens[0] + tokens[2], cost, latency)
+        stored = _model_json(response) if self._disk is not None else None
+        with self._lock:
+            self._memory.put(key, entry)
+            if self._disk is not None and stored is not None:
+                self._disk.put(key, stored[0], entry._replace(value=stored[1]))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
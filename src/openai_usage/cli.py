@@ -0,0 +1,125 @@
+import argparse
+import json
+import sys
+import typing
+
+from .batch_api import BATCH_DISCOUNT, ingest_batch
+from .report import DEFAULT_CHUNK_SIZE, GROUP_FIELDS, METRICS, Aggregates, report_files
+
+
+def _format_table(group_by: typing.Sequence[str], rows: Aggregates) -> str:
+    headers = list(group_by) + list(METRICS)
+    lines = []
+    for key, row in sorted(rows.items(), key=lambda kv: tuple("" if k is None else str(k) for k in kv[0])):
+        cells = ["-" if k is None else str(k) for k in key]
+        cells += [f"{v:.6f}" if name.startswith("cost") else str(int(v)) for name, v in zip(METRICS, row)]
+        lines.append(cells)
+    widths = [max(len(h), *(len(cells[i]) for cells in lines)) if lines else len(h) for i, h in enumerate(headers)]
+    out = ["  ".join(h.ljust(w) for h, w in zip(headers, widths))]
+    for cells in lines:
+        out.append("  ".join(c.ljust(w) if i < len(group_by) else c.rjust(w) for i, (c, w) in enumerate(zip(cells, widths))))
+    return "\n".join(out)
+
+
+def _json_rows(group_by: typing.Sequence[str], rows: Aggregates) -> typing.List[typing.Dict[str, typing.Any]]:
+    return [{**dict(zip(group_by, key)), **dict(zip(METRICS, row))} for key, row in rows.items()]
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="openai-usage", description="OpenAI API cost/token usage reports")
+    commands = parser.add_subparsers(dest="command")
+
+    report = commands.add_parser("report", help="Aggregate usage and cost from JSONL files")
+    report.add_argument("files", nargs="+", help="JSONL files of responses, usage records or Batch API output")
+    report.add_argument(
+        "--group-by",
+        default="model",
+        help=f"Comma separated fields to group by: {', '.join(GROUP_FIELDS)} (default: model)",
+    )
+    report.add_argument("--tag-key", default="metadata.tag", help="Dotted path of the tag in each record")
+    report.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    report.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+        help="Target chunk size in MB",
+    )
+    report.add_argument("--format", choices=("table", "json"), default="table")
+
+    batch = commands.add_parser("batch", help="Price Batch API output and error files")
+    batch.add_argument("output", nargs="?", help="Batch output file (JSONL)")
+    batch.add_argument("--errors", help="Batch error file (JSONL)")
+    batch.add_argument("--requests", help="Batch input file, to match custom_ids back to requests")
+    batch.add_argument("--discount", type=float, default=BATCH_DISCOUNT, help="Price multiplier (default: 0.5)")
+    batch.add_argument("--prefix-sep", default="-", help="custom_id prefix separator (default: -)")
+    batch.add_argument("--format", choices=("table", "json"), default="table")
+    return parser
+
+
+def _run_report(args) -> int:
+    group_by = [field.strip() for field in args.group_by.split(",") if field.strip()]
+    try:
+        report = report_files(
+            args.files,
+            group_by=group_by,
+            tag_key=args.tag_key,
+            workers=args.workers,
+            chunk_size=args.chunk_size * 1024 * 1024,
+        )
+    except (OSError, ValueError) as e:
+        print(f"openai-usage: {e}", file=sys.stderr)
+        return 1
+
+    if args.format == "json":
+        print(json.dumps(_json_rows(report.group_by, report.rows), indent=2))
+    else:
+        print(_format_table(report.group_by, report.rows))
+    if report.skipped:
+        print(f"openai-usage: skipped {report.skipped} lines without usage", file=sys.stderr)
+    return 0
+
+
+def _run_batch(args) -> int:
+    if args.output is None and args.errors is None:
+        print("openai-usage: batch needs an output file and/or --errors", file=sys.stderr)
+        return 2
+    try:
+        report = ingest_batch(
+            args.output,
+            error_path=args.errors,
+            requests_path=args.requests,
+            discount=args.discount,
+            prefix_sep=args.prefix_sep,
+        )
+    except (OSError, ValueError) as e:
+        print(f"openai-usage: {e}", file=sys.stderr)
+        return 1
+
+    if args.format == "json":
+        print(json.dumps({
+            "by_model": _json_rows(("model",), report.by_model),
+            "by_prefix": _json_rows(("prefix",), report.by_prefix),
+            "errors_by_prefix": report.errors_by_prefix,
+            "unmatched": report.unmatched,
+            "missing": report.missing,
+            "skipped": report.skipped,
+        }, indent=2))
+    else:
+        print(_format_table(("model",), report.by_model))
+        print()
+        print(_format_table(("prefix",), report.by_prefix))
+        errors = sum(report.errors_by_prefix.values())
+        print(f"\nerrors: {errors}  unmatched: {report.unmatched}  missing: {len(report.missing)}"
+              f"  skipped: {report.skipped}")
+    return 0
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None) -> int:
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "report":
+        return _run_report(args)
+    if args.command == "batch":
+        return _run_batch(args)
+    parser.print_help()
+    return 2
@@ -0,0 +1,277 @@
+"""
+Background export of per-call usage records.
+
+UsageExporter is a sink for OpenAIUsage: the wrapped call only enqueues
+its CallRecord, and a daemon thread drains the queue in batches into a
+JSONLSink or SQLiteSink, so no disk I/O happens on the request path.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import typing
+
+from .usage import CallRecord
+
+logger = logging.getLogger(__name__)
+
+DROP_NEW = "drop_new"
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+POLICIES = (DROP_NEW, DROP_OLDEST, BLOCK)
+
+# Seconds between log messages while a sink keeps failing.
+ERROR_LOG_INTERVAL = 60.0
+
+
+class JSONLSink:
+    """
+    Appends records as JSON lines through a large write buffer, rotating the
+    file to path.1, path.2, ... once it grows past max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0, backup_count: int = 5, buffer_size: int = 1 << 16) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self._file: typing.Optional[typing.TextIO] = None
+
+    def _open(self) -> typing.TextIO:
+        if self._file is None:
+            self._file = open(self.path, "a", buffering=self.buffer_size, encoding="utf-8")
+        return self._file
+
+    def _rotate(self) -> None:
+        self.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, batch: typing.Sequence[CallRecord]) -> None:
+        f = self._open()
+        f.write("".join(json.dumps(call._asdict()) + "\n" for call in batch))
+        if self.max_bytes and f.tell() >= self.max_bytes:
+            self._rotate()
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SQLiteSink:
+    """
+    Inserts records into a SQLite table with one executemany per batch, inside
+    a transaction on a WAL-mode database.
+    """
+
+    def __init__(self, path: str, table: str = "usage") -> None:
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name {table!r}")
+        self.path = path
+        self.table = table
+        self._conn: typing.Optional[sqlite3.Connection] = None
+        fields = CallRecord._fields
+        self._insert = f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})"
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so the connection belongs to the exporter thread
+        if self._conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "model TEXT, endpoint TEXT, timestamp REAL, input_tokens INTEGER, cached_tokens INTEGER, "
+                "output_tokens INTEGER, reasoning_tokens INTEGER, cost REAL, latency REAL, "
+                "time_to_first_token REAL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def write(self, batch: typing.Sequence[CallRecord]) -> None:
+        conn = self._connect()
+        with conn:
+            conn.executemany(self._insert, batch)
+
+    def flush(self) -> None:
+        pass  # every batch is committed as it is written
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class UsageExporter:
+    """
+    Queues CallRecords and writes them to a sink in batches from a background
+    thread.
+
+    When the queue is full, policy decides what happens to a new record:
+    "drop_new" discards it, "drop_oldest" discards the oldest queued record,
+    and "block" makes the caller wait for room. Dropped records are counted,
+    as are records passed to record() after close(). OpenAIUsage calls flush()
+    when its block exits.
+    """
+
+    def __init__(
+        self,
+        sink,
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        policy: str = DROP_NEW,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {POLICIES}")
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.dropped = 0
+        self.exported = 0
+        self.errors = 0
+        self._drop_lock = threading.Lock()
+        self._last_error: typing.Optional[BaseException] = None
+        self._last_error_log: typing.Optional[float] = None
+        self._unlogged_errors = 0
+        self._queue: "queue.Queue[CallRecord]" = queue.Queue(max_queue)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="openai-usage-exporter", daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def metrics(self) -> typing.Dict[str, int]:
+        return {
+            "queue_depth": self.queue_depth,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+    def _drop(self) -> None:
+        with self._drop_lock:
+            self.dropped += 1
+
+    def record(self, call: CallRecord) -> None:
+        if self._closed.is_set():
+            self._drop()
+            return
+        if self.policy == BLOCK:
+            # Waits in steps, so that a close() meanwhile cannot leave it stuck
+            while True:
+                try:
+                    self._queue.put(call, timeout=self.flush_interval)
+                    return
+                except queue.Full:
+                    if not self._thread.is_alive():
+                        self._drop()
+                        return
+        try:
+            self._queue.put_nowait(call)
+        except queue.Full:
+            if self.policy == DROP_NEW:
+                self._drop()
+                return
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._drop()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(call)
+            except queue.Full:
+                self._drop()
+
+    def _log_error(self, records: int) -> None:
+        """
+        Logs a failed write: the first one with its traceback, then at most
+        one summary per ERROR_LOG_INTERVAL while failures go on.
+        """
+        self._unlogged_errors += records
+        now = time.monotonic()
+        if self._last_error_log is None:
+            logger.exception("Usage export to %r failed; %d records lost", self.sink, records)
+        elif now - self._last_error_log >= ERROR_LOG_INTERVAL:
+            logger.error("Usage export to %r is still failing; %d more records lost: %s",
+                         self.sink, self._unlogged_errors, self._last_error)
+        else:
+            return
+        self._last_error_log = now
+        self._unlogged_errors = 0
+
+    def _run(self) -> None:
+        q = self._queue
+        while not (self._closed.is_set() and q.empty()):
+            try:
+                batch = [q.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.sink.write(batch)
+                if q.empty():
+                    self.sink.flush()
+                self.exported += len(batch)
+            except Exception as error:
+                self.errors += len(batch)
+                self._last_error = error
+                self._log_error(len(batch))
+            finally:
+                for _ in batch:
+                    q.task_done()
+        # Sinks are only ever touched from this thread (SQLite requires it)
+        self.sink.close()
+
+    def flush(self) -> None:
+        """
+        Blocks until every queued record has been written and flushed.
+        Returns at once after close().
+        """
+        q = self._queue
+        with q.all_tasks_done:
+            while q.unfinished_tasks and self._thread.is_alive():
+                q.all_tasks_done.wait(self.flush_interval)
+
+    def close(self) -> None:
+        """
+        Writes what is still queued, stops the thread and closes the sink.
+        Records that raced with close() and missed the thread are dropped.
+        """
+        self._closed.set()
+        self._thread.join()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            self._drop()
+
+    def __enter__(self) -> "UsageExporter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
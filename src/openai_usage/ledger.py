@@ -0,0 +1,169 @@
+import heapq
+import threading
+import typing
+from array import array
+
+from .usage import CallRecord
+
+# Column name -> array typecode. Tokens fit in 32 bits per call; models and
+# endpoints are stored as codes into small interning tables.
+_COLUMNS = (
+    ("model", "H"),
+    ("endpoint", "B"),
+    ("timestamp", "d"),
+    ("input_tokens", "I"),
+    ("cached_tokens", "I"),
+    ("output_tokens", "I"),
+    ("reasoning_tokens", "I"),
+    ("cost", "d"),
+    ("latency", "d"),
+)
+NUMERIC_COLUMNS = tuple(name for name, _ in _COLUMNS[2:])
+# Model or endpoint name stored once the interning tables are full
+OTHER = "(other)"
+
+
+class UsageLedger:
+    """
+    Fixed-capacity ring buffer of per-call usage, stored column-wise in typed
+    arrays (about 43 bytes per call). Once full, the oldest calls are
+    overwritten. Past 65535 distinct models (255 endpoints), further ones
+    are stored as OTHER.
+
+    Pass it as a sink: OpenAIUsage(client, sinks=[ledger]).
+    """
+
+    def __init__(self, capacity: int = 1_000_000) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._columns = {name: array(code) for name, code in _COLUMNS}
+        self._models: typing.List[typing.Optional[str]] = []
+        self._model_codes: typing.Dict[typing.Optional[str], int] = {}
+        self._endpoints: typing.List[str] = []
+        self._endpoint_codes: typing.Dict[str, int] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._columns["timestamp"])
+
+    def _code(self, codes: typing.Dict, names: typing.List, name, limit: int) -> int:
+        code = codes.get(name)
+        if code is None:
+            if len(names) >= limit - 1 and name != OTHER:
+                # The last code collects the values that don't fit
+                return self._code(codes, names, OTHER, limit)
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def record(self, call: CallRecord) -> None:
+        with self._lock:
+            values = (
+                self._code(self._model_codes, self._models, call.model, 1 << 16),
+                self._code(self._endpoint_codes, self._endpoints, call.endpoint, 1 << 8),
+                call.timestamp,
+                int(call.input_tokens),
+                int(call.cached_tokens),
+                int(call.output_tokens),
+                int(call.reasoning_tokens),
+                call.cost,
+                call.latency,
+            )
+            columns = self._columns
+            if len(self) < self.capacity:
+                for (name, _), value in zip(_COLUMNS, values):
+                    columns[name].append(value)
+            else:
+                i = self._next
+                for (name, _), value in zip(_COLUMNS, values):
+                    columns[name][i] = value
+                self._next = (i + 1) % self.capacity
+
+    def _row(self, i: int) -> typing.Dict[str, typing.Any]:
+        columns = self._columns
+        row: typing.Dict[str, typing.Any] = {name: columns[name][i] for name in NUMERIC_COLUMNS}
+        row["model"] = self._models[columns["model"][i]]
+        row["endpoint"] = self._endpoints[columns["endpoint"][i]]
+        return row
+
+    def _select(self, model: typing.Optional[str], endpoint: typing.Optional[str]) -> typing.Iterable[int]:
+        indices: typing.Iterable[int] = range(len(self))
+        if model is not None:
+            code = self._model_codes.get(model)
+            models = self._columns["model"]
+            indices = [i for i in indices if models[i] == code] if code is not None else []
+        if endpoint is not None:
+            code = self._endpoint_codes.get(endpoint)
+            endpoints = self._columns["endpoint"]
+            indices = [i for i in indices if endpoints[i] == code] if code is not None else []
+        return indices
+
+    def rows(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        Returns all calls, oldest first.
+        """
+        with self._lock:
+            n = len(self)
+            order = range(n) if n < self.capacity else [(self._next + i) % n for i in range(n)]
+            return [self._row(i) for i in order]
+
+    def top_k(self, k: int, by: str = "cost", model: typing.Optional[str] = None,
+              endpoint: typing.Optional[str] = None) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        Returns the k calls with the largest value of column `by`.
+        """
+        if by not in NUMERIC_COLUMNS:
+            raise ValueError(f"Unknown column {by!r}, expected one of {NUMERIC_COLUMNS}")
+        with self._lock:
+            column = self._columns[by]
+            best = heapq.nlargest(k, self._select(model, endpoint), key=column.__getitem__)
+            return [self._row(i) for i in best]
+
+    def percentile(self, column: str, q: float, model: typing.Optional[str] = None,
+                   endpoint: typing.Optional[str] = None) -> typing.Optional[float]:
+        """
+        Returns the q-th percentile (0-100, linear interpolation) of a column,
+        or None if no calls match.
+        """
+        if column not in NUMERIC_COLUMNS:
+            raise ValueError(f"Unknown column {column!r}, expected one of {NUMERIC_COLUMNS}")
+        if not 0 <= q <= 100:
+            raise ValueError("q must be between 0 and 100")
+        with self._lock:
+            values = self._columns[column]
+            selected = sorted(values[i] for i in self._select(model, endpoint))
+        if not selected:
+            return None
+        pos = (len(selected) - 1) * q / 100.0
+        lo = int(pos)
+        hi = min(lo + 1, len(selected) - 1)
+        return selected[lo] + (selected[hi] - selected[lo]) * (pos - lo)
+
+    def group_by(self, field: str = "model") -> typing.Dict[typing.Optional[str], typing.Dict[str, float]]:
+        """
+        Returns per-model or per-endpoint call counts and column sums.
+        """
+        if field == "model":
+            names = self._models
+        elif field == "endpoint":
+            names = self._endpoints
+        else:
+            raise ValueError("field must be 'model' or 'endpoint'")
+        sums = ("input_tokens", "cached_tokens", "output_tokens", "reasoning_tokens", "cost", "latency")
+        with self._lock:
+            codes = self._columns[field]
+            columns = [self._columns[name] for name in sums]
+            groups: typing.Dict[int, typing.List[float]] = {}
+            for i in range(len(self)):
+                row = groups.get(codes[i])
+                if row is None:
+                    row = groups[codes[i]] = [0] * (len(sums) + 1)
+                row[0] += 1
+                for j, column in enumerate(columns, start=1):
+                    row[j] += column[i]
+            return {
+                names[code]: dict(zip(("calls",) + sums, row))
+                for code, row in groups.items()
+            }
@@ -0,0 +1,194 @@
+"""
+Pre-aggregated usage counters and histograms in the OpenMetrics text format.
+
+UsageMetrics is a sink for OpenAIUsage. Each (labels, model, endpoint)
+series is resolved once to a handle holding plain number slots, so a call
+only does a few additions; label strings are built when a series is first
+seen, not per call. render() serializes the current state for Prometheus,
+and start_http_server() serves it on a local port.
+"""
+import bisect
+import threading
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .usage import CallRecord
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Seconds; model calls range from sub-second embeddings to multi-minute reasoning.
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Counter families: (name, help, CallRecord field).
+_COUNTERS = (
+    ("requests", "API calls", None),
+    ("input_tokens", "Input tokens, cached included", "input_tokens"),
+    ("cached_tokens", "Cached input tokens", "cached_tokens"),
+    ("output_tokens", "Output tokens, reasoning included", "output_tokens"),
+    ("reasoning_tokens", "Reasoning tokens", "reasoning_tokens"),
+    ("cost_dollars", "Cost in US dollars", "cost"),
+)
+_HISTOGRAMS = (
+    ("request_duration_seconds", "Call latency, to the end of the stream for streaming calls"),
+    ("time_to_first_token_seconds", "Time to the first event of streaming calls"),
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labels: typing.Sequence[typing.Tuple[str, str]]) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels)
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Series:
+    """
+    Handle for one label set: counter values and histogram bucket counts.
+    """
+    __slots__ = ("labels", "counters", "buckets", "sums", "counts", "lock")
+
+    def __init__(self, labels: str, bucket_count: int) -> None:
+        self.labels = labels
+        self.counters = [0] * len(_COUNTERS)
+        self.buckets = [[0] * (bucket_count + 1) for _ in _HISTOGRAMS]
+        self.sums = [0.0] * len(_HISTOGRAMS)
+        self.counts = [0] * len(_HISTOGRAMS)
+        self.lock = threading.Lock()
+
+
+class _Registry:
+    def __init__(self, namespace: str, buckets: typing.Sequence[float]) -> None:
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        # By label text: sinks from labels() with the same labels share series
+        self.series: typing.Dict[str, _Series] = {}
+        self.lock = threading.Lock()
+
+
+class UsageMetrics:
+    """
+    Counters (requests, tokens, cost) and latency histograms per model and
+    endpoint, plus any constant labels given here or through labels().
+    """
+
+    def __init__(
+        self,
+        labels: typing.Optional[typing.Mapping[str, str]] = None,
+        namespace: str = "openai",
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+        _registry: typing.Optional[_Registry] = None,
+    ) -> None:
+        self._registry = _registry or _Registry(namespace, buckets)
+        self._labels = tuple((labels or {}).items())
+        self._handles: typing.Dict[typing.Optional[str], typing.Dict[str, _Series]] = {}
+
+    def labels(self, **labels: str) -> "UsageMetrics":
+        """
+        Returns a sink sharing this one's metrics with extra constant labels,
+        e.g. OpenAIUsage(client, sinks=[metrics.labels(team="search")]).
+        """
+        return UsageMetrics(dict(self._labels + tuple(labels.items())), _registry=self._registry)
+
+    def _series(self, model: typing.Optional[str], endpoint: str) -> _Series:
+        by_endpoint = self._handles.get(model)
+        if by_endpoint is None:
+            by_endpoint = self._handles.setdefault(model, {})
+        series = by_endpoint.get(endpoint)
+        if series is None:
+            registry = self._registry
+            labels = _label_text(self._labels + (("model", model or ""), ("endpoint", endpoint)))
+            with registry.lock:
+                series = registry.series.get(labels)
+                if series is None:
+                    series = registry.series[labels] = _Series(labels, len(registry.buckets))
+                by_endpoint[endpoint] = series
+        return series
+
+    def record(self, call: CallRecord) -> None:
+        series = self._series(call.model, call.endpoint)
+        buckets = self._registry.buckets
+        with series.lock:
+            counters = series.counters
+            counters[0] += 1
+            counters[1] += call.input_tokens
+            counters[2] += call.cached_tokens
+            counters[3] += call.output_tokens
+            counters[4] += call.reasoning_tokens
+            counters[5] += call.cost
+            series.buckets[0][bisect.bisect_left(buckets, call.latency)] += 1
+            series.sums[0] += call.latency
+            series.counts[0] += 1
+            if call.time_to_first_token is not None:
+                series.buckets[1][bisect.bisect_left(buckets, call.time_to_first_token)] += 1
+                series.sums[1] += call.time_to_first_token
+                series.counts[1] += 1
+
+    def render(self) -> str:
+        """
+        Returns every series in the OpenMetrics text format.
+        """
+        registry = self._registry
+        prefix = f"{registry.namespace}_" if registry.namespace else ""
+        with registry.lock:
+            all_series = list(registry.series.values())
+        snapshots = []
+        for series in all_series:
+            with series.lock:
+                snapshots.append((series.labels, list(series.counters),
+                                  [list(b) for b in series.buckets], list(series.sums), list(series.counts)))
+
+        lines: typing.List[str] = []
+        for i, (name, help_text, _) in enumerate(_COUNTERS):
+            family = prefix + name
+            lines.append(f"# TYPE {family} counter")
+            lines.append(f"# HELP {family} {help_text}.")
+            for labels, counters, _, _, _ in snapshots:
+                lines.append(f"{family}_total{{{labels}}} {_number(counters[i])}")
+        bounds = [_number(b) for b in registry.buckets] + ["+Inf"]
+        for i, (name, help_text) in enumerate(_HISTOGRAMS):
+            family = prefix + name
+            lines.append(f"# TYPE {family} histogram")
+            lines.append(f"# HELP {family} {help_text}.")
+            for labels, _, buckets, sums, counts in snapshots:
+                if not counts[i]:
+                    continue
+                cumulative = 0
+                for bound, n in zip(bounds, buckets[i]):
+                    cumulative += n
+                    lines.append(f'{family}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{family}_sum{{{labels}}} {_number(sums[i])}")
+                lines.append(f"{family}_count{{{labels}}} {counts[i]}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def start_http_server(metrics: UsageMetrics, port: int = 9464, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves metrics.render() at /metrics from a daemon thread. Call shutdown()
+    and server_close() on the returned server to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) -> None:
+            pass  # scrapes every few seconds would flood stderr
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="openai-usage-metrics", daemon=True).start()
+    return server
@@ -1,262 +1,319 @@
-MODEL_COST_PER_1K_TOKENS = {
-    # GPT-4.1 input
-    "gpt-4.1": 0.002,
-    "gpt-4.1-2025-04-14": 0.002,
-    "gpt-4.1-cached": 0.0005,
-    "gpt-4.1-2025-04-14-cached": 0.0005,
-    # GPT-4.1 output
-    "gpt-4.1-completion": 0.008,
-    "gpt-4.1-2025-04-14-completion": 0.008,
-    # GPT-4.1-mini input
-    "gpt-4.1-mini": 0.0004,
-    "gpt-4.1-mini-2025-04-14": 0.0004,
-    "gpt-4.1-mini-cached": 0.0001,
-    "gpt-4.1-mini-2025-04-14-cached": 0.0001,
-    # GPT-4.1-mini output
-    "gpt-4.1-mini-completion": 0.0016,
-    "gpt-4.1-mini-2025-04-14-completion": 0.0016,
-    # GPT-4.1-nano input
-    "gpt-4.1-nano": 0.0001,
-    "gpt-4.1-nano-2025-04-14": 0.0001,
-    "gpt-4.1-nano-cached": 0.000025,
-    "gpt-4.1-nano-2025-04-14-cached": 0.000025,
-    # GPT-4.1-nano output
-    "gpt-4.1-nano-completion": 0.0004,
-    "gpt-4.1-nano-2025-04-14-completion": 0.0004,
-    # GPT-4.5-preview input
-    "gpt-4.5-preview": 0.075,
-    "gpt-4.5-preview-2025-02-27": 0.075,
-    "gpt-4.5-preview-cached": 0.0375,
-    "gpt-4.5-preview-2025-02-27-cached": 0.0375,
-    # GPT-4.5-preview output
-    "gpt-4.5-preview-completion": 0.15,
-    "gpt-4.5-preview-2025-02-27-completion": 0.15,
-    # OpenAI o1 input
-    "o1": 0.015,
-    "o1-2024-12-17": 0.015,
-    "o1-cached": 0.0075,
-    "o1-2024-12-17-cached": 0.0075,
-    # OpenAI o1 output
-    "o1-completion": 0.06,
-    "o1-2024-12-17-completion": 0.06,
-    # OpenAI o1-pro input
-    "o1-pro": 0.15,
-    "o1-pro-2025-03-19": 0.15,
-    # OpenAI o1-pro output
-    "o1-pro-completion": 0.6,
-    "o1-pro-2025-03-19-completion": 0.6,
-    # OpenAI o3 input
-    "o3": 0.01,
-    "o3-2025-04-16": 0.01,
-    "o3-cached": 0.0025,
-    "o3-2025-04-16-cached": 0.0025,
-    # OpenAI o3 output
-    "o3-completion": 0.04,
-    "o3-2025-04-16-completion": 0.04,
-    # OpenAI o4-mini input
-    "o4-mini": 0.0011,
-    "o4-mini-2025-04-16": 0.0011,
-    "o4-mini-cached": 0.000275,
-    "o4-mini-2025-04-16-cached": 0.000275,
-    # OpenAI o4-mini output
-    "o4-mini-completion": 0.0044,
-    "o4-mini-2025-04-16-completion": 0.0044,
-    # OpenAI o3-mini input
-    "o3-mini": 0.0011,
-    "o3-mini-2025-01-31": 0.0011,
-    "o3-mini-cached": 0.00055,
-    "o3-mini-2025-01-31-cached": 0.00055,
-    # OpenAI o3-mini output
-    "o3-mini-completion": 0.0044,
-    "o3-mini-2025-01-31-completion": 0.0044,
-    # OpenAI o1-mini input (updated pricing)
-    "o1-mini": 0.0011,
-    "o1-mini-cached": 0.00055,
-    "o1-mini-2024-09-12": 0.0011,
-    "o1-mini-2024-09-12-cached": 0.00055,
-    # OpenAI o1-mini output (updated pricing)
-    "o1-mini-completion": 0.0044,
-    "o1-mini-2024-09-12-completion": 0.0044,
-    # OpenAI o1-preview input
-    "o1-preview": 0.015,
-    "o1-preview-cached": 0.0075,
-    "o1-preview-2024-09-12": 0.015,
-    "o1-preview-2024-09-12-cached": 0.0075,
-    # OpenAI o1-preview output
-    "o1-preview-completion": 0.06,
-    "o1-preview-2024-09-12-completion": 0.06,
-    # GPT-4o input
-    "gpt-4o": 0.0025,
-    "gpt-4o-cached": 0.00125,
-    "gpt-4o-2024-05-13": 0.005,
-    "gpt-4o-2024-08-06": 0.0025,
-    "gpt-4o-2024-08-06-cached": 0.00125,
-    "gpt-4o-2024-11-20": 0.0025,
-    "gpt-4o-2024-11-20-cached": 0.00125,
-    # GPT-4o output
-    "gpt-4o-completion": 0.01,
-    "gpt-4o-2024-05-13-completion": 0.015,
-    "gpt-4o-2024-08-06-completion": 0.01,
-    "gpt-4o-2024-11-20-completion": 0.01,
-    # GPT-4o-audio-preview input
-    "gpt-4o-audio-preview": 0.0025,
-    "gpt-4o-audio-preview-2024-12-17": 0.0025,
-    "gpt-4o-audio-preview-2024-10-01": 0.0025,
-    # GPT-4o-audio-preview output
-    "gpt-4o-audio-preview-completion": 0.01,
-    "gpt-4o-audio-preview-2024-12-17-completion": 0.01,
-    "gpt-4o-audio-preview-2024-10-01-completion": 0.01,
-    # GPT-4o-realtime-preview input
-    "gpt-4o-realtime-preview": 0.005,
-    "gpt-4o-realtime-preview-2024-12-17": 0.005,
-    "gpt-4o-realtime-preview-2024-10-01": 0.005,
-    "gpt-4o-realtime-preview-cached": 0.0025,
-    "gpt-4o-realtime-preview-2024-12-17-cached": 0.0025,
-    "gpt-4o-realtime-preview-2024-10-01-cached": 0.0025,
-    # GPT-4o-realtime-preview output
-    "gpt-4o-realtime-preview-completion": 0.02,
-    "gpt-4o-realtime-preview-2024-12-17-completion": 0.02,
-    "gpt-4o-realtime-preview-2024-10-01-completion": 0.02,
-    # GPT-4o-mini input
-    "gpt-4o-mini": 0.00015,
-    "gpt-4o-mini-cached": 0.000075,
-    "gpt-4o-mini-2024-07-18": 0.00015,
-    "gpt-4o-mini-2024-07-18-cached": 0.000075,
-    # GPT-4o-mini output
-    "gpt-4o-mini-completion": 0.0006,
-    "gpt-4o-mini-2024-07-18-completion": 0.0006,
-    # GPT-4o-mini-audio-preview input
-    "gpt-4o-mini-audio-preview": 0.00015,
-    "gpt-4o-mini-audio-preview-2024-12-17": 0.00015,
-    # GPT-4o-mini-audio-preview output
-    "gpt-4o-mini-audio-preview-completion": 0.0006,
-    "gpt-4o-mini-audio-preview-2024-12-17-completion": 0.0006,
-    # GPT-4o-mini-realtime-preview input
-    "gpt-4o-mini-realtime-preview": 0.0006,
-    "gpt-4o-mini-realtime-preview-2024-12-17": 0.0006,
-    "gpt-4o-mini-realtime-preview-cached": 0.0003,
-    "gpt-4o-mini-realtime-preview-2024-12-17-cached": 0.0003,
-    # GPT-4o-mini-realtime-preview output
-    "gpt-4o-mini-realtime-preview-completion": 0.0024,
-    "gpt-4o-mini-realtime-preview-2024-12-17-completion": 0.0024,
-    # GPT-4o-mini-search-preview input
-    "gpt-4o-mini-search-preview": 0.00015,
-    "gpt-4o-mini-search-preview-2025-03-11": 0.00015,
-    # GPT-4o-mini-search-preview output
-    "gpt-4o-mini-search-preview-completion": 0.0006,
-    "gpt-4o-mini-search-preview-2025-03-11-completion": 0.0006,
-    # GPT-4o-search-preview input
-    "gpt-4o-search-preview": 0.0025,
-    "gpt-4o-search-preview-2025-03-11": 0.0025,
-    # GPT-4o-search-preview output
-    "gpt-4o-search-preview-completion": 0.01,
-    "gpt-4o-search-preview-2025-03-11-completion": 0.01,
-    # Computer-use-preview input
-    "computer-use-preview": 0.003,
-    "computer-use-preview-2025-03-11": 0.003,
-    # Computer-use-preview output
-    "computer-use-preview-completion": 0.012,
-    "computer-use-preview-2025-03-11-completion": 0.012,
-    # GPT-4 input
-    "gpt-4": 0.03,
-    "gpt-4-0314": 0.03,
-    "gpt-4-0613": 0.03,
-    "gpt-4-32k": 0.06,
-    "gpt-4-32k-0314": 0.06,
-    "gpt-4-32k-0613": 0.06,
-    "gpt-4-vision-preview": 0.01,
-    "gpt-4-1106-preview": 0.01,
-    "gpt-4-0125-preview": 0.01,
-    "gpt-4-turbo-preview": 0.01,
-    "gpt-4-turbo": 0.01,
-    "gpt-4-turbo-2024-04-09": 0.01,
-    # GPT-4 output
-    "gpt-4-completion": 0.06,
-    "gpt-4-0314-completion": 0.06,
-    "gpt-4-0613-completion": 0.06,
-    "gpt-4-32k-completion": 0.12,
-    "gpt-4-32k-0314-completion": 0.12,
-    "gpt-4-32k-0613-completion": 0.12,
-    "gpt-4-vision-preview-completion": 0.03,
-    "gpt-4-1106-preview-completion": 0.03,
-    "gpt-4-0125-preview-completion": 0.03,
-    "gpt-4-turbo-preview-completion": 0.03,
-    "gpt-4-turbo-completion": 0.03,
-    "gpt-4-turbo-2024-04-09-completion": 0.03,
-    # GPT-3.5 input
-    # gpt-3.5-turbo points at gpt-3.5-turbo-0613 until Feb 16, 2024.
-    # Switches to gpt-3.5-turbo-0125 after.
-    "gpt-3.5-turbo": 0.0015,
-    "gpt-3.5-turbo-0125": 0.0005,
-    "gpt-3.5-turbo-0301": 0.0015,
-    "gpt-3.5-turbo-0613": 0.0015,
-    "gpt-3.5-turbo-1106": 0.001,
-    "gpt-3.5-turbo-instruct": 0.0015,
-    "gpt-3.5-turbo-16k": 0.003,
-    "gpt-3.5-turbo-16k-0613": 0.003,
-    # GPT-3.5 output
-    # gpt-3.5-turbo points at gpt-3.5-turbo-0613 until Feb 16, 2024.
-    # Switches to gpt-3.5-turbo-0125 after.
-    "gpt-3.5-turbo-completion": 0.002,
-    "gpt-3.5-turbo-0125-completion": 0.0015,
-    "gpt-3.5-turbo-0301-completion": 0.002,
-    "gpt-3.5-turbo-0613-completion": 0.002,
-    "gpt-3.5-turbo-1106-completion": 0.002,
-    "gpt-3.5-turbo-instruct-completion": 0.002,
-    "gpt-3.5-turbo-16k-completion": 0.004,
-    "gpt-3.5-turbo-16k-0613-completion": 0.004,
-    # Azure GPT-35 input
-    "gpt-35-turbo": 0.0015,  # Azure OpenAI version of ChatGPT
-    "gpt-35-turbo-0125": 0.0005,
-    "gpt-35-turbo-0301": 0.002,  # Azure OpenAI version of ChatGPT
-    "gpt-35-turbo-0613": 0.0015,
-    "gpt-35-turbo-instruct": 0.0015,
-    "gpt-35-turbo-16k": 0.003,
-    "gpt-35-turbo-16k-0613": 0.003,
-    # Azure GPT-35 output
-    "gpt-35-turbo-completion": 0.002,  # Azure OpenAI version of ChatGPT
-    "gpt-35-turbo-0125-completion": 0.0015,
-    "gpt-35-turbo-0301-completion": 0.002,  # Azure OpenAI version of ChatGPT
-    "gpt-35-turbo-0613-completion": 0.002,
-    "gpt-35-turbo-instruct-completion": 0.002,
-    "gpt-35-turbo-16k-completion": 0.004,
-    "gpt-35-turbo-16k-0613-completion": 0.004,
-    # Others
-    "text-ada-001": 0.0004,
-    "ada": 0.0004,
-    "text-babbage-001": 0.0005,
-    "babbage": 0.0005,
-    "text-curie-001": 0.002,
-    "curie": 0.002,
-    "text-davinci-003": 0.02,
-    "text-davinci-002": 0.02,
-    "code-davinci-002": 0.02,
-    # Fine Tuned input
-    "babbage-002-finetuned": 0.0016,
-    "davinci-002-finetuned": 0.012,
-    "gpt-3.5-turbo-0613-finetuned": 0.003,
-    "gpt-3.5-turbo-1106-finetuned": 0.003,
-    "gpt-3.5-turbo-0125-finetuned": 0.003,
-    "gpt-4o-mini-2024-07-18-finetuned": 0.0003,
-    "gpt-4o-mini-2024-07-18-finetuned-cached": 0.00015,
-    # Fine Tuned output
-    "babbage-002-finetuned-completion": 0.0016,
-    "davinci-002-finetuned-completion": 0.012,
-    "gpt-3.5-turbo-0613-finetuned-completion": 0.006,
-    "gpt-3.5-turbo-1106-finetuned-completion": 0.006,
-    "gpt-3.5-turbo-0125-finetuned-completion": 0.006,
-    "gpt-4o-mini-2024-07-18-finetuned-completion": 0.0012,
-    # Azure Fine Tuned input
-    "babbage-002-azure-finetuned": 0.0004,
-    "davinci-002-azure-finetuned": 0.002,
-    "gpt-35-turbo-0613-azure-finetuned": 0.0015,
-    # Azure Fine Tuned output
-    "babbage-002-azure-finetuned-completion": 0.0004,
-    "davinci-002-azure-finetuned-completion": 0.002,
-    "gpt-35-turbo-0613-azure-finetuned-completion": 0.002,
-    # Legacy fine-tuned models
-    "ada-finetuned-legacy": 0.0016,
-    "babbage-finetuned-legacy": 0.0024,
-    "curie-finetuned-legacy": 0.012,
-    "davinci-finetuned-legacy": 0.12,
-}
\ No newline at end of file
+"""
+Model prices and model name resolution.
+
+Prices live in data/pricing.json (USD per 1k tokens, keyed like the old
+MODEL_COST_PER_1K_TOKENS dict) and are only parsed on the first lookup, so
+importing this module is cheap. reload_pricing() swaps in a new table
+without restarting. get_model_price_nanos() gives the same prices as integer
+nano-dollars per token, for exact cost accumulation.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import typing
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+PRICING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pricing.json")
+
+class ModelPrice(typing.NamedTuple):
+    """
+    Prices in USD per 1k tokens for one model. cached_input is None when the
+    model has no discounted rate for cached input tokens.
+    """
+    input: float
+    cached_input: typing.Optional[float]
+    output: float
+
+
+ZERO_PRICE = ModelPrice(0.0, None, 0.0)
+
+# Unit of exact costs: 1 USD per 1k tokens is 1_000_000 nano-dollars per token.
+NANODOLLARS_PER_USD = 1_000_000_000
+
+# Extra names that should be priced like an existing model, e.g. Azure
+# deployment names. Use register_alias() so memoized lookups are refreshed.
+MODEL_ALIASES: typing.Dict[str, str] = {}
+
+# Dated snapshot suffixes, e.g. -2024-08-06 or -0613.
+_SNAPSHOT = re.compile(r"-(?:\d{4}-\d{2}-\d{2}|\d{4})$")
+
+
+def _compile_index(table: typing.Dict[str, float]) -> typing.Dict[str, ModelPrice]:
+    """
+    Folds the suffix-keyed price table into one ModelPrice record per model.
+    """
+    fields: typing.Dict[str, typing.Dict[str, float]] = {}
+    for key, per_1k in table.items():
+        if key.endswith("-completion"):
+            fields.setdefault(key[:-len("-completion")], {})["output"] = per_1k
+        elif key.endswith("-cached"):
+            fields.setdefault(key[:-len("-cached")], {})["cached_input"] = per_1k
+        else:
+            fields.setdefault(key, {})["input"] = per_1k
+    return {
+        model: ModelPrice(f.get("input", 0.0), f.get("cached_input"), f.get("output", 0.0))
+        for model, f in fields.items()
+    }
+
+
+_MISSING = object()
+
+
+def _split_key(key: str) -> str:
+    for suffix in ("-completion", "-cached"):
+        if key.endswith(suffix):
+            return key[:-len(suffix)]
+    return key
+
+
+class _PriceTable(dict):
+    """
+    The flat MODEL_COST_PER_1K_TOKENS table. Assigning or deleting a key, the
+    original way to price a model, updates its entry in the index like
+    register_price() does, so the change is used and survives reloads.
+    """
+
+    def __setitem__(self, key: str, per_1k: float) -> None:
+        with _load_lock:
+            dict.__setitem__(self, key, float(per_1k))
+            _refresh_model(_split_key(key))
+
+    def __delitem__(self, key: str) -> None:
+        with _load_lock:
+            dict.__delitem__(self, key)
+            _refresh_model(_split_key(key))
+
+    def update(self, *args, **kwargs) -> None:
+        for key, per_1k in dict(*args, **kwargs).items():
+            self[key] = per_1k
+
+    def setdefault(self, key: str, default: float = 0.0) -> float:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: str, default: typing.Any = _MISSING) -> typing.Any:
+        if key not in self:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self) -> typing.Tuple[str, float]:
+        key = next(reversed(list(self)))
+        return key, self.pop(key)
+
+    def clear(self) -> None:
+        for key in list(self):
+            del self[key]
+
+
+# The flat, suffix-keyed table (MODEL_COST_PER_1K_TOKENS, kept for backward
+# compatibility) and the per-model index compiled from it. Both are filled on
+# first use and updated in place on reload, so references to them stay valid.
+_FLAT: typing.Dict[str, float] = _PriceTable()
+_INDEX: typing.Dict[str, ModelPrice] = {}
+_REGISTERED: typing.Dict[str, ModelPrice] = {}
+_loaded: typing.Optional[typing.Tuple[str, float, typing.Any]] = None  # path, mtime, version
+_load_lock = threading.RLock()
+
+
+def _flat_entries(model_name: str, price: ModelPrice) -> typing.Dict[str, float]:
+    entries = {model_name: price.input, f"{model_name}-completion": price.output}
+    if price.cached_input is not None:
+        entries[f"{model_name}-cached"] = price.cached_input
+    return entries
+
+
+def reload_pricing(path: typing.Optional[str] = None) -> typing.Any:
+    """
+    (Re)loads the price table from path (default: the bundled data file, or
+    the one loaded last) and returns its version. Prices added with
+    register_price() are kept.
+    """
+    global _loaded
+    with _load_lock:
+        path = path or (_loaded[0] if _loaded else PRICING_PATH)
+        mtime = os.path.getmtime(path)
+        with open(path, encoding="utf-8") as f:
+            document = json.load(f)
+        flat = {str(k): float(v) for k, v in document["prices"].items()}
+        for model_name, price in _REGISTERED.items():
+            for key in (model_name, f"{model_name}-cached", f"{model_name}-completion"):
+                flat.pop(key, None)
+            flat.update(_flat_entries(model_name, price))
+        index = _compile_index(flat)
+        # Updated in place, without ever being empty, while lookups may run
+        for table, new_table in ((_FLAT, flat), (_INDEX, index)):
+            dict.update(table, new_table)
+            for key in set(table).difference(new_table):
+                dict.__delitem__(table, key)
+        _loaded = (path, mtime, document.get("version"))
+        _clear_lookup_caches()
+        return _loaded[2]
+
+
+def reload_pricing_if_changed() -> bool:
+    """
+    Reloads the price table if its file changed since it was loaded; cheap
+    enough to call periodically. Returns whether it reloaded.
+    """
+    if _loaded is None:
+        return False
+    path, mtime, _ = _loaded
+    if os.path.getmtime(path) == mtime:
+        return False
+    reload_pricing(path)
+    return True
+
+
+def pricing_version() -> typing.Any:
+    """
+    Returns the version field of the loaded price table.
+    """
+    _pricing_index()
+    return _loaded[2] if _loaded else None
+
+
+def _pricing_index() -> typing.Dict[str, ModelPrice]:
+    if _loaded is None:
+        with _load_lock:
+            if _loaded is None:
+                reload_pricing()
+    return _INDEX
+
+
+def __getattr__(name: str) -> typing.Any:
+    # PEP 562: the tables are only parsed when first touched
+    if name == "PRICING_INDEX":
+        return _pricing_index()
+    if name == "MODEL_COST_PER_1K_TOKENS":
+        _pricing_index()
+        return _FLAT
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _resolve(model_name: str) -> typing.Optional[str]:
+    index = _pricing_index()
+    if model_name in index:
+        return model_name
+    alias = MODEL_ALIASES.get(model_name)
+    if alias is not None:
+        return _resolve(alias)
+    if model_name.startswith("ft:"):
+        # Fine-tunes are billed at their own rates, never at the base model's
+        base = model_name.split(":")[1]
+        return f"{base}-finetuned" if f"{base}-finetuned" in index else None
+    if ":ft-" in model_name:
+        base = model_name.split(":")[0]
+        return f"{base}-finetuned-legacy" if f"{base}-finetuned-legacy" in index else None
+    snapshot = _SNAPSHOT.search(model_name)
+    if snapshot is not None:
+        base = model_name[:snapshot.start()]
+        if base in index:
+            return base
+        alias = MODEL_ALIASES.get(base)
+        if alias is not None:
+            return _resolve(alias)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def resolve_model(model_name: str) -> typing.Optional[str]:
+    """
+    Resolves a model name to the key of its entry in PRICING_INDEX, or None.
+
+    Handles exact names, registered aliases, fine-tune IDs
+    ("ft:gpt-4o-mini-2024-07-18:org::id" and legacy "curie:ft-org-2023-..."),
+    and dated snapshots of a known model ("gpt-4o-2025-06-01", "gpt-4-0613").
+    Other names, such as "o3-pro" when only o3 is listed, are not guessed at:
+    they resolve to None and are logged once.
+    """
+    resolved = _resolve(model_name)
+    if resolved is None:
+        logger.warning("No price for model %r; its calls are counted at zero cost", model_name)
+    return resolved
+
+
+@lru_cache(maxsize=4096)
+def get_model_price(model_name: str) -> ModelPrice:
+    """
+    Returns the per-1k-token prices for a model, or ZERO_PRICE if unknown.
+    """
+    resolved = resolve_model(model_name)
+    if resolved is None:
+        return ZERO_PRICE
+    return _pricing_index()[resolved]
+
+
+def _nanos_per_token(per_1k: typing.Optional[float]) -> typing.Optional[int]:
+    if per_1k is None:
+        return None
+    return round(per_1k * (NANODOLLARS_PER_USD // 1000))
+
+
+@lru_cache(maxsize=4096)
+def get_model_price_nanos(model_name: str) -> ModelPrice:
+    """
+    Returns a model's prices as integer nano-dollars per token. Every listed
+    price is a whole number of nano-dollars; finer registered prices are
+    rounded to the nearest one.
+    """
+    price = get_model_price(model_name)
+    return ModelPrice(_nanos_per_token(price.input), _nanos_per_token(price.cached_input),
+                      _nanos_per_token(price.output))
+
+
+def _clear_lookup_caches() -> None:
+    resolve_model.cache_clear()
+    get_model_price.cache_clear()
+    get_model_price_nanos.cache_clear()
+
+
+def register_alias(alias: str, model_name: str) -> None:
+    """
+    Prices alias like model_name, e.g. an Azure deployment name.
+    """
+    MODEL_ALIASES[alias] = model_name
+    _clear_lookup_caches()
+
+
+def register_price(
+    model_name: str,
+    input: float,
+    output: float,
+    cached_input: typing.Optional[float] = None,
+) -> None:
+    """
+    Adds or replaces a model's prices (USD per 1k tokens).
+    """
+    price = ModelPrice(input, cached_input, output)
+    index = _pricing_index()
+    with _load_lock:
+        _REGISTERED[model_name] = price
+        index[model_name] = price
+        dict.pop(_FLAT, f"{model_name}-cached", None)
+        dict.update(_FLAT, _flat_entries(model_name, price))
+    _clear_lookup_caches()
+
+
+def _refresh_model(model_name: str) -> None:
+    """
+    Recompiles one model's index entry after a write to the flat table, and
+    keeps it like a register_price() price.
+    """
+    keys = (model_name, f"{model_name}-cached", f"{model_name}-completion")
+    entries = {key: _FLAT[key] for key in keys if key in _FLAT}
+    if entries:
+        price = _compile_index(entries)[model_name]
+        _INDEX[model_name] = _REGISTERED[model_name] = price
+    else:
+        _INDEX.pop(model_name, None)
+        _REGISTERED.pop(model_name, None)
+    _clear_lookup_caches()
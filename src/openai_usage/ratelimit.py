@@ -0,0 +1,186 @@
+"""
+Client-side admission control from observed token usage.
+
+AdmissionController keeps a tokens-per-minute and a requests-per-minute
+bucket per model. Before a call it reserves the request's estimated size,
+waiting briefly or rejecting locally when the bucket is empty; afterwards
+the reservation is settled with the tokens the API actually reported.
+Pass it as OpenAIUsage(client, limiter=...).
+"""
+import asyncio
+import json
+import threading
+import time
+import typing
+
+# Rough characters-per-token ratio used to size requests before sending them.
+CHARS_PER_TOKEN = 4
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised instead of sending a request that would have to wait longer than
+    the controller's max_wait for capacity.
+    """
+
+    def __init__(self, model: str, wait: float) -> None:
+        super().__init__(f"Rate limit for {model!r} needs {wait:.2f}s of capacity")
+        self.model = model
+        self.wait = wait
+
+
+class _Bucket:
+    """
+    Token bucket that may go into debt: reservations are granted up front and
+    callers sleep off the deficit.
+    """
+    __slots__ = ("capacity", "rate", "level", "updated")
+
+    def __init__(self, per_minute: float, now: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        # Requests larger than the whole bucket are let through once it is full
+        deficit = min(amount, self.capacity) - self.level
+        return deficit / self.rate if deficit > 0 else 0.0
+
+
+class Reservation(typing.NamedTuple):
+    model: str
+    tokens: int
+    wait: float
+
+
+def estimate_tokens(kwargs: typing.Mapping[str, typing.Any], default_output_tokens: int = 256) -> int:
+    """
+    Estimates a request's total tokens from its input size and output limit.
+    """
+    size = 0
+    for key in ("input", "instructions", "messages"):
+        value = kwargs.get(key)
+        if isinstance(value, str):
+            size += len(value)
+        elif value is not None:
+            size += len(json.dumps(value, default=str))
+    output = kwargs.get("max_output_tokens") or kwargs.get("max_tokens") or default_output_tokens
+    return size // CHARS_PER_TOKEN + int(output)
+
+
+class AdmissionController:
+    """
+    Per-model TPM/RPM admission shared by all threads and asyncio tasks.
+
+    limits maps a model name to (tokens_per_minute, requests_per_minute);
+    default_limits applies to models not listed (None for no limit). A call
+    that would wait longer than max_wait raises RateLimitExceeded right away.
+    """
+
+    def __init__(
+        self,
+        limits: typing.Optional[typing.Mapping[str, typing.Tuple[float, float]]] = None,
+        default_limits: typing.Optional[typing.Tuple[float, float]] = None,
+        max_wait: float = 5.0,
+        estimator: typing.Callable[[typing.Mapping[str, typing.Any]], int] = estimate_tokens,
+        clock: typing.Callable[[], float] = time.monotonic,
+        sleep: typing.Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.limits = dict(limits or {})
+        self.default_limits = default_limits
+        self.max_wait = max_wait
+        self.estimator = estimator
+        self.rejected = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets: typing.Dict[str, typing.Tuple[_Bucket, _Bucket]] = {}
+        self._lock = threading.Lock()
+
+    def _model_buckets(self, model: str, now: float) -> typing.Optional[typing.Tuple[_Bucket, _Bucket]]:
+        buckets = self._buckets.get(model)
+        if buckets is None:
+            limits = self.limits.get(model, self.default_limits)
+            if limits is None:
+                return None
+            tpm, rpm = limits
+            buckets = self._buckets[model] = (_Bucket(tpm, now), _Bucket(rpm, now))
+        return buckets
+
+    def reserve(self, model: typing.Optional[str], tokens: int) -> typing.Optional[Reservation]:
+        """
+        Reserves capacity for one request without sleeping. Returns None when
+        the model is unlimited, otherwise a Reservation whose wait is how long
+        the caller must sleep before sending.
+        """
+        if not model:
+            return None
+        with self._lock:
+            now = self._clock()
+            buckets = self._model_buckets(model, now)
+            if buckets is None:
+                return None
+            token_bucket, request_bucket = buckets
+            token_bucket.refill(now)
+            request_bucket.refill(now)
+            wait = max(token_bucket.wait_for(tokens), request_bucket.wait_for(1))
+            if wait > self.max_wait:
+                self.rejected += 1
+                raise RateLimitExceeded(model, wait)
+            token_bucket.level -= tokens
+            request_bucket.level -= 1
+            return Reservation(model, tokens, wait)
+
+    def settle(self, reservation: typing.Optional[Reservation], actual_tokens: typing.Optional[float]) -> None:
+        """
+        Corrects a reservation's token estimate with the observed usage.
+        """
+        if reservation is None or actual_tokens is None:
+            return
+        with self._lock:
+            buckets = self._buckets.get(reservation.model)
+            if buckets is not None:
+                token_bucket = buckets[0]
+                token_bucket.level = min(token_bucket.capacity, token_bucket.level + reservation.tokens - actual_tokens)
+
+    def refund(self, reservation: typing.Optional[Reservation]) -> None:
+        """
+        Gives back the capacity of a reservation whose request was never sent.
+        """
+        if reservation is None:
+            return
+        with self._lock:
+            buckets = self._buckets.get(reservation.model)
+            if buckets is not None:
+                token_bucket, request_bucket = buckets
+                token_bucket.level = min(token_bucket.capacity, token_bucket.level + reservation.tokens)
+                request_bucket.level = min(request_bucket.capacity, request_bucket.level + 1)
+
+    def acquire(self, model: typing.Optional[str], kwargs: typing.Mapping[str, typing.Any]) -> typing.Optional[Reservation]:
+        if not model:
+            return None
+        reservation = self.reserve(model, self.estimator(kwargs))
+        if reservation is not None and reservation.wait > 0:
+            try:
+                self._sleep(reservation.wait)
+            except BaseException:
+                self.refund(reservation)
+                raise
+        return reservation
+
+    async def acquire_async(self, model: typing.Optional[str], kwargs: typing.Mapping[str, typing.Any]) -> typing.Optional[Reservation]:
+        if not model:
+            return None
+        reservation = self.reserve(model, self.estimator(kwargs))
+        if reservation is not None and reservation.wait > 0:
+            try:
+                await asyncio.sleep(reservation.wait)
+            except BaseException:
+                # Cancelled while waiting: the request is never sent
+                self.refund(reservation)
+                raise
+        return reservation
@@ -0,0 +1,243 @@
+"""
+Parallel usage reports over large JSONL files.
+
+The file is memory-mapped and split on line boundaries into chunks; each
+chunk is parsed and priced in a worker process, which only sends back its
+per-group aggregates. Memory use is bounded by the number of groups, not
+by the size of the file.
+"""
+import datetime
+import json
+import mmap
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+from .model_costs import get_model_price
+from .usage import _slot_costs, _slot_tokens, _usage_items
+
+GROUP_FIELDS = ("model", "day", "tag")
+
+# Order of the aggregated metrics in a report row.
+METRICS = (
+    "calls",
+    "input_tokens",
+    "cached_tokens",
+    "output_tokens",
+    "cost_input_tokens",
+    "cost_input_cached_tokens",
+    "cost_output_tokens",
+    "cost_total",
+)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Batch API traffic is billed at half the synchronous price.
+BATCH_DISCOUNT = 0.5
+
+GroupKey = typing.Tuple[typing.Optional[str], ...]
+Aggregates = typing.Dict[GroupKey, typing.List[float]]
+
+
+def _lookup(record: typing.Mapping[str, typing.Any], dotted_key: str):
+    value: typing.Any = record
+    for part in dotted_key.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _tag(record: typing.Mapping[str, typing.Any], dotted_key: str):
+    """
+    Returns the tag value of a record; lists and dicts become their JSON text
+    so that they can be grouped on.
+    """
+    value = _lookup(record, dotted_key)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return value
+
+
+def _day(record: typing.Mapping[str, typing.Any]) -> typing.Optional[str]:
+    """
+    Returns the UTC date of a record from created_at/created/timestamp.
+    """
+    for key in ("created_at", "created", "timestamp"):
+        value = record.get(key)
+        if isinstance(value, (int, float)):
+            return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).date().isoformat()
+        if isinstance(value, str) and len(value) >= 10:
+            return value[:10]
+    return None
+
+
+def unwrap_record(record: typing.Mapping[str, typing.Any]) -> typing.Mapping[str, typing.Any]:
+    """
+    Returns the response object inside a Batch API output line, or the record
+    itself for plain response/usage records. A result that is not the record
+    itself came from the Batch API and is priced at BATCH_DISCOUNT.
+    """
+    response = record.get("response")
+    if isinstance(response, dict) and isinstance(response.get("body"), dict):
+        return response["body"]
+    return record
+
+
+def price_record(
+    record: typing.Mapping[str, typing.Any],
+    discount: float = 1.0,
+) -> typing.Optional[typing.Tuple[typing.List[float], typing.Tuple[float, float, float]]]:
+    """
+    Returns ([input, cached input, output] tokens, their costs) for a response
+    or usage record, or None if it has no usage. Costs are multiplied by
+    discount (e.g. 0.5 for Batch API traffic).
+    """
+    items = _usage_items(record.get("usage"))
+    if not items:
+        return None
+    tokens = _slot_tokens(items)
+    model = record.get("model")
+    if not model:
+        return tokens, (0.0, 0.0, 0.0)
+    costs = _slot_costs(get_model_price(model), tokens)
+    if discount != 1.0:
+        costs = (costs[0] * discount, costs[1] * discount, costs[2] * discount)
+    return tokens, costs
+
+
+def add_to_aggregates(aggregates: Aggregates, key: GroupKey, tokens, costs) -> None:
+    row = aggregates.get(key)
+    if row is None:
+        row = aggregates[key] = [0] * len(METRICS)
+    row[0] += 1
+    row[1] += tokens[0]
+    row[2] += tokens[1]
+    row[3] += tokens[2]
+    row[4] += costs[0]
+    row[5] += costs[1]
+    row[6] += costs[2]
+    row[7] += costs[0] + costs[1] + costs[2]
+
+
+def merge_aggregates(into: Aggregates, other: Aggregates) -> None:
+    for key, row in other.items():
+        existing = into.get(key)
+        if existing is None:
+            into[key] = list(row)
+        else:
+            for i, v in enumerate(row):
+                existing[i] += v
+
+
+def split_lines(path: str, chunks: int) -> typing.List[typing.Tuple[int, int]]:
+    """
+    Splits a file into at most `chunks` (start, end) byte ranges that begin and
+    end on line boundaries.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    step = max(1, size // max(1, chunks))
+    ranges = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = mm.find(b"\n", min(start + step, size) - 1)
+            end = size if end == -1 else end + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def iter_lines(mm: mmap.mmap, start: int, end: int) -> typing.Iterator[bytes]:
+    """
+    Yields the non-empty lines of mm[start:end] without reading the rest.
+    """
+    pos = start
+    while pos < end:
+        nl = mm.find(b"\n", pos, end)
+        if nl == -1:
+            nl = end
+        if nl > pos:
+            yield mm[pos:nl]
+        pos = nl + 1
+
+
+def _report_chunk(
+    path: str,
+    start: int,
+    end: int,
+    group_by: typing.Sequence[str],
+    tag_key: str,
+) -> typing.Tuple[Aggregates, int]:
+    """
+    Parses and prices one chunk; returns its aggregates and skipped line count.
+    """
+    aggregates: Aggregates = {}
+    skipped = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for line in iter_lines(mm, start, end):
+            try:
+                line_record = json.loads(line)
+                record = unwrap_record(line_record)
+            except (ValueError, AttributeError):
+                skipped += 1
+                continue
+            priced = price_record(record, 1.0 if record is line_record else BATCH_DISCOUNT)
+            if priced is None:
+                skipped += 1
+                continue
+            key = tuple(
+                record.get("model") if field == "model"
+                else _day(record) if field == "day"
+                else _tag(record, tag_key)
+                for field in group_by
+            )
+            add_to_aggregates(aggregates, key, *priced)
+    return aggregates, skipped
+
+
+class Report(typing.NamedTuple):
+    group_by: typing.Tuple[str, ...]
+    rows: Aggregates
+    skipped: int
+
+
+def report_files(
+    paths: typing.Sequence[str],
+    group_by: typing.Sequence[str] = ("model",),
+    tag_key: str = "metadata.tag",
+    workers: typing.Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Report:
+    """
+    Aggregates token usage and cost of JSONL files of responses, usage records
+    or Batch API output lines, grouped by any of "model", "day" and "tag".
+    """
+    for field in group_by:
+        if field not in GROUP_FIELDS:
+            raise ValueError(f"Unknown group-by field {field!r}, expected one of {GROUP_FIELDS}")
+    workers = workers or os.cpu_count() or 1
+
+    tasks = []
+    for path in paths:
+        # Several chunks per worker keeps the pool busy when lines are uneven
+        chunks = max(workers * 4, os.path.getsize(path) // max(1, chunk_size) + 1)
+        tasks.extend((path, start, end) for start, end in split_lines(path, chunks))
+
+    rows: Aggregates = {}
+    skipped = 0
+    if workers == 1 or len(tasks) <= 1:
+        results = (_report_chunk(path, start, end, group_by, tag_key) for path, start, end in tasks)
+        for aggregates, chunk_skipped in results:
+            merge_aggregates(rows, aggregates)
+            skipped += chunk_skipped
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_report_chunk, path, start, end, group_by, tag_key) for path, start, end in tasks]
+            for future in futures:
+                aggregates, chunk_skipped = future.result()
+                merge_aggregates(rows, aggregates)
+                skipped += chunk_skipped
+    return Report(tuple(group_by), rows, skipped)
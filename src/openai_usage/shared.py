@@ -0,0 +1,306 @@
+"""
+Fleet-wide usage totals in shared memory.
+
+SharedUsage is a sink for OpenAIUsage that adds every call to counters in a
+multiprocessing.shared_memory block. Each process writes only to its own
+shard, so updates take no cross-process lock; readers (any process, or a
+sidecar attached by name) sum the shards, using a per-shard sequence
+counter (seqlock) to copy each one consistently.
+
+    # in the parent, before forking workers
+    shared = SharedUsage("openai-usage")
+    # in every worker
+    with OpenAIUsage(client, sinks=[shared]): ...
+    # anywhere
+    SharedUsage.attach("openai-usage").snapshot()
+"""
+import os
+import struct
+import threading
+import typing
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+from .usage import CallRecord
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+METRICS = ("calls", "input_tokens", "cached_tokens", "output_tokens", "reasoning_tokens", "cost", "latency")
+
+_MAGIC = b"OAUSAGE1"
+_HEADER = struct.Struct("<8sIII")
+_HEADER_SIZE = 64
+_NAME_BYTES = 64
+# Model name under which a shard counts the models it has no slot left for
+OTHER_MODELS = "(other)"
+# Per shard: owner pid, sequence counter, number of models in use.
+_SHARD_META = 24
+_OWNER = struct.Struct("q")
+
+
+class _Layout(typing.NamedTuple):
+    max_processes: int
+    max_models: int
+
+    @property
+    def shard_size(self) -> int:
+        return _SHARD_META + self.max_models * (_NAME_BYTES + 8 * len(METRICS))
+
+    @property
+    def size(self) -> int:
+        return _HEADER_SIZE + self.max_processes * self.shard_size
+
+    def shard_offset(self, index: int) -> int:
+        return _HEADER_SIZE + index * self.shard_size
+
+
+class _Shard:
+    """
+    Views onto one process's slice of the block.
+    """
+
+    def __init__(self, buf: memoryview, layout: _Layout, index: int) -> None:
+        offset = layout.shard_offset(index)
+        names_size = layout.max_models * _NAME_BYTES
+        self.index = index
+        self.meta = buf[offset:offset + _SHARD_META].cast("q")
+        self.names = buf[offset + _SHARD_META:offset + _SHARD_META + names_size]
+        self.counters = buf[offset + _SHARD_META + names_size:offset + layout.shard_size].cast("d")
+
+    def release(self) -> None:
+        self.meta.release()
+        self.names.release()
+        self.counters.release()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Blocks created by this process or, through fork, by an ancestor.
+_CREATED: typing.Set[str] = set()
+
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    """
+    Opens an existing block without letting this process's resource tracker
+    unlink it at exit; only the creator owns it.
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)  # type: ignore[call-arg]
+    except TypeError:  # before Python 3.13 attaching always registers
+        shm = shared_memory.SharedMemory(name)
+        # A tracker shared with the creator already knows the block, and
+        # unregistering would drop the creator's registration too
+        if shm.name not in _CREATED:
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        return shm
+
+
+_INSTANCES: "weakref.WeakSet[SharedUsage]" = weakref.WeakSet()
+
+
+def _after_fork() -> None:
+    # A forked child must not keep writing into its parent's shard
+    for instance in list(_INSTANCES):
+        instance._forget_shard()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class SharedUsage:
+    """
+    Per-model usage counters shared by all processes attached to one block.
+
+    The block has one shard per process (up to max_processes) with room for
+    max_models models each; once a process has seen max_models - 1 models,
+    further ones are counted under OTHER_MODELS. A process claims a free shard, or the shard of a
+    process that has exited (its totals are kept), on its first record().
+    """
+
+    def __init__(
+        self,
+        name: typing.Optional[str] = None,
+        create: bool = True,
+        max_processes: int = 256,
+        max_models: int = 64,
+    ) -> None:
+        if create:
+            self.layout = _Layout(max_processes, max_models)
+            self._shm = shared_memory.SharedMemory(name, create=True, size=self.layout.size)
+            _CREATED.add(self._shm.name)
+            _HEADER.pack_into(self._shm.buf, 0, _MAGIC, max_processes, max_models, len(METRICS))
+        else:
+            if name is None:
+                raise ValueError("name is required to attach to an existing block")
+            self._shm = _attach_block(name)
+            magic, max_processes, max_models, metrics = _HEADER.unpack_from(self._shm.buf, 0)
+            if magic != _MAGIC or metrics != len(METRICS):
+                self._shm.close()
+                raise ValueError(f"Shared memory block {name!r} is not a SharedUsage block")
+            self.layout = _Layout(max_processes, max_models)
+        self._lock = threading.Lock()
+        self._shard: typing.Optional[_Shard] = None
+        self._models: typing.Dict[typing.Optional[str], int] = {}
+        _INSTANCES.add(self)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedUsage":
+        return cls(name, create=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def _forget_shard(self) -> None:
+        self._lock = threading.Lock()
+        self._shard = None
+        self._models = {}
+
+    def _claim(self) -> _Shard:
+        pid = os.getpid()
+        fd = getattr(self._shm, "_fd", -1)
+        locked = fcntl is not None and fd >= 0
+        if locked:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            for index in range(self.layout.max_processes):
+                shard = _Shard(self._shm.buf, self.layout, index)
+                owner = shard.meta[0]
+                if owner == 0 or owner == pid or not _alive(owner):
+                    shard.meta[0] = pid
+                    if shard.meta[1] % 2:
+                        shard.meta[1] += 1  # the previous owner died mid-update
+                    self._models = {
+                        name: i for i, name in enumerate(self._shard_models(shard, shard.meta[2]))
+                    }
+                    return shard
+                shard.release()
+        finally:
+            if locked:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        raise ValueError(f"SharedUsage can't track more than {self.layout.max_processes} processes")
+
+    @staticmethod
+    def _shard_models(shard: _Shard, count: int) -> typing.List[typing.Optional[str]]:
+        names = []
+        for i in range(count):
+            raw = bytes(shard.names[i * _NAME_BYTES:(i + 1) * _NAME_BYTES]).rstrip(b"\0")
+            names.append(raw.decode("utf-8") if raw else None)
+        return names
+
+    def _model_slot(self, shard: _Shard, model: typing.Optional[str]) -> int:
+        slot = self._models.get(model)
+        if slot is None:
+            slot = int(shard.meta[2])
+            if slot >= self.layout.max_models - 1 and model != OTHER_MODELS:
+                # The last slot collects the models that don't fit
+                return self._model_slot(shard, OTHER_MODELS)
+            encoded = (model or "").encode("utf-8")[:_NAME_BYTES]
+            shard.names[slot * _NAME_BYTES:slot * _NAME_BYTES + len(encoded)] = encoded
+            shard.meta[2] = slot + 1
+            self._models[model] = slot
+        return slot
+
+    def record(self, call: CallRecord) -> None:
+        with self._lock:
+            shard = self._shard
+            if shard is None:
+                shard = self._shard = self._claim()
+            meta = shard.meta
+            # Odd sequence numbers mark a write in progress
+            meta[1] += 1
+            try:
+                base = self._model_slot(shard, call.model) * len(METRICS)
+                counters = shard.counters
+                counters[base] += 1
+                counters[base + 1] += call.input_tokens
+                counters[base + 2] += call.cached_tokens
+                counters[base + 3] += call.output_tokens
+                counters[base + 4] += call.reasoning_tokens
+                counters[base + 5] += call.cost
+                counters[base + 6] += call.latency
+            finally:
+                meta[1] += 1
+
+    def _read_shard(self, shard: _Shard) -> typing.Tuple[int, typing.List[typing.Optional[str]], typing.List[float]]:
+        spins = 0
+        while True:
+            before = shard.meta[1]
+            if before % 2:
+                spins += 1
+                # A writer that died mid-update never finishes; read what it left
+                if spins < 10_000 or _alive(int(shard.meta[0])):
+                    continue
+                before = -1
+            count = int(shard.meta[2])
+            names = self._shard_models(shard, count)
+            values = shard.counters[:count * len(METRICS)].tolist()
+            if before == -1 or shard.meta[1] == before:
+                return count, names, values
+
+    def snapshot(self) -> typing.Dict[typing.Optional[str], typing.Dict[str, float]]:
+        """
+        Returns the fleet-wide totals of every metric in METRICS, per model.
+        Each shard is copied consistently; shards are read one after another.
+        """
+        totals: typing.Dict[typing.Optional[str], typing.Dict[str, float]] = {}
+        buf = self._shm.buf
+        for index in range(self.layout.max_processes):
+            if _OWNER.unpack_from(buf, self.layout.shard_offset(index))[0] == 0:
+                continue  # never claimed
+            shard = _Shard(buf, self.layout, index)
+            try:
+                count, names, values = self._read_shard(shard)
+            finally:
+                shard.release()
+            for i, model in enumerate(names):
+                row = totals.get(model)
+                if row is None:
+                    row = totals[model] = dict.fromkeys(METRICS, 0.0)
+                for j, metric in enumerate(METRICS):
+                    row[metric] += values[i * len(METRICS) + j]
+        return totals
+
+    def totals(self) -> typing.Dict[str, float]:
+        """
+        Returns the fleet-wide totals over all models.
+        """
+        result = dict.fromkeys(METRICS, 0.0)
+        for row in self.snapshot().values():
+            for metric, value in row.items():
+                result[metric] += value
+        return result
+
+    def close(self) -> None:
+        """
+        Detaches this process from the block.
+        """
+        with self._lock:
+            if self._shard is not None:
+                self._shard.release()
+                self._shard = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """
+        Destroys the block; call once, from the process that created it.
+        """
+        self._shm.unlink()
+
+    def __enter__(self) -> "SharedUsage":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
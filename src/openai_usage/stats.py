@@ -0,0 +1,373 @@
+"""
+Latency, throughput and prompt-cache statistics, in bounded memory.
+
+UsageStats and PromptCacheStats are sinks for OpenAIUsage:
+OpenAIUsage(client, sinks=[stats]).
+"""
+import collections
+import hashlib
+import json
+import math
+import threading
+import time
+import typing
+from array import array
+
+from .model_costs import get_model_price
+from .usage import CallRecord
+
+# Prompts shorter than this are never served from the provider's prompt cache.
+MIN_CACHED_PROMPT_TOKENS = 1024
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed (HDR-style) histogram: every bucket spans the same relative
+    width, so any recorded value is reported within `precision` of its true
+    value while memory stays fixed regardless of the number of samples.
+    """
+
+    def __init__(self, min_value: float = 1e-4, max_value: float = 3600.0, precision: float = 0.02) -> None:
+        self.min_value = min_value
+        self.max_value = max_value
+        self._log_base = math.log1p(precision)
+        self._buckets = self.bucket_of(max_value) + 1
+        self.counts = array("Q", bytes(8 * self._buckets))
+        self.count = 0
+        self.total = 0.0
+
+    def bucket_of(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return int(math.log(min(value, self.max_value) / self.min_value) / self._log_base) + 1
+
+    def value_of(self, bucket: int) -> float:
+        """
+        Returns the geometric middle of a bucket.
+        """
+        if bucket == 0:
+            return self.min_value
+        return self.min_value * math.exp((bucket - 0.5) * self._log_base)
+
+    def record(self, value: float) -> int:
+        bucket = self.bucket_of(value)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += value
+        return bucket
+
+    def percentile(self, q: float) -> typing.Optional[float]:
+        """
+        Returns the q-th percentile (0-100), or None if nothing was recorded.
+        """
+        return _percentile(enumerate(self.counts), self.count, q, self.value_of)
+
+
+def _percentile(bucket_counts: typing.Iterable[typing.Tuple[int, int]], count: int, q: float,
+                value_of: typing.Callable[[int], float]) -> typing.Optional[float]:
+    if count == 0:
+        return None
+    rank = max(1, math.ceil(count * q / 100.0))
+    seen = 0
+    for bucket, n in bucket_counts:
+        seen += n
+        if seen >= rank:
+            return value_of(bucket)
+    return None
+
+
+# All series share the default bucket layout; used to map buckets back to values.
+_DEFAULT_HISTOGRAM = LatencyHistogram()
+
+
+class _Slot:
+    __slots__ = ("second", "calls", "output_tokens", "latency_buckets")
+
+    def __init__(self) -> None:
+        self.second = -1
+        self.calls = 0
+        self.output_tokens = 0
+        self.latency_buckets: typing.Dict[int, int] = {}
+
+
+class RollingWindow:
+    """
+    Per-second counters for the last `seconds` seconds, kept in a ring.
+    """
+
+    def __init__(self, seconds: int = 60) -> None:
+        self.seconds = seconds
+        self._slots = [_Slot() for _ in range(seconds)]
+
+    def record(self, now: float, output_tokens: float, latency_bucket: int) -> None:
+        second = int(now)
+        slot = self._slots[second % self.seconds]
+        if slot.second != second:
+            slot.second = second
+            slot.calls = 0
+            slot.output_tokens = 0
+            slot.latency_buckets = {}
+        slot.calls += 1
+        slot.output_tokens += output_tokens
+        slot.latency_buckets[latency_bucket] = slot.latency_buckets.get(latency_bucket, 0) + 1
+
+    def slots(self, now: float, last: int) -> typing.List[_Slot]:
+        second = int(now)
+        return [slot for slot in self._slots if second - min(last, self.seconds) < slot.second <= second]
+
+
+class _Series:
+    __slots__ = ("latency", "time_to_first_token", "window", "output_tokens")
+
+    def __init__(self, window: int) -> None:
+        self.latency = LatencyHistogram()
+        self.time_to_first_token = LatencyHistogram()
+        self.window = RollingWindow(window)
+        self.output_tokens = 0
+
+
+class UsageStats:
+    """
+    Latency histograms (all calls, and time to first token for streams) plus
+    per-second rolling windows, kept per (model, endpoint).
+    """
+
+    def __init__(self, window: int = 60, clock: typing.Callable[[], float] = time.monotonic) -> None:
+        self.window = window
+        self._clock = clock
+        self._series: typing.Dict[typing.Tuple[typing.Optional[str], str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def record(self, call: CallRecord) -> None:
+        key = (call.model, call.endpoint)
+        now = self._clock()
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.window)
+            bucket = series.latency.record(call.latency)
+            if call.time_to_first_token is not None:
+                series.time_to_first_token.record(call.time_to_first_token)
+            series.output_tokens += call.output_tokens
+            series.window.record(now, call.output_tokens, bucket)
+
+    def keys(self) -> typing.List[typing.Tuple[typing.Optional[str], str]]:
+        with self._lock:
+            return list(self._series)
+
+    def summary(
+        self,
+        model: typing.Optional[str] = None,
+        endpoint: typing.Optional[str] = None,
+        last: typing.Optional[int] = None,
+    ) -> typing.Dict[str, typing.Optional[float]]:
+        """
+        Returns call count, p50/p95/p99 latency (seconds) and time to first
+        token, calls/sec and output tokens/sec for the matching series.
+
+        With last=N, everything is computed over the last N seconds only
+        (N is capped at the window size); time to first token is all-time.
+        """
+        now = self._clock()
+        with self._lock:
+            matching = [
+                s for (m, e), s in self._series.items()
+                if (model is None or m == model) and (endpoint is None or e == endpoint)
+            ]
+            latency_buckets: typing.Dict[int, int] = {}
+            ttft_buckets: typing.Dict[int, int] = {}
+            calls = output_tokens = ttft_count = 0
+            for series in matching:
+                for bucket, n in enumerate(series.time_to_first_token.counts):
+                    if n:
+                        ttft_buckets[bucket] = ttft_buckets.get(bucket, 0) + n
+                ttft_count += series.time_to_first_token.count
+                if last is None:
+                    calls += series.latency.count
+                    output_tokens += series.output_tokens
+                    for bucket, n in enumerate(series.latency.counts):
+                        if n:
+                            latency_buckets[bucket] = latency_buckets.get(bucket, 0) + n
+                else:
+                    for slot in series.window.slots(now, last):
+                        calls += slot.calls
+                        output_tokens += slot.output_tokens
+                        for bucket, n in slot.latency_buckets.items():
+                            latency_buckets[bucket] = latency_buckets.get(bucket, 0) + n
+
+        value_of = _DEFAULT_HISTOGRAM.value_of
+        latency = sorted(latency_buckets.items())
+        ttft = sorted(ttft_buckets.items())
+        summary: typing.Dict[str, typing.Optional[float]] = {"calls": calls}
+        for q in (50, 95, 99):
+            summary[f"latency_p{q}"] = _percentile(latency, calls, q, value_of)
+        for q in (50, 95, 99):
+            summary[f"time_to_first_token_p{q}"] = _percentile(ttft, ttft_count, q, value_of)
+        if last is not None:
+            seconds = min(last, self.window)
+            summary["calls_per_second"] = calls / seconds
+            summary["output_tokens_per_second"] = output_tokens / seconds
+        return summary
+
+
+# Request parameters in the order they make up the start of the prompt.
+_PROMPT_PARAMS = ("prompt_cache_key", "tools", "prompt", "instructions", "input", "messages")
+
+
+def _prompt_parts(request: typing.Mapping[str, typing.Any]) -> typing.Iterator[str]:
+    for param in _PROMPT_PARAMS:
+        value = request.get(param)
+        if value is None:
+            continue
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, (list, tuple)):
+            # One item at a time, so long conversations are not serialized whole
+            for item in value:
+                yield item if isinstance(item, str) else json.dumps(item, sort_keys=True, default=str)
+        else:
+            yield json.dumps(value, sort_keys=True, default=str)
+
+
+def prompt_fingerprint(request: typing.Mapping[str, typing.Any],
+                       prefix_chars: int = 1024) -> typing.Tuple[typing.Optional[str], str]:
+    """
+    Returns (fingerprint, prefix) for the first prefix_chars characters of a
+    request's prompt (prompt_cache_key, tools, instructions, then input or
+    messages). Requests built from the same template share a fingerprint as
+    long as their variable parts come after the prefix. The fingerprint is
+    None for a request without a prompt.
+    """
+    parts: typing.List[str] = []
+    length = 0
+    for part in _prompt_parts(request):
+        parts.append(part)
+        length += len(part)
+        if length >= prefix_chars:
+            break
+    prefix = "".join(parts)[:prefix_chars]
+    if not prefix:
+        return None, ""
+    return hashlib.blake2b(prefix.encode("utf-8"), digest_size=8).hexdigest(), prefix
+
+
+class _CacheCounts:
+    __slots__ = ("calls", "eligible_calls", "hits", "input_tokens", "cached_tokens", "sample")
+
+    def __init__(self, sample: str = "") -> None:
+        self.calls = 0
+        self.eligible_calls = 0
+        self.hits = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.sample = sample
+
+    def add(self, call: CallRecord) -> None:
+        self.calls += 1
+        if call.input_tokens >= MIN_CACHED_PROMPT_TOKENS:
+            self.eligible_calls += 1
+            self.hits += call.cached_tokens > 0
+            self.input_tokens += call.input_tokens
+            self.cached_tokens += call.cached_tokens
+
+    def merge(self, other: "_CacheCounts") -> None:
+        self.calls += other.calls
+        self.eligible_calls += other.eligible_calls
+        self.hits += other.hits
+        self.input_tokens += other.input_tokens
+        self.cached_tokens += other.cached_tokens
+
+    def summary(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "calls": self.calls,
+            "eligible_calls": self.eligible_calls,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.eligible_calls if self.eligible_calls else None,
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "token_hit_rate": self.cached_tokens / self.input_tokens if self.input_tokens else None,
+        }
+
+
+class PromptCacheStats:
+    """
+    Prompt-cache hit rates per model and per prompt-prefix fingerprint (see
+    prompt_fingerprint()), to find the prompt templates that miss the
+    provider's prefix cache.
+
+    Only calls with prompts long enough to be cached (MIN_CACHED_PROMPT_TOKENS)
+    count towards hit rates. At most max_prefixes fingerprints are tracked;
+    the least recently seen one is dropped to make room for a new one.
+    """
+
+    def __init__(self, max_prefixes: int = 1000, prefix_chars: int = 1024) -> None:
+        self.max_prefixes = max_prefixes
+        self.prefix_chars = prefix_chars
+        self.evictions = 0
+        self._models: typing.Dict[typing.Optional[str], _CacheCounts] = {}
+        self._prefixes: "collections.OrderedDict[typing.Tuple[typing.Optional[str], str], _CacheCounts]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def record(self, call: CallRecord) -> None:
+        with self._lock:
+            counts = self._models.get(call.model)
+            if counts is None:
+                counts = self._models[call.model] = _CacheCounts()
+            counts.add(call)
+
+    def record_request(self, call: CallRecord, request: typing.Mapping[str, typing.Any]) -> None:
+        fingerprint, prefix = prompt_fingerprint(request, self.prefix_chars)
+        if fingerprint is None:
+            return
+        key = (call.model, fingerprint)
+        with self._lock:
+            counts = self._prefixes.get(key)
+            if counts is None:
+                counts = self._prefixes[key] = _CacheCounts(prefix[:80])
+                if len(self._prefixes) > self.max_prefixes:
+                    self._prefixes.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._prefixes.move_to_end(key)
+            counts.add(call)
+
+    def summary(self, model: typing.Optional[str] = None) -> typing.Dict[str, typing.Any]:
+        """
+        Returns calls, cache-eligible calls, hits, hit_rate (share of eligible
+        calls with any cached tokens), token_hit_rate (share of their input
+        tokens that were cached) and the USD saved by the cached rate, over
+        one model or all of them.
+        """
+        total = _CacheCounts()
+        savings = 0.0
+        with self._lock:
+            for name, counts in self._models.items():
+                if model is not None and name != model:
+                    continue
+                total.merge(counts)
+                if name:
+                    price = get_model_price(name)
+                    if price.cached_input is not None:
+                        savings += counts.cached_tokens / 1000.0 * (price.input - price.cached_input)
+        summary = total.summary()
+        summary["savings"] = savings
+        return summary
+
+    def prefixes(self, model: typing.Optional[str] = None,
+                 min_calls: int = 1) -> typing.List[typing.Dict[str, typing.Any]]:
+        """
+        Returns the tracked prompt prefixes with at least min_calls cache-eligible
+        calls, worst token hit rate first. Each entry has the model, the
+        fingerprint, the start of the prefix as sample, and the counts of
+        summary().
+        """
+        with self._lock:
+            rows = [
+                dict(model=m, fingerprint=fingerprint, sample=counts.sample, **counts.summary())
+                for (m, fingerprint), counts in self._prefixes.items()
+                if (model is None or m == model) and counts.eligible_calls >= min_calls
+            ]
+        rows.sort(key=lambda row: (row["token_hit_rate"] or 0.0, -row["eligible_calls"]))
+        return rows
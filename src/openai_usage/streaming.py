@@ -0,0 +1,169 @@
+import time
+import typing
+
+# Terminal Responses API events; each carries the final response, usage included.
+_FINAL_EVENT_TYPES = frozenset(("response.completed", "response.incomplete", "response.failed"))
+
+
+def _output_tokens(usage_data) -> typing.Optional[float]:
+    if isinstance(usage_data, dict):
+        return usage_data.get("output_tokens", usage_data.get("completion_tokens"))
+    return getattr(usage_data, "output_tokens", None)
+
+
+class _UsageStreamBase:
+    """
+    Shared bookkeeping for the sync and async stream proxies.
+
+    Events are handed through untouched as they arrive; the only per-event
+    work is a type check to pick up the usage from the final event. The
+    stream is finished when it ends, is closed, raises (error holds the
+    exception) or is garbage collected unfinished.
+    """
+
+    def __init__(self, stream, on_finish: typing.Callable[["_UsageStreamBase"], None], started_at: float) -> None:
+        self._stream = stream
+        self._on_finish = on_finish
+        self._started_at = started_at
+        self._first_event_at: typing.Optional[float] = None
+        self._finished_at: typing.Optional[float] = None
+        self.usage = None
+        self.model: typing.Optional[str] = None
+        self.error: typing.Optional[BaseException] = None
+
+    def _observe(self, event) -> None:
+        if self._first_event_at is None:
+            self._first_event_at = time.perf_counter()
+        if getattr(event, "type", None) in _FINAL_EVENT_TYPES:
+            response = getattr(event, "response", None)
+            self.usage = getattr(response, "usage", None)
+            self.model = getattr(response, "model", None)
+
+    def _finish(self) -> None:
+        if self._finished_at is None:
+            self._finished_at = time.perf_counter()
+            self._on_finish(self)
+
+    def _fail(self, error: BaseException) -> None:
+        self.error = error
+        self._finish()
+
+    def __del__(self) -> None:
+        # Dropped without being read to the end or closed. Checked through
+        # __dict__, as __getattr__ would recurse if __init__ did not finish.
+        if "_finished_at" in self.__dict__ and self._finished_at is None:
+            self._finish()
+
+    @property
+    def time_to_first_event(self) -> typing.Optional[float]:
+        """
+        Seconds from issuing the request to receiving the first event.
+        """
+        if self._first_event_at is None:
+            return None
+        return self._first_event_at - self._started_at
+
+    @property
+    def duration(self) -> typing.Optional[float]:
+        """
+        Seconds from issuing the request to the end (or close) of the stream.
+        """
+        if self._finished_at is None:
+            return None
+        return self._finished_at - self._started_at
+
+    @property
+    def output_tokens_per_second(self) -> typing.Optional[float]:
+        """
+        Output tokens divided by the time between the first and the last event.
+        """
+        output_tokens = _output_tokens(self.usage)
+        if not output_tokens or self._first_event_at is None or self._finished_at is None:
+            return None
+        elapsed = self._finished_at - self._first_event_at
+        if elapsed <= 0:
+            return None
+        return output_tokens / elapsed
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class UsageStream(_UsageStreamBase):
+    """
+    Pass-through proxy over a synchronous response event stream that records
+    usage once the stream ends or is closed.
+    """
+
+    def __init__(self, stream, on_finish, started_at: float) -> None:
+        super().__init__(stream, on_finish, started_at)
+        self._iterator = iter(stream)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            event = next(self._iterator)
+        except StopIteration:
+            self._finish()
+            raise
+        except BaseException as error:
+            self._fail(error)
+            raise
+        self._observe(event)
+        return event
+
+    def close(self) -> None:
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class AsyncUsageStream(_UsageStreamBase):
+    """
+    Pass-through proxy over an async response event stream that records usage
+    once the stream ends or is closed.
+    """
+
+    def __init__(self, stream, on_finish, started_at: float) -> None:
+        super().__init__(stream, on_finish, started_at)
+        self._iterator = stream.__aiter__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            event = await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._finish()
+            raise
+        except BaseException as error:
+            self._fail(error)
+            raise
+        self._observe(event)
+        return event
+
+    async def close(self) -> None:
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                await close()
+        finally:
+            self._finish()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
@@ -0,0 +1,307 @@
+"""
+Usage collection at the HTTP transport of an OpenAI client.
+
+The client's httpx transport is wrapped once, the first time a transport
+scope is opened on it, and then stays in place: every endpoint (responses,
+chat.completions, embeddings, audio, images, ...) goes through it, and
+opening or closing a scope only pushes or pops the scope. Calls made while
+no scope is active get the transport's response back untouched. While a
+scope is active, JSON bodies are buffered and parsed for usage, event streams
+only keep their latest line that carries usage, and other bodies (audio,
+files) are passed through without being kept.
+
+Use it through OpenAIUsage(client, transport=True) or
+AsyncOpenAIUsage(client, transport=True).
+"""
+import json
+import threading
+import time
+import typing
+
+import httpx
+
+from .usage import _ActiveScopes, _Scope, _admit, _admit_async, _settle, _usage_items
+
+_PARSED_TYPES = ("application/json", "text/event-stream")
+
+
+def _endpoint(request: httpx.Request) -> str:
+    """
+    Names a call after its URL path, e.g. /v1/chat/completions -> chat.completions.
+    """
+    path = request.url.path.strip("/")
+    if path.startswith("v1/"):
+        path = path[3:]
+    return path.replace("/", ".")
+
+
+def _request_kwargs(request: httpx.Request) -> typing.Dict[str, typing.Any]:
+    if not request.headers.get("content-type", "").startswith("application/json"):
+        return {}
+    try:
+        kwargs = json.loads(request.content)
+    except ValueError:
+        return {}
+    return kwargs if isinstance(kwargs, dict) else {}
+
+
+def _decoded(response: httpx.Response, raw: bytes) -> bytes:
+    if response.headers.get("content-encoding", "identity") == "identity":
+        return raw
+    return httpx.Response(response.status_code, headers=response.headers, content=raw).content
+
+
+def parse_usage(body: bytes, event_stream: bool) -> typing.Tuple[typing.Any, typing.Optional[str]]:
+    """
+    Returns (usage, model) from a JSON body or from the last server-sent event
+    that carries usage (a chat chunk with include_usage, or a Responses API
+    response.completed event). usage is None when the body has none.
+    """
+    if b'"usage"' not in body:
+        return None, None
+    if event_stream:
+        candidates = [line[5:] for line in body.splitlines() if line.startswith(b"data:") and b'"usage"' in line]
+    else:
+        candidates = [body]
+    for candidate in reversed(candidates):
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if not isinstance(data, dict):
+            continue
+        if isinstance(data.get("response"), dict):
+            data = data["response"]
+        if data.get("usage"):
+            return data["usage"], data.get("model")
+    return None, None
+
+
+class _Call:
+    """
+    One intercepted request while at least one scope was active.
+    """
+    __slots__ = ("request", "scope", "admissions", "timestamp", "started_at", "first_chunk_at", "chunks",
+                 "decoder", "tail", "usage_line")
+
+    def __init__(self, request: httpx.Request, scope: _Scope, admissions) -> None:
+        self.request = request
+        self.scope = scope
+        self.admissions = admissions
+        self.timestamp = time.time()
+        self.started_at = time.perf_counter()
+        self.first_chunk_at: typing.Optional[float] = None
+        self.chunks: typing.List[bytes] = []
+        self.decoder = None
+        self.tail = b""
+        self.usage_line = b""
+
+    def watch(self, response: httpx.Response) -> bool:
+        """
+        Returns whether the response's body may carry usage. Event streams
+        are decoded as they arrive, so that only their latest usage line is
+        kept instead of the whole stream. The decoder is a separate one from
+        the response's own, which httpx keeps using for the client.
+        """
+        content_type = response.headers.get("content-type", "")
+        if content_type.startswith("text/event-stream"):
+            self.decoder = httpx.Response(response.status_code, headers=response.headers)._get_content_decoder()
+            return True
+        return content_type.startswith(_PARSED_TYPES)
+
+    def observe(self, chunk: bytes) -> None:
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        if self.decoder is None:
+            self.chunks.append(chunk)
+        else:
+            self._scan(self.decoder.decode(chunk))
+
+    def _scan(self, data: bytes) -> None:
+        lines = (self.tail + data).split(b"\n")
+        self.tail = lines.pop()
+        for line in lines:
+            if line.startswith(b"data:") and b'"usage"' in line:
+                self.usage_line = line
+
+    def finish(self, response: httpx.Response, body: typing.Optional[bytes] = None) -> None:
+        latency = time.perf_counter() - self.started_at
+        content_type = response.headers.get("content-type", "")
+        event_stream = content_type.startswith("text/event-stream")
+        used = None
+        if not content_type.startswith(_PARSED_TYPES):
+            body = None
+        elif body is None and self.decoder is not None:
+            self._scan(self.decoder.flush() + b"\n")
+            body = self.usage_line
+        elif body is None:
+            body = _decoded(response, b"".join(self.chunks))
+        if body:
+            usage, response_model = parse_usage(body, event_stream)
+            items = _usage_items(usage)
+            if items:
+                items = list(items)
+                # Only the top-level model counts: input or metadata may hold "model" keys too
+                kwargs = _request_kwargs(self.request)
+                model_name = kwargs.get("model")
+                if not isinstance(model_name, str):
+                    model_name = response_model
+                endpoint = _endpoint(self.request)
+                ttft = None
+                if event_stream and self.first_chunk_at is not None:
+                    ttft = self.first_chunk_at - self.started_at
+                request = kwargs if self.scope.request_sinks else None
+                used = self.scope.record(items, model_name, endpoint, self.timestamp, latency, ttft, request)
+        _settle(self.admissions, used)
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, call: _Call, response: httpx.Response) -> None:
+        self._stream = stream
+        self._call: typing.Optional[_Call] = call
+        self._response = response
+
+    def __iter__(self) -> typing.Iterator[bytes]:
+        for chunk in self._stream:
+            if self._call is not None:
+                self._call.observe(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            call, self._call = self._call, None
+            if call is not None:
+                call.finish(self._response)
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, call: _Call, response: httpx.Response) -> None:
+        self._stream = stream
+        self._call: typing.Optional[_Call] = call
+        self._response = response
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            if self._call is not None:
+                self._call.observe(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            call, self._call = self._call, None
+            if call is not None:
+                call.finish(self._response)
+
+
+class _Interception:
+    """
+    Scopes open on one client. For a sync client, threads without a scope of
+    their own report to the latest one opened, like OpenAIUsage; for an async
+    client each task only sees its own scopes, like AsyncOpenAIUsage.
+    """
+
+    def __init__(self, is_async: bool) -> None:
+        self.is_async = is_async
+        self.scopes = _ActiveScopes(f"openai_usage_transport_scope_{id(self)}", client_wide=not is_async)
+
+    def start(self, request: httpx.Request, scope: _Scope) -> _Call:
+        admissions = ()
+        if scope.limiters:
+            kwargs = _request_kwargs(request)
+            admissions = _admit(scope.limiters, kwargs.get("model"), kwargs)
+        return _Call(request, scope, admissions)
+
+    async def start_async(self, request: httpx.Request, scope: _Scope) -> _Call:
+        admissions = ()
+        if scope.limiters:
+            kwargs = _request_kwargs(request)
+            admissions = await _admit_async(scope.limiters, kwargs.get("model"), kwargs)
+        return _Call(request, scope, admissions)
+
+
+class UsageTransport(httpx.BaseTransport):
+    """
+    Wraps a sync httpx transport and records usage for active scopes.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, interception: _Interception) -> None:
+        self.transport = transport
+        self.interception = interception
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        scope = self.interception.scopes.innermost()
+        if scope is None:
+            return self.transport.handle_request(request)
+        call = self.interception.start(request, scope)
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            _settle(call.admissions, 0)
+            raise
+        if hasattr(response, "_content") or not call.watch(response):
+            call.finish(response, getattr(response, "_content", None))
+        else:
+            response.stream = _RecordingStream(response.stream, call, response)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncUsageTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps an async httpx transport and records usage for active scopes.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, interception: _Interception) -> None:
+        self.transport = transport
+        self.interception = interception
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        scope = self.interception.scopes.innermost()
+        if scope is None:
+            return await self.transport.handle_async_request(request)
+        call = await self.interception.start_async(request, scope)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            _settle(call.admissions, 0)
+            raise
+        if hasattr(response, "_content") or not call.watch(response):
+            call.finish(response, getattr(response, "_content", None))
+        else:
+            response.stream = _AsyncRecordingStream(response.stream, call, response)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+_INSTALL_LOCK = threading.Lock()
+
+
+def install(client) -> _Interception:
+    """
+    Wraps the transports of an OpenAI or AsyncOpenAI client's httpx client,
+    once, and returns the client's interception state.
+    """
+    http = getattr(client, "_client", client)
+    if not isinstance(http, (httpx.Client, httpx.AsyncClient)):
+        raise TypeError(f"Expected an OpenAI client backed by httpx, got {type(client).__name__}")
+    with _INSTALL_LOCK:
+        transport = http._transport
+        if isinstance(transport, (UsageTransport, AsyncUsageTransport)):
+            return transport.interception
+        is_async = isinstance(http, httpx.AsyncClient)
+        interception = _Interception(is_async)
+        wrapper = AsyncUsageTransport if is_async else UsageTransport
+        http._transport = wrapper(transport, interception)
+        # Proxy mounts bypass the default transport
+        for pattern, mounted in list(http._mounts.items()):
+            if mounted is not None:
+                http._mounts[pattern] = wrapper(mounted, interception)
+        return interception
@@ -1,109 +1,672 @@
+import asyncio
+import logging
 import typing
-from contextlib import contextmanager
-from functools import wraps
+import contextvars
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache, wraps
 import inspect
-from openai.types.responses.response_usage import ResponseUsage
-from .model_costs import MODEL_COST_PER_1K_TOKENS
+from .accumulator import UsageDict
+from .model_costs import NANODOLLARS_PER_USD, get_model_price, get_model_price_nanos
+from .streaming import AsyncUsageStream, UsageStream
 
-@contextmanager
-def OpenAIUsage(client) -> typing.Generator[typing.Dict[str, float], None, None]:
+logger = logging.getLogger(__name__)
+
+# Usage keys that are priced, mapped to their field in a ModelPrice:
+# 0 = input, 1 = cached input, 2 = output. Input counts include the cached
+# tokens, which are billed at the cached rate instead of the input rate.
+_COST_SLOTS = {
+    "prompt_tokens": 0,
+    "input_tokens": 0,
+    "input_tokens_details.cached_tokens": 1,
+    "prompt_tokens_details.cached_tokens": 1,
+    "completion_tokens": 2,
+    "output_tokens": 2,
+}
+
+
+def _flatten_dict(d, parent_key='', sep='.'):
+    items = []
+    for k, v in d.items():
+        new_key = f"{parent_key}{sep}{k}" if parent_key else k
+        if isinstance(v, dict):
+            items.extend(_flatten_dict(v, new_key, sep=sep).items())
+        else:
+            items.append((new_key, v))
+    return dict(items)
+
+
+@lru_cache(maxsize=256)
+def _signature_model_index(func) -> typing.Optional[int]:
+    try:
+        params = list(inspect.signature(func).parameters.keys())
+    except Exception:
+        return None  # fallback: model can then only come from kwargs
+    if "model" in params:
+        return params.index("model")
+    return None
+
+
+def _model_arg_index(func) -> typing.Optional[int]:
     """
-    Context manager for measuring OpenAI API usage.
-    Overwrites client's responses.create and responses.parse to collect usage metrics.
-    """
-    usage: typing.Dict[str, float] = {}
-    # Store original methods
-    original_create = client.responses.create
-    original_parse = client.responses.parse
-
-    def _flatten_dict(d, parent_key='', sep='.'):
-        items = []
-        for k, v in d.items():
-            new_key = f"{parent_key}{sep}{k}" if parent_key else k
-            if isinstance(v, dict):
-                items.extend(_flatten_dict(v, new_key, sep=sep).items())
-            else:
-                items.append((new_key, v))
-        return dict(items)
-
-    def _wrap(func):
+    Returns the positional index of the "model" parameter of func, or None.
+    The signature is only inspected once per underlying function, however
+    many clients (and bound methods) share it.
+    """
+    target = getattr(func, "__func__", None)
+    if target is None:
+        return _signature_model_index(func)
+    index = _signature_model_index(target)
+    # A bound method's arguments start after self
+    return index - 1 if index else None
+
+
+def _model_name(args, kwargs, model_idx: typing.Optional[int]):
+    """
+    Extracts the model argument from a call's args/kwargs.
+    """
+    if "model" in kwargs:
+        return kwargs["model"]
+    if model_idx is not None and model_idx < len(args):
+        return args[model_idx]
+    return None
+
+
+def _response_usage_items(usage_data):
+    """
+    Reads the known ResponseUsage fields straight off the pydantic object.
+    Returns None when the object carries fields we don't know about, so the
+    caller can fall back to a full model_dump() and flatten.
+    """
+    try:
+        input_details = usage_data.input_tokens_details
+        output_details = usage_data.output_tokens_details
+        if usage_data.model_extra or input_details.model_extra or output_details.model_extra:
+            return None
+        return (
+            ("input_tokens", usage_data.input_tokens),
+            ("input_tokens_details.cached_tokens", input_details.cached_tokens),
+            ("output_tokens", usage_data.output_tokens),
+            ("output_tokens_details.reasoning_tokens", output_details.reasoning_tokens),
+            ("total_tokens", usage_data.total_tokens),
+        )
+    except AttributeError:
+        return None
+
+
+def _usage_items(usage_data):
+    """
+    Returns the flattened (key, value) pairs of a response's usage, or None.
+    SDK usage objects are recognized by duck typing (a pydantic model_dump),
+    so the openai package is never imported here.
+    """
+    if isinstance(usage_data, dict):
+        return _flatten_dict(usage_data).items()
+    model_dump = getattr(usage_data, "model_dump", None)
+    if model_dump is None:
+        return None
+    items = _response_usage_items(usage_data)
+    if items is None:
+        items = _flatten_dict(model_dump()).items()
+    return items
+
+
+def _slot_tokens(items) -> typing.List[float]:
+    """
+    Sums the priced token counts in usage items into [input, cached input, output].
+    """
+    tokens = [0, 0, 0]
+    for k, v in items:
+        slot = _COST_SLOTS.get(k)
+        if slot is not None and isinstance(v, (int, float)):
+            tokens[slot] += v
+    return tokens
+
+
+def _slot_costs(prices, tokens) -> typing.Tuple[float, float, float]:
+    """
+    Prices [input, cached input, output] token counts with a ModelPrice:
+    uncached input at the input rate, cached input at the cached rate (the
+    input rate for models without one).
+    """
+    input_price, cached_price, output_price = prices
+    if cached_price is None:
+        cached_price = input_price
+    return (
+        ((tokens[0] - tokens[1]) / 1000.0) * input_price if input_price else 0.0,
+        (tokens[1] / 1000.0) * cached_price if cached_price else 0.0,
+        (tokens[2] / 1000.0) * output_price if output_price else 0.0,
+    )
+
+
+def _accumulate(usage: UsageDict, items, model_name) -> typing.Tuple[typing.List[float], float]:
+    """
+    Adds token counts and their cost to the usage dict in a single pass.
+    Returns the priced tokens and the call's total cost. Dicts with exact
+    costs get integer nano-dollars.
+    """
+    tokens = [0, 0, 0]
+    cost_total = 0.0
+    counts: typing.Dict[str, float] = {}
+    for k, v in items:
+        if not isinstance(v, (int, float)):
+            continue
+        counts[k] = counts.get(k, 0) + v
+        slot = _COST_SLOTS.get(k)
+        if slot is not None:
+            tokens[slot] += v
+
+    # Cost calculation (separate for input, input cached, output, and total)
+    if model_name:
+        if usage.exact:
+            input_price, cached_price, output_price = get_model_price_nanos(model_name)
+            if cached_price is None:
+                cached_price = input_price
+            cost_input = (tokens[0] - tokens[1]) * input_price
+            cost_input_cached = tokens[1] * cached_price
+            cost_output = tokens[2] * output_price
+        else:
+            cost_input, cost_input_cached, cost_output = _slot_costs(get_model_price(model_name), tokens)
+        cost_total = cost_input + cost_input_cached + cost_output
+
+        # Always set all cost keys, even if zero
+        counts["cost_input_tokens"] = counts.get("cost_input_tokens", 0) + cost_input
+        counts["cost_input_cached_tokens"] = counts.get("cost_input_cached_tokens", 0) + cost_input_cached
+        counts["cost_output_tokens"] = counts.get("cost_output_tokens", 0) + cost_output
+        counts["cost_total"] = counts.get("cost_total", 0) + cost_total
+        # For backward compatibility, also set "cost" as total
+        counts["cost"] = counts.get("cost", 0) + cost_total
+        if usage.exact:
+            cost_total /= NANODOLLARS_PER_USD
+    usage.add(counts)
+    return tokens, cost_total
+
+
+class CallRecord(typing.NamedTuple):
+    """
+    Usage of a single API call, as handed to sinks.
+    Times are in seconds; timestamp is the wall-clock start of the call.
+    """
+    model: typing.Optional[str]
+    endpoint: str
+    timestamp: float
+    input_tokens: int
+    cached_tokens: int
+    output_tokens: int
+    reasoning_tokens: int
+    cost: float
+    latency: float
+    time_to_first_token: typing.Optional[float] = None
+
+
+# Flattened usage keys carried on a CallRecord: 0 = cached, 1 = reasoning.
+_DETAIL_KEYS = {
+    "input_tokens_details.cached_tokens": 0,
+    "prompt_tokens_details.cached_tokens": 0,
+    "output_tokens_details.reasoning_tokens": 1,
+    "completion_tokens_details.reasoning_tokens": 1,
+}
+
+
+def _detail_tokens(items) -> typing.List[int]:
+    details = [0, 0]
+    for k, v in items:
+        slot = _DETAIL_KEYS.get(k)
+        if slot is not None and isinstance(v, (int, float)):
+            details[slot] += v
+    return details
+
+
+class _Scope:
+    """
+    One OpenAIUsage/AsyncOpenAIUsage block: a node in the tree of nested
+    scopes. A call is recorded once, into the innermost scope's usage dict,
+    and rolled up into the enclosing scopes' dicts when they are read. Its
+    CallRecord goes to the sinks of this scope and of every enclosing one
+    (any object with a record(call) method), and it is paced by all their
+    limiters (ratelimit.AdmissionController). Sinks that also have a
+    record_request(call, request) method get the request's parameters with it
+    (see stats.PromptCacheStats). The nearest ResponseCache
+    (cache.ResponseCache) of the scope or its ancestors serves repeated calls.
+    """
+    __slots__ = ("usage", "parent", "sinks", "limiter", "all_sinks", "request_sinks", "limiters", "cache",
+                 "closed")
+
+    def __init__(self, sinks: typing.Iterable[typing.Any] = (), limiter=None,
+                 name: typing.Optional[str] = None, parent: typing.Optional["_Scope"] = None,
+                 cache=None, exact_costs: bool = False) -> None:
+        self.parent = parent
+        self.sinks = tuple(sinks)
+        self.limiter = limiter
+        self.cache = cache if cache is not None or parent is None else parent.cache
+        if parent is None:
+            self.usage = UsageDict()
+            self.usage.name = name
+            self.usage.exact = exact_costs
+            self.all_sinks = self.sinks
+            self.limiters = (limiter,) if limiter is not None else ()
+        else:
+            # Resolved once here so that recording a call does not depend on depth.
+            # The child keeps the cost mode of the tree so that totals roll up.
+            self.usage = parent.usage.child(name)
+            self.all_sinks = parent.all_sinks + self.sinks
+            self.limiters = parent.limiters + ((limiter,) if limiter is not None else ())
+        self.request_sinks = tuple(sink for sink in self.all_sinks if hasattr(sink, "record_request"))
+        self.closed = False
+
+    def record(self, items, model_name, endpoint: str, timestamp: float, latency: float,
+               time_to_first_token: typing.Optional[float] = None,
+               request: typing.Optional[typing.Mapping[str, typing.Any]] = None) -> float:
+        """
+        Records one call and returns its input + output tokens. request is the
+        call's parameters, for sinks with record_request().
+        """
+        tokens, cost = _accumulate(self.usage, items, model_name)
+        if self.all_sinks:
+            cached, reasoning = _detail_tokens(items)
+            call = CallRecord(model_name, endpoint, timestamp, tokens[0], cached, tokens[2], reasoning,
+                              cost, latency, time_to_first_token)
+            # The API call already succeeded: a failing sink must not lose its response
+            for sink in self.all_sinks:
+                try:
+                    sink.record(call)
+                except Exception:
+                    self._sink_failed(sink)
+            if request is not None:
+                for sink in self.request_sinks:
+                    try:
+                        sink.record_request(call, request)
+                    except Exception:
+                        self._sink_failed(sink)
+        return tokens[0] + tokens[2]
+
+    def _sink_failed(self, sink) -> None:
+        logger.exception("Usage sink %r failed to record a call", sink)
+        self.usage.add({"sink_errors": 1})
+
+    def record_cache_hit(self, entry) -> None:
+        """
+        Counts a call answered by the cache and what it would have cost.
+        """
+        self.usage.add({
+            "cache_hits": 1,
+            "cache_tokens_avoided": entry.tokens,
+            "cache_cost_avoided": entry.cost,
+            "cache_latency_saved": entry.latency,
+        })
+
+    def flush_sinks(self) -> None:
+        for sink in self.sinks:
+            flush = getattr(sink, "flush", None)
+            if flush is not None:
+                flush()
+
+
+def _open_ancestor(scope: typing.Optional[_Scope]) -> typing.Optional[_Scope]:
+    while scope is not None and scope.closed:
+        scope = scope.parent
+    return scope
+
+
+class _ActiveScopes:
+    """
+    The open scopes of one client. A call goes to the innermost scope of the
+    calling thread or task; for clients shared across threads (client_wide)
+    a thread that has not opened a scope itself falls back to the most
+    recently opened one, so worker threads are counted as before. A scope
+    only nests under the scopes of the thread or task that opens it, so
+    separate blocks in separate threads stay separate trees.
+
+    Scopes may exit in any order: a closed scope is skipped in favour of its
+    nearest open ancestor.
+    """
+
+    def __init__(self, name: str, client_wide: bool) -> None:
+        self.current: contextvars.ContextVar[typing.Optional[_Scope]] = contextvars.ContextVar(name, default=None)
+        self.client_wide = client_wide
+        self._open: typing.Tuple[_Scope, ...] = ()
+        self._lock = threading.Lock()
+
+    def innermost(self) -> typing.Optional[_Scope]:
+        """
+        Returns the scope a call made here is recorded in.
+        """
+        scope = self.current.get()
+        if scope is None and self.client_wide:
+            open_scopes = self._open
+            scope = open_scopes[-1] if open_scopes else None
+        return _open_ancestor(scope)
+
+    def own_innermost(self) -> typing.Optional[_Scope]:
+        """
+        Returns the innermost open scope of this thread or task, ignoring the
+        fallback to other threads' scopes: the parent of a scope opened here.
+        """
+        return _open_ancestor(self.current.get())
+
+    def enter(self, sinks: typing.Iterable[typing.Any], limiter, name: typing.Optional[str], cache=None,
+              exact_costs: bool = False) -> _Scope:
+        scope = _Scope(sinks, limiter, name, self.own_innermost(), cache, exact_costs)
+        self.current.set(scope)
+        if self.client_wide:
+            with self._lock:
+                self._open = self._open + (scope,)
+        return scope
+
+    def exit(self, scope: _Scope) -> None:
+        scope.closed = True
+        if self.current.get() is scope:
+            self.current.set(self.own_innermost())
+        if self.client_wide:
+            with self._lock:
+                self._open = tuple(s for s in self._open if s is not scope)
+        scope.usage.close()
+
+
+def _endpoint(func) -> str:
+    return f"responses.{getattr(func, '__name__', 'call')}"
+
+
+def _settle(admissions, used: typing.Optional[float]) -> None:
+    for limiter, reservation in admissions:
+        limiter.settle(reservation, used)
+
+
+def _refund(admissions) -> None:
+    for limiter, reservation in admissions:
+        limiter.refund(reservation)
+
+
+def _admit(limiters, model_name, kwargs) -> list:
+    """
+    Acquires every limiter for one call. If one of them raises, the
+    reservations already taken are refunded, since the call is never sent.
+    """
+    admissions = []
+    try:
+        for limiter in limiters:
+            admissions.append((limiter, limiter.acquire(model_name, kwargs)))
+    except BaseException:
+        _refund(admissions)
+        raise
+    return admissions
+
+
+async def _admit_async(limiters, model_name, kwargs) -> list:
+    admissions = []
+    try:
+        for limiter in limiters:
+            admissions.append((limiter, await limiter.acquire_async(model_name, kwargs)))
+    except BaseException:
+        _refund(admissions)
+        raise
+    return admissions
+
+
+def _stream_recorder(scope: _Scope, model_name, endpoint: str, timestamp: float, admissions=(), request=None):
+    """
+    Returns the callback a stream proxy runs once the stream has ended.
+    """
+    def on_finish(stream) -> None:
+        used = None
+        items = _usage_items(stream.usage)
+        if items:
+            used = scope.record(items, model_name or stream.model, endpoint, timestamp,
+                                stream.duration, stream.time_to_first_event, request)
+        elif stream.error is not None:
+            used = 0  # as for calls that raise: the token estimate goes back
+        _settle(admissions, used)
+    return on_finish
+
+
+class _Instrumentation:
+    """
+    Wraps a client's responses.create and responses.parse once, the first
+    time a scope is opened on it, and routes each call to the innermost
+    active scope. The wrappers stay in place; with no scope active they call
+    straight through.
+    """
+
+    def __init__(self, client) -> None:
+        self.client = client
+        self.original_create = client.responses.create
+        self.original_parse = client.responses.parse
+        self.is_async = inspect.iscoroutinefunction(self.original_create)
+        # Async scopes are per task; sync clients are usually shared by threads
+        self.scopes = _ActiveScopes(f"openai_usage_scope_{id(client)}", client_wide=not self.is_async)
+
+    def _wrap(self, func):
+        model_idx = _model_arg_index(func)
+        endpoint = _endpoint(func)
+        scopes = self.scopes
+
         @wraps(func)
         def wrapper(*args, **kwargs):
+            scope = scopes.innermost()
+            if scope is None:
+                return func(*args, **kwargs)
             # Extract model argument from args/kwargs
-            model_name = None
+            model_name = _model_name(args, kwargs, model_idx)
+            cache = scope.cache
+            key = None
+            if cache is not None:
+                key = cache.key(endpoint, model_name, args, kwargs)
+                hit = cache.get(key) if key is not None else None
+                if hit is not None:
+                    scope.record_cache_hit(hit[1])
+                    return hit[0]
+            admissions = ()
+            if scope.limiters:
+                admissions = _admit(scope.limiters, model_name, kwargs)
+            timestamp = time.time()
+            started_at = time.perf_counter()
             try:
-                sig = inspect.signature(func)
-                params = list(sig.parameters.keys())
-                if "model" in kwargs:
-                    model_name = kwargs["model"]
-                elif "model" in params:
-                    idx = params.index("model")
-                    if idx < len(args):
-                        model_name = args[idx]
-            except Exception:
-                pass  # fallback: model_name remains None if extraction fails
-
-            response = func(*args, **kwargs)
-            usage_data = getattr(response, 'usage', None)
-            flat_usage = {}
-            if isinstance(usage_data, ResponseUsage):
-                flat_usage = _flatten_dict(usage_data.model_dump())
-            elif isinstance(usage_data, dict):
-                flat_usage = _flatten_dict(usage_data)
-            if flat_usage:
-                for k, v in flat_usage.items():
-                    if isinstance(v, (int, float)):
-                        usage[k] = usage.get(k, 0) + v
-
-                # Cost calculation (separate for input, input cached, output, and total)
-                if model_name:
-                    # Always initialize all cost keys to 0.0 for consistency
-                    cost_input = 0.0
-                    cost_input_cached = 0.0
-                    cost_output = 0.0
-
-                    for usage_key, token_count in flat_usage.items():
-                        if not isinstance(token_count, (int, float)):
-                            continue
-                        # Input tokens
-                        if usage_key in ("prompt_tokens", "input_tokens"):
-                            cost_key = model_name
-                            per_1k = MODEL_COST_PER_1K_TOKENS.get(cost_key)
-                            if per_1k:
-                                cost_input += (token_count / 1000.0) * per_1k
-                        # Input cached tokens
-                        elif usage_key in ("input_cached_tokens",):
-                            cost_key = f"{model_name}-cached"
-                            per_1k = MODEL_COST_PER_1K_TOKENS.get(cost_key)
-                            if per_1k:
-                                cost_input_cached += (token_count / 1000.0) * per_1k
-                        # Output tokens
-                        elif usage_key in ("completion_tokens", "output_tokens"):
-                            cost_key = f"{model_name}-completion"
-                            per_1k = MODEL_COST_PER_1K_TOKENS.get(cost_key)
-                            if per_1k:
-                                cost_output += (token_count / 1000.0) * per_1k
-                        # else: skip unknown usage keys
-
-                    cost_total = cost_input + cost_input_cached + cost_output
-
-                    # Always set all cost keys, even if zero
-                    usage["cost_input_tokens"] = usage.get("cost_input_tokens", 0) + cost_input
-                    usage["cost_input_cached_tokens"] = usage.get("cost_input_cached_tokens", 0) + cost_input_cached
-                    usage["cost_output_tokens"] = usage.get("cost_output_tokens", 0) + cost_output
-                    usage["cost_total"] = usage.get("cost_total", 0) + cost_total
-                    # For backward compatibility, also set "cost" as total
-                    usage["cost"] = usage.get("cost", 0) + cost_total
+                response = func(*args, **kwargs)
+            except BaseException:
+                # Nothing reported as used: the token estimate goes back
+                _settle(admissions, 0)
+                raise
+
+            if kwargs.get("stream"):
+                on_finish = _stream_recorder(scope, model_name, endpoint, timestamp, admissions, kwargs)
+                return UsageStream(response, on_finish, started_at)
+
+            latency = time.perf_counter() - started_at
+            used = None
+            items = _usage_items(getattr(response, 'usage', None))
+            if items:
+                items = list(items)
+                used = scope.record(items, model_name, endpoint, timestamp, latency, request=kwargs)
+            if admissions:
+                _settle(admissions, used)
+            if key is not None:
+                cache.put(key, response, model_name, items, latency)
             return response
         return wrapper
 
-    # Override methods
-    client.responses.create = _wrap(original_create)
-    client.responses.parse = _wrap(original_parse)
+    def _wrap_async(self, func):
+        model_idx = _model_arg_index(func)
+        endpoint = _endpoint(func)
+        scopes = self.scopes
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            scope = scopes.innermost()
+            if scope is None:
+                return await func(*args, **kwargs)
+            model_name = _model_name(args, kwargs, model_idx)
+            cache = scope.cache
+            key = None
+            if cache is not None:
+                key = cache.key(endpoint, model_name, args, kwargs)
+                hit = None
+                if key is not None:
+                    # The SQLite tier would block the event loop
+                    if cache.on_disk:
+                        hit = await asyncio.get_running_loop().run_in_executor(None, cache.get, key)
+                    else:
+                        hit = cache.get(key)
+                if hit is not None:
+                    scope.record_cache_hit(hit[1])
+                    return hit[0]
+            admissions = ()
+            if scope.limiters:
+                admissions = await _admit_async(scope.limiters, model_name, kwargs)
+            timestamp = time.time()
+            started_at = time.perf_counter()
+            try:
+                response = await func(*args, **kwargs)
+            except BaseException:
+                _settle(admissions, 0)
+                raise
+            if kwargs.get("stream"):
+                on_finish = _stream_recorder(scope, model_name, endpoint, timestamp, admissions, kwargs)
+                return AsyncUsageStream(response, on_finish, started_at)
+
+            latency = time.perf_counter() - started_at
+            used = None
+            items = _usage_items(getattr(response, 'usage', None))
+            if items:
+                items = list(items)
+                used = scope.record(items, model_name, endpoint, timestamp, latency, request=kwargs)
+            if admissions:
+                _settle(admissions, used)
+            if key is not None:
+                if cache.on_disk:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, cache.put, key, response, model_name, items, latency)
+                else:
+                    cache.put(key, response, model_name, items, latency)
+            return response
+        return wrapper
+
+    def install(self) -> None:
+        wrap = self._wrap_async if self.is_async else self._wrap
+        for name, func in (("create", self.original_create), ("parse", self.original_parse)):
+            wrapper = wrap(func)
+            wrapper._openai_usage_instrumentation = self
+            setattr(self.client.responses, name, wrapper)
+
+
+_INSTALL_LOCK = threading.Lock()
+
+
+def _wrong_client(is_async: bool) -> TypeError:
+    if is_async:
+        return TypeError("AsyncOpenAIUsage needs an AsyncOpenAI client; use OpenAIUsage for OpenAI")
+    return TypeError("OpenAIUsage needs a synchronous client; use AsyncOpenAIUsage for AsyncOpenAI")
+
+
+def _instrument(client, is_async: bool) -> _Instrumentation:
+    """
+    Wraps the client's responses methods, once, and returns the client's
+    instrumentation state.
+    """
+    with _INSTALL_LOCK:
+        instrumentation = getattr(client.responses.create, "_openai_usage_instrumentation", None)
+        if instrumentation is None:
+            instrumentation = _Instrumentation(client)
+            if instrumentation.is_async != is_async:
+                raise _wrong_client(is_async)
+            instrumentation.install()
+        elif instrumentation.is_async != is_async:
+            raise _wrong_client(is_async)
+        return instrumentation
+
+
+@contextmanager
+def _open_scope(client, sinks, limiter, name, transport: bool, is_async: bool,
+                cache=None, exact_costs: bool = False) -> typing.Generator[_Scope, None, None]:
+    if transport:
+        if cache is not None:
+            raise ValueError("cache is not supported with transport=True")
+        from .transport import install
 
+        interception = install(client)
+        if interception.is_async != is_async:
+            raise _wrong_client(is_async)
+        scopes = interception.scopes
+    else:
+        scopes = _instrument(client, is_async).scopes
+    scope = scopes.enter(sinks, limiter, name, cache, exact_costs)
     try:
-        yield usage
+        yield scope
     finally:
-        # Restore original methods
-        client.responses.create = original_create
-        client.responses.parse = original_parse
\ No newline at end of file
+        scopes.exit(scope)
+
+
+@contextmanager
+def OpenAIUsage(
+    client,
+    sinks: typing.Iterable[typing.Any] = (),
+    limiter=None,
+    transport: bool = False,
+    name: typing.Optional[str] = None,
+    cache=None,
+    exact_costs: bool = False,
+) -> typing.Generator[typing.Dict[str, float], None, None]:
+    """
+    Context manager for measuring OpenAI API usage.
+    Wraps client's responses.create and responses.parse to collect usage metrics;
+    the wrappers are installed the first time a block is opened on the client
+    and stay in place, so opening a block only pushes a scope. Calls made
+    outside any block go straight to the client.
+    The yielded dict is safe to share across threads calling the client concurrently.
+    Nested blocks form a tree of named scopes: each call is counted once, in
+    the innermost block, and every block's dict holds the totals of its whole
+    subtree (see UsageDict.own(), tree() and folded() for the breakdown).
+    Streaming calls (stream=True) return a pass-through UsageStream that records
+    usage from the final event when the stream ends or is closed.
+    Each sink (e.g. a UsageLedger or UsageExporter) also receives a CallRecord
+    per call, and sinks with a flush() method are flushed when the block exits.
+    A sink that raises is logged and counted under sink_errors; the call
+    still returns its response.
+    With a limiter (ratelimit.AdmissionController), every call first waits for
+    TPM/RPM capacity or fails fast with RateLimitExceeded.
+    With a cache (cache.ResponseCache), repeated calls are answered from it and
+    counted under the cache_* keys instead of the token and cost keys.
+    With exact_costs=True, costs are summed as integer nano-dollars, so the
+    cost keys never drift from the invoice; usage.exact_total() returns them as
+    a Decimal. Nested blocks follow the outermost block's setting.
+    For AsyncOpenAI clients use AsyncOpenAIUsage instead.
+    With transport=True, usage is read from the HTTP responses of every endpoint
+    instead (see openai_usage.transport).
+    """
+    with _open_scope(client, sinks, limiter, name, transport, is_async=False, cache=cache,
+                     exact_costs=exact_costs) as scope:
+        try:
+            yield scope.usage
+        finally:
+            scope.flush_sinks()
+
+
+@asynccontextmanager
+async def AsyncOpenAIUsage(
+    client,
+    sinks: typing.Iterable[typing.Any] = (),
+    limiter=None,
+    transport: bool = False,
+    name: typing.Optional[str] = None,
+    cache=None,
+    exact_costs: bool = False,
+) -> typing.AsyncGenerator[typing.Dict[str, float], None]:
+    """
+    Async context manager for measuring AsyncOpenAI API usage.
+    The client's responses.create and responses.parse are wrapped once, no matter
+    how many scopes are open, and each scope only sees calls made from its own
+    task (and tasks it spawns), so concurrent handlers sharing one client get
+    separate totals. Scopes nest into a tree as with OpenAIUsage. Each sink also
+    receives a CallRecord per call, a limiter paces every call made in the scope,
+    and a cache answers repeated calls. exact_costs works as with OpenAIUsage.
+    With transport=True, usage is read from the HTTP responses of every endpoint
+    instead (see openai_usage.transport).
+    """
+    with _open_scope(client, sinks, limiter, name, transport, is_async=True, cache=cache,
+                     exact_costs=exact_costs) as scope:
+        try:
+            yield scope.usage
+        finally:
+            if scope.sinks:
+                # Flushing may wait on disk I/O; keep it off the event loop
+                await asyncio.get_running_loop().run_in_executor(None, scope.flush_sinks)
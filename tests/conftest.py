@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+USAGE = {"input_tokens": 1000, "output_tokens": 100}
+
+
+class DummyResponse:
+    def __init__(self, usage, text=None):
+        self.usage = usage
+        self.text = text
+
+
+class DummyResponses:
+    """
+    Stands in for `client.responses`. `create` and `parse` count their calls
+    and return `response(usage=..., text="answer <n>")`. `usage` and
+    `parse_usage` are a usage object or a function of the call's keyword
+    arguments; `error`, when set, is raised instead.
+    """
+
+    def __init__(self, usage=USAGE, parse_usage=None, response=DummyResponse, error=None):
+        self.usage = usage
+        self.parse_usage = usage if parse_usage is None else parse_usage
+        self.response = response
+        self.error = error
+        self.calls = 0
+
+    def _respond(self, usage, kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        if callable(usage):
+            usage = usage(kwargs)
+        return self.response(usage=usage, text=f"answer {self.calls}")
+
+    def create(self, *args, **kwargs):
+        return self._respond(self.usage, kwargs)
+
+    def parse(self, *args, **kwargs):
+        return self._respond(self.parse_usage, kwargs)
+
+
+class AsyncDummyResponses(DummyResponses):
+    async def create(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        return self._respond(self.usage, kwargs)
+
+    async def parse(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        return self._respond(self.parse_usage, kwargs)
+
+
+class DummyClient:
+    """
+    A client with only `responses`, configured as in DummyResponses.
+    `asynchronous=True` makes its methods coroutines, like AsyncOpenAI.
+    """
+
+    def __init__(self, asynchronous=False, **options):
+        self.responses = (AsyncDummyResponses if asynchronous else DummyResponses)(**options)
+
+
+@pytest.fixture
+def make_client():
+    return DummyClient
@@ -0,0 +1,87 @@
+import json
+import threading
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+
+from openai_usage.accumulator import UsageDict
+from openai_usage.usage import OpenAIUsage
+
+
+STRESS_USAGE = {
+    "input_tokens": 3,
+    "input_tokens_details": {"cached_tokens": 1},
+    "output_tokens": 5,
+    "total_tokens": 8,
+}
+STRESS_PARSE_USAGE = {"input_tokens": 7, "output_tokens": 11, "total_tokens": 18}
+
+
+def test_usage_dict_writers_never_wait_for_its_lock():
+    usage = UsageDict()
+
+    def worker():
+        for _ in range(100):
+            usage.add({"calls": 1})
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    # While another thread holds the lock, writers go to their shards
+    with usage._merge_lock:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+            assert not t.is_alive()
+        assert dict.get(usage, "calls") is None
+
+    assert usage == {"calls": 800}
+    assert usage["calls"] == 800
+    assert dict(usage) == {"calls": 800}
+    assert sorted(usage.items()) == [("calls", 800)]
+    # The next write folds in whatever the shards still hold
+    usage.add({"calls": 1})
+    assert json.loads(json.dumps(usage)) == {"calls": 801}
+
+
+def test_openai_usage_exact_totals_under_high_concurrency(make_client):
+    client = make_client(usage=STRESS_USAGE, parse_usage=STRESS_PARSE_USAGE)
+    workers = 64
+    calls_per_worker = 500
+    start = threading.Barrier(workers)
+
+    def run():
+        start.wait()
+        for i in range(calls_per_worker):
+            if i % 2:
+                client.responses.parse(model="gpt-4o")
+            else:
+                client.responses.create(model="gpt-4o")
+            if i % 50 == 0:
+                usage.get("total_tokens")  # concurrent reads while writing
+
+    with OpenAIUsage(client) as usage:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for f in [pool.submit(run) for _ in range(workers)]:
+                f.result()
+
+    creates = parses = workers * calls_per_worker // 2
+    assert usage["input_tokens"] == creates * 3 + parses * 7
+    assert usage["input_tokens_details.cached_tokens"] == creates
+    assert usage["output_tokens"] == creates * 5 + parses * 11
+    assert usage["total_tokens"] == creates * 8 + parses * 18
+    assert isinstance(usage["cost"], float)
+
+
+def test_usage_dict_storage_is_current_inside_the_block(make_client):
+    client = make_client(usage=STRESS_USAGE, parse_usage=STRESS_PARSE_USAGE)
+    with OpenAIUsage(client, exact_costs=True) as usage:
+        client.responses.create(model="gpt-4o")
+        # Readers that bypass the dict methods see the totals too
+        assert json.loads(json.dumps(usage))["input_tokens"] == 3
+        assert dict.get(usage, "output_tokens") == 5
+        assert usage.pop("total_tokens") == 8
+        usage.clear()
+        client.responses.parse(model="gpt-4o")
+    # Cleared exact cost totals do not come back on the next merge
+    assert usage.exact_total() == Decimal(7 * 2500 + 11 * 10000) / 10 ** 9
+    assert usage["cost_total"] == 0.0001275
+    assert "total_tokens" in usage and usage["total_tokens"] == 18
@@ -0,0 +1,75 @@
+import json
+
+from openai_usage.batch_api import ingest_batch, index_requests, read_request
+from openai_usage.cli import main
+
+
+def write_jsonl(path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def make_batch(tmp_path):
+    requests = [
+        {"custom_id": f"{job}-req-{i}", "method": "POST", "url": "/v1/responses", "body": {"model": "gpt-4o-mini", "input": "x" * i}}
+        for job in ("job-a", "job-b") for i in range(5)
+    ]
+    outputs = [
+        {
+            "id": f"batch_req_{i}",
+            "custom_id": r["custom_id"],
+            "response": {"status_code": 200, "body": {"model": "gpt-4o-mini-2024-07-18", "usage": {"input_tokens": 1000, "output_tokens": 500}}},
+            "error": None,
+        }
+        for i, r in enumerate(requests[:8])
+    ]
+    outputs.append({"custom_id": "stray-req-0", "response": {"status_code": 200, "body": {"model": "gpt-4o-mini", "usage": {"input_tokens": 1, "output_tokens": 1}}}, "error": None})
+    errors = [{"custom_id": requests[8]["custom_id"], "response": None, "error": {"code": "server_error", "message": "boom"}}]
+    paths = tmp_path / "requests.jsonl", tmp_path / "output.jsonl", tmp_path / "errors.jsonl"
+    for path, records in zip(paths, (requests, outputs, errors)):
+        write_jsonl(path, records)
+    return [str(p) for p in paths]
+
+
+def test_index_requests_maps_custom_ids_to_lines(tmp_path):
+    requests_path, _, _ = make_batch(tmp_path)
+    index = index_requests(requests_path)
+    assert len(index) == 10
+    assert read_request(requests_path, index["job-b-req-3"])["body"]["input"] == "xxx"
+
+
+def test_ingest_batch_prices_at_discount_and_matches_requests(tmp_path):
+    requests_path, output_path, errors_path = make_batch(tmp_path)
+    report = ingest_batch(output_path, errors_path, requests_path)
+
+    row = report.by_model[("gpt-4o-mini-2024-07-18",)]
+    assert row[0] == 8
+    full_price = 8 * ((1000 / 1000.0) * 0.00015 + (500 / 1000.0) * 0.0006)
+    assert abs(row[7] - full_price * 0.5) < 1e-12
+    assert report.by_prefix[("job-a-req",)][0] == 5
+    assert report.by_prefix[("job-b-req",)][0] == 3
+    assert report.errors_by_prefix == {"job-b-req": 1}
+    assert report.unmatched == 1
+    assert report.missing == ["job-b-req-4"]
+
+
+def test_cli_batch_json(tmp_path, capsys):
+    requests_path, output_path, errors_path = make_batch(tmp_path)
+    assert main(["batch", output_path, "--errors", errors_path, "--requests", requests_path, "--format", "json"]) == 0
+    out = json.loads(capsys.readouterr().out)
+    assert out["missing"] == ["job-b-req-4"]
+    assert sum(r["calls"] for r in out["by_prefix"]) == 9
+
+
+def test_ingest_batch_skips_malformed_lines(tmp_path):
+    _, output_path, _ = make_batch(tmp_path)
+    with open(output_path, "a") as f:
+        f.write('{"custom_id": "job-a-req-9", "response": {"status_co\n')
+        f.write("[1, 2]\n")
+        f.write(json.dumps({"custom_id": "job-a-req-8", "response": {"status_code": None, "body": {"model": "gpt-4o-mini"}}}) + "\n")
+    report = ingest_batch(output_path)
+    assert report.by_model[("gpt-4o-mini-2024-07-18",)][0] == 8
+    # Two lines that are not JSON objects, and a null status without usage
+    assert report.skipped == 3
+    assert report.errors_by_prefix == {}
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from openai_usage.batch_costs import price_batch
+from openai_usage.report import METRICS
+from openai_usage.usage import OpenAIUsage
+
+MODELS = ["gpt-4o", "gpt-4o-mini-2024-07-18", "o3", "gpt-4.1-nano", "gpt-4o-2025-06-01", "unknown-model", None]
+
+
+def make_records(n, seed=7):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n):
+        if rng.random() < 0.5:
+            usage = {
+                "input_tokens": rng.randint(0, 50_000),
+                "input_tokens_details": {"cached_tokens": rng.randint(0, 1000)},
+                "output_tokens": rng.randint(0, 8000),
+            }
+        elif rng.random() < 0.5:
+            usage = {
+                "prompt_tokens": rng.randint(1000, 50_000),
+                "prompt_tokens_details.cached_tokens": rng.randint(0, 1000),
+                "completion_tokens": rng.randint(0, 8000),
+            }
+        else:
+            usage = {"prompt_tokens": rng.randint(0, 50_000), "completion_tokens": rng.randint(0, 8000)}
+        records.append({"model": rng.choice(MODELS), "usage": usage})
+    return records
+
+
+def test_price_batch_matches_scalar_path_exactly(make_client):
+    records = make_records(2000)
+    costs = price_batch(records)
+    # Each call answers with the usage it was given
+    client = make_client(usage=lambda kwargs: kwargs["usage"])
+
+    for i, record in enumerate(records):
+        with OpenAIUsage(client) as usage:
+            client.responses.create(model=record["model"], usage=record["usage"])
+        if record["model"] is None:
+            assert "cost_total" not in usage
+            assert costs.cost_total[i] == 0.0
+        else:
+            assert costs.cost_input_tokens[i] == usage["cost_input_tokens"]
+            assert costs.cost_input_cached_tokens[i] == usage["cost_input_cached_tokens"]
+            assert costs.cost_output_tokens[i] == usage["cost_output_tokens"]
+            assert costs.cost_total[i] == usage["cost_total"]
+
+    totals = costs.totals_by_model()
+    for model in MODELS[:-1]:
+        with OpenAIUsage(client) as usage:
+            for record in records:
+                if record["model"] == model:
+                    client.responses.create(model=model, usage=record["usage"])
+        assert totals[model]["cost_total"] == usage["cost_total"]
+        assert totals[model]["calls"] == sum(1 for r in records if r["model"] == model)
+        assert list(totals[model]) == list(METRICS)
+    assert totals["unknown-model"]["cost_total"] == 0.0
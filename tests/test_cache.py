@@ -0,0 +1,129 @@
+import asyncio
+import pickle
+import sqlite3
+import threading
+
+import pydantic
+import pytest
+
+from openai_usage.cache import ResponseCache, request_key
+from openai_usage.usage import AsyncOpenAIUsage, OpenAIUsage
+
+
+class ModelResponse(pydantic.BaseModel):
+    usage: dict
+    text: str
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+
+def test_cache_hits_report_avoided_cost(make_client):
+    client = make_client()
+    cache = ResponseCache(when={"temperature": 0})
+    with OpenAIUsage(client, cache=cache) as usage:
+        first = client.responses.create(model="gpt-4o", input="hi", temperature=0)
+        second = client.responses.create(input="hi", temperature=0, model="gpt-4o", timeout=5)
+        client.responses.create(model="gpt-4o", input="hi", temperature=0.7)
+        client.responses.create(model="gpt-4o", input="hi", temperature=0.7)
+
+    assert client.responses.calls == 3
+    assert second.text == first.text == "answer 1"
+    assert usage["input_tokens"] == 3000
+    assert usage["cache_hits"] == 1
+    assert usage["cache_tokens_avoided"] == 1100
+    assert usage["cache_cost_avoided"] == pytest.approx(usage["cost_total"] / 3)
+    assert usage["cache_latency_saved"] >= 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_ttl_and_lru_eviction(make_client):
+    clock = FakeClock()
+    client = make_client()
+    cache = ResponseCache(max_entries=2, ttl=60, clock=clock)
+    with OpenAIUsage(client, cache=cache):
+        for prompt in ("a", "b", "a", "c", "b"):
+            client.responses.create(model="gpt-4o", input=prompt)
+        # "b" was least recently used when "c" came in
+        assert client.responses.calls == 4
+        assert cache.evictions == 2
+        clock.now += 61
+        client.responses.create(model="gpt-4o", input="c")
+        assert client.responses.calls == 5
+
+
+def test_sqlite_tier_survives_restarts(tmp_path, make_client):
+    path = str(tmp_path / "cache.db")
+    client = make_client(response=ModelResponse)
+    cache = ResponseCache(path=path)
+    with OpenAIUsage(client, cache=cache):
+        client.responses.parse(model="gpt-4o-mini", input="hi")
+    cache.close()
+
+    restarted = ResponseCache(path=path)
+    with OpenAIUsage(client, cache=restarted) as usage:
+        response = client.responses.parse(model="gpt-4o-mini", input="hi")
+    assert client.responses.calls == 1
+    assert response.text == "answer 1"
+    assert usage["cache_hits"] == 1
+    assert request_key("responses.parse", "m", (), {"a": 1, "b": 2}) == request_key("responses.parse", "m", (), {"b": 2, "a": 1})
+    assert request_key("responses.parse", "m", (), {"a": 1}) != request_key("responses.create", "m", (), {"a": 1})
+
+
+def test_request_key_ignores_only_transport_options():
+    base = request_key("responses.create", "gpt-4o", (), {"input": "hi"})
+    assert request_key("responses.create", "gpt-4o", (), {"input": "hi", "timeout": 5,
+                                                          "extra_headers": {"X-Trace": "1"}}) == base
+    for extra in ({"extra_body": {"reasoning": {"effort": "high"}}}, {"extra_query": {"api-version": "2"}},
+                  {"store": True}, {"metadata": {"run": "a"}}):
+        assert request_key("responses.create", "gpt-4o", (), {"input": "hi", **extra}) != base
+
+
+class Exploit:
+    def __reduce__(self):
+        return (pytest.fail, ("a pickle from the cache file was loaded",))
+
+
+def test_sqlite_tier_never_unpickles_the_file(tmp_path, make_client):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path=path)
+    plain, model = make_client(), make_client(response=ModelResponse)
+    with OpenAIUsage(plain, cache=cache), OpenAIUsage(model, cache=cache):
+        # Not a pydantic model: kept in memory only
+        plain.responses.create(model="gpt-4o", input="plain")
+        model.responses.create(model="gpt-4o", input="hi")
+    cache.close()
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT count(*) FROM response_cache_json").fetchone() == (1,)
+        # Whoever can write the file cannot make the cache run code
+        conn.execute("UPDATE response_cache_json SET type = ?, value = ?",
+                     ("builtins:object", pickle.dumps(Exploit())))
+    client = make_client(response=ModelResponse)
+    with OpenAIUsage(client, cache=ResponseCache(path=path)) as usage:
+        client.responses.create(model="gpt-4o", input="hi")
+    assert client.responses.calls == 1 and "cache_hits" not in usage
+
+
+def test_async_scopes_keep_sqlite_off_the_event_loop(tmp_path, make_client):
+    class Cache(ResponseCache):
+        def get(self, key):
+            threads.add(threading.get_ident())
+            return super().get(key)
+
+    client = make_client(asynchronous=True, usage={"input_tokens": 1}, response=ModelResponse)
+    threads = set()
+
+    async def main():
+        async with AsyncOpenAIUsage(client, cache=Cache(path=str(tmp_path / "cache.db"))) as usage:
+            for _ in range(2):
+                await client.responses.create(model="gpt-4o", input="hi")
+        return usage
+
+    usage = asyncio.run(main())
+    assert usage["cache_hits"] == 1
+    assert threading.get_ident() not in threads and threads
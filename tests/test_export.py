@@ -0,0 +1,105 @@
+import json
+import sqlite3
+import threading
+
+from openai_usage.export import BLOCK, DROP_NEW, DROP_OLDEST, JSONLSink, SQLiteSink, UsageExporter
+from openai_usage.usage import CallRecord, OpenAIUsage
+
+
+def call(i):
+    return CallRecord("gpt-4o", "responses.create", float(i), 100, 0, 10, 0, 0.001, 0.5)
+
+
+def test_exporter_writes_jsonl_on_context_exit_with_rotation(tmp_path, make_client):
+    path = tmp_path / "usage.jsonl"
+    client = make_client(usage={"input_tokens": 100, "output_tokens": 10})
+    with UsageExporter(JSONLSink(str(path), max_bytes=2000, backup_count=20), batch_size=7) as exporter:
+        with OpenAIUsage(client, sinks=[exporter]):
+            for _ in range(50):
+                client.responses.create(model="gpt-4o")
+        # Flushed when the OpenAIUsage block exits
+        assert exporter.queue_depth == 0
+        assert exporter.metrics()["exported"] == 50
+
+    files = sorted(tmp_path.iterdir())
+    assert len(files) > 1
+    lines = [json.loads(line) for f in files for line in f.read_text().splitlines()]
+    assert len(lines) == 50
+    assert {line["model"] for line in lines} == {"gpt-4o"}
+    assert all(line["input_tokens"] == 100 for line in lines)
+
+
+def test_exporter_writes_sqlite_batches(tmp_path):
+    path = tmp_path / "usage.db"
+    with UsageExporter(SQLiteSink(str(path)), batch_size=100) as exporter:
+        for i in range(1000):
+            exporter.record(call(i))
+        exporter.flush()
+    conn = sqlite3.connect(str(path))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("SELECT COUNT(*), SUM(input_tokens) FROM usage").fetchone() == (1000, 100_000)
+
+
+class BlockedSink:
+    def __init__(self):
+        self.release = threading.Event()
+        self.written = []
+    def write(self, batch):
+        self.release.wait()
+        self.written.extend(batch)
+    def flush(self):
+        pass
+    def close(self):
+        pass
+
+
+def test_exporter_drop_policies_when_queue_is_full():
+    for policy in (DROP_NEW, DROP_OLDEST):
+        sink = BlockedSink()
+        exporter = UsageExporter(sink, max_queue=10, batch_size=1, policy=policy)
+        for i in range(100):
+            exporter.record(call(i))
+        assert exporter.dropped > 0
+        sink.release.set()
+        exporter.close()
+        assert exporter.dropped + len(sink.written) == 100
+        if policy == DROP_OLDEST:
+            assert sink.written[-1].timestamp == 99.0
+        else:
+            assert sink.written[0].timestamp == 0.0
+
+
+def test_exporter_drops_records_after_close():
+    for policy in (DROP_NEW, BLOCK):
+        sink = BlockedSink()
+        sink.release.set()
+        exporter = UsageExporter(sink, max_queue=2, batch_size=1, flush_interval=0.01, policy=policy)
+        exporter.record(call(0))
+        exporter.close()
+        for i in range(1, 6):
+            exporter.record(call(i))
+        exporter.flush()
+        assert len(sink.written) == 1 and exporter.dropped == 5
+
+
+class FailingSink:
+    def write(self, records):
+        raise OSError("disk full")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_exporter_logs_sink_failures_once_then_rate_limited(caplog):
+    with caplog.at_level("ERROR", logger="openai_usage.export"):
+        with UsageExporter(FailingSink(), batch_size=1) as exporter:
+            for i in range(20):
+                exporter.record(call(i))
+            exporter.flush()
+    assert exporter.metrics()["errors"] == 20
+    assert len(caplog.records) == 1
+    assert "disk full" in caplog.text
+    assert caplog.records[0].exc_info is not None
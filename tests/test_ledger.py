@@ -0,0 +1,68 @@
+import pytest
+
+from openai_usage.ledger import UsageLedger
+from openai_usage.usage import CallRecord, OpenAIUsage
+
+
+def call(i, model="gpt-4o", cost=None):
+    return CallRecord(model, "responses.create", 1000.0 + i, 10 * i, i, 2 * i, 0, i / 100.0 if cost is None else cost, 0.001 * i)
+
+
+LEDGER_USAGE = {
+    "input_tokens": 2000,
+    "input_tokens_details": {"cached_tokens": 500},
+    "output_tokens": 100,
+    "output_tokens_details": {"reasoning_tokens": 40},
+}
+
+
+def test_ledger_records_calls_from_openai_usage(make_client):
+    ledger = UsageLedger()
+    client = make_client(usage=LEDGER_USAGE, parse_usage={"input_tokens": 10, "output_tokens": 1})
+    with OpenAIUsage(client, sinks=[ledger]) as usage:
+        client.responses.create(model="o3")
+        client.responses.parse(model="gpt-4o-mini")
+
+    assert len(ledger) == 2
+    first, second = ledger.rows()
+    assert first["model"] == "o3" and first["endpoint"] == "responses.create"
+    assert (first["input_tokens"], first["cached_tokens"], first["output_tokens"], first["reasoning_tokens"]) == (2000, 500, 100, 40)
+    assert first["cost"] + second["cost"] == pytest.approx(usage["cost_total"])
+    assert first["latency"] >= 0
+    assert second["endpoint"] == "responses.parse"
+
+
+def test_ledger_ring_buffer_keeps_latest_calls():
+    ledger = UsageLedger(capacity=5)
+    for i in range(12):
+        ledger.record(call(i))
+    assert len(ledger) == 5
+    assert [row["timestamp"] for row in ledger.rows()] == [1007.0, 1008.0, 1009.0, 1010.0, 1011.0]
+
+
+def test_ledger_queries():
+    ledger = UsageLedger()
+    for i in range(1, 101):
+        ledger.record(call(i, model="o3" if i % 2 else "gpt-4o"))
+
+    top = ledger.top_k(3)
+    assert [row["cost"] for row in top] == [1.0, 0.99, 0.98]
+    assert ledger.top_k(1, by="input_tokens", model="o3")[0]["input_tokens"] == 990
+
+    assert ledger.percentile("input_tokens", 50) == pytest.approx(505.0)
+    assert ledger.percentile("output_tokens", 100, model="gpt-4o") == 200
+    assert ledger.percentile("cost", 99, model="unknown") is None
+
+    groups = ledger.group_by("model")
+    assert groups["o3"]["calls"] == groups["gpt-4o"]["calls"] == 50
+    assert groups["gpt-4o"]["input_tokens"] == sum(10 * i for i in range(2, 101, 2))
+    assert ledger.group_by("endpoint")["responses.create"]["calls"] == 100
+
+
+def test_ledger_overflow_values_go_to_other():
+    ledger = UsageLedger(1000)
+    for i in range(300):
+        ledger.record(call(i)._replace(endpoint=f"endpoint-{i}"))
+    groups = ledger.group_by("endpoint")
+    assert len(groups) == 256
+    assert groups["(other)"]["calls"] == 300 - 255
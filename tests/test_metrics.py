@@ -0,0 +1,55 @@
+import urllib.request
+
+from openai_usage.metrics import CONTENT_TYPE, UsageMetrics, start_http_server
+from openai_usage.usage import CallRecord, OpenAIUsage
+
+
+def call(model="gpt-4o", latency=0.3, ttft=None):
+    return CallRecord(model, "responses.create", 0.0, 100, 40, 20, 5, 0.25, latency, ttft)
+
+
+def test_render_counters_and_histograms():
+    metrics = UsageMetrics(labels={"service": "api"})
+    metrics.record(call())
+    metrics.record(call(latency=2.0, ttft=0.2))
+    metrics.labels(team='a"b').record(call("o3"))
+
+    text = metrics.render()
+    labels = 'service="api",model="gpt-4o",endpoint="responses.create"'
+    assert f"openai_requests_total{{{labels}}} 2" in text
+    assert f"openai_input_tokens_total{{{labels}}} 200" in text
+    assert f"openai_cost_dollars_total{{{labels}}} 0.5" in text
+    assert f'openai_request_duration_seconds_bucket{{{labels},le="0.5"}} 1' in text
+    assert f'openai_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"openai_request_duration_seconds_count{{{labels}}} 2" in text
+    assert f"openai_time_to_first_token_seconds_count{{{labels}}} 1" in text
+    assert 'openai_requests_total{service="api",team="a\\"b",model="o3",endpoint="responses.create"} 1' in text
+    assert "# TYPE openai_requests counter" in text
+    assert text.endswith("# EOF\n")
+
+
+def test_repeated_labels_calls_share_one_series():
+    metrics = UsageMetrics()
+    for _ in range(3):
+        metrics.labels(team="a").record(call())
+    text = metrics.render()
+    line = 'openai_requests_total{team="a",model="gpt-4o",endpoint="responses.create"}'
+    assert text.count(line) == 1
+    assert f"{line} 3" in text
+
+
+def test_metrics_sink_and_http_endpoint(make_client):
+    client = make_client(usage={"input_tokens": 3, "output_tokens": 7})
+    metrics = UsageMetrics()
+    with OpenAIUsage(client, sinks=[metrics]):
+        client.responses.create(model="gpt-4o")
+
+    server = start_http_server(metrics, port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'openai_output_tokens_total{model="gpt-4o",endpoint="responses.create"} 7' in body
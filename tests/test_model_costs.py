@@ -0,0 +1,129 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from openai_usage import model_costs
+from openai_usage.model_costs import (
+    MODEL_ALIASES,
+    MODEL_COST_PER_1K_TOKENS,
+    PRICING_INDEX,
+    PRICING_PATH,
+    ZERO_PRICE,
+    ModelPrice,
+    get_model_price,
+    pricing_version,
+    register_alias,
+    register_price,
+    reload_pricing,
+    reload_pricing_if_changed,
+    resolve_model,
+)
+
+
+@pytest.fixture
+def restore_pricing():
+    """
+    Undoes the aliases, registered prices and reloads of a test.
+    """
+    aliases = dict(MODEL_ALIASES)
+    registered = dict(model_costs._REGISTERED)
+    yield
+    MODEL_ALIASES.clear()
+    MODEL_ALIASES.update(aliases)
+    model_costs._REGISTERED.clear()
+    model_costs._REGISTERED.update(registered)
+    reload_pricing(PRICING_PATH)
+
+
+def test_pricing_index_matches_flat_table():
+    for key, per_1k in MODEL_COST_PER_1K_TOKENS.items():
+        if key.endswith("-completion"):
+            assert PRICING_INDEX[key[:-len("-completion")]].output == per_1k
+        elif key.endswith("-cached"):
+            assert PRICING_INDEX[key[:-len("-cached")]].cached_input == per_1k
+        else:
+            assert PRICING_INDEX[key].input == per_1k
+    assert PRICING_INDEX["gpt-4o"] == ModelPrice(0.0025, 0.00125, 0.01)
+    assert PRICING_INDEX["o1-pro"].cached_input is None
+
+
+def test_resolve_snapshots_and_fine_tunes():
+    # Exact names win over prefixes
+    assert resolve_model("gpt-4o-2024-05-13") == "gpt-4o-2024-05-13"
+    # Unlisted dated snapshots fall back to their model
+    assert resolve_model("gpt-4o-2025-06-01") == "gpt-4o"
+    assert resolve_model("gpt-4o-mini-2025-06-01") == "gpt-4o-mini"
+    assert resolve_model("gpt-4.1-nano-2026-01-01") == "gpt-4.1-nano"
+    assert resolve_model("gpt-4-turbo-0409") == "gpt-4-turbo"
+    # Fine-tune IDs
+    assert resolve_model("ft:gpt-4o-mini-2024-07-18:my-org::abc123") == "gpt-4o-mini-2024-07-18-finetuned"
+    assert resolve_model("curie:ft-my-org-2023-01-01-00-00-00") == "curie-finetuned-legacy"
+    # Unknown models stay unpriced
+    assert resolve_model("my-model") is None
+    assert get_model_price("my-model") == ZERO_PRICE
+
+
+def test_other_models_are_not_priced_as_their_namesakes(caplog):
+    # Distinct models and fine-tunes without a listed rate are never billed
+    # as the model their name starts with
+    for name in ("o3-pro", "o3-deep-research", "gpt-4o-transcribe", "gpt-4o-mini-tts",
+                 "ft:gpt-4o-2024-08-06:my-org::abc123", "ft:gpt-4.1-2025-04-14:my-org:custom:abc123",
+                 "text-davinci-003:ft-my-org-2023-01-01"):
+        assert resolve_model(name) is None
+        assert get_model_price(name) == ZERO_PRICE
+    assert "o3-pro" in caplog.text
+
+
+def test_register_alias_refreshes_memoized_lookups(restore_pricing):
+    assert get_model_price("prod-chat-deployment") == ZERO_PRICE
+    register_alias("prod-chat-deployment", "gpt-35-turbo-0125")
+    assert get_model_price("prod-chat-deployment") == PRICING_INDEX["gpt-35-turbo-0125"]
+
+
+def test_writes_to_the_flat_table_price_models(restore_pricing):
+    MODEL_COST_PER_1K_TOKENS["in-house-chat"] = 0.5
+    MODEL_COST_PER_1K_TOKENS["in-house-chat-completion"] = 1.5
+    assert get_model_price("in-house-chat") == ModelPrice(0.5, None, 1.5)
+    reload_pricing()
+    assert get_model_price("in-house-chat") == ModelPrice(0.5, None, 1.5)
+    del MODEL_COST_PER_1K_TOKENS["in-house-chat"], MODEL_COST_PER_1K_TOKENS["in-house-chat-completion"]
+    assert get_model_price("in-house-chat") == ZERO_PRICE
+
+
+def test_pricing_reload_from_data_file(tmp_path, restore_pricing):
+    path = tmp_path / "pricing.json"
+    path.write_text(json.dumps({"version": 99, "prices": {"gpt-4o": 1.0, "gpt-4o-completion": 2.0}}))
+    register_price("in-house-model", 0.5, 1.5)
+    assert reload_pricing(str(path)) == 99
+    assert pricing_version() == 99
+    assert get_model_price("gpt-4o-2024-08-06") == ModelPrice(1.0, None, 2.0)
+    assert "gpt-4o-mini" not in PRICING_INDEX
+    # Registered prices survive reloads
+    assert get_model_price("in-house-model") == ModelPrice(0.5, None, 1.5)
+    assert reload_pricing_if_changed() is False
+    path.write_text(json.dumps({"version": 100, "prices": {"gpt-4o": 3.0}}))
+    os.utime(path, (0, 0))
+    assert reload_pricing_if_changed() is True
+    assert get_model_price("gpt-4o").input == 3.0
+
+
+def test_restore_pricing_fixture_left_no_trace():
+    # Runs after the tests above, which registered an alias and a price
+    assert "prod-chat-deployment" not in MODEL_ALIASES
+    assert "in-house-model" not in PRICING_INDEX and "in-house-chat" not in PRICING_INDEX
+    assert get_model_price("in-house-model") == ZERO_PRICE
+    assert PRICING_INDEX["gpt-4o"] == ModelPrice(0.0025, 0.00125, 0.01)
+
+
+def test_import_does_not_load_sdk_or_prices():
+    code = (
+        "import sys, openai_usage.usage, openai_usage.model_costs as m; "
+        "assert 'openai' not in sys.modules and 'pydantic' not in sys.modules; "
+        "assert m._loaded is None; "
+        "assert m.get_model_price('gpt-4o').input == 0.0025"
+    )
+    src = os.path.join(os.path.dirname(__file__), "..", "src")
+    subprocess.run([sys.executable, "-c", code], check=True, env=dict(os.environ, PYTHONPATH=src))
@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import random
+
+import pytest
+
+from openai_usage.ratelimit import AdmissionController, RateLimitExceeded, estimate_tokens
+from openai_usage.usage import AsyncOpenAIUsage, OpenAIUsage
+
+TPM = 60_000
+RPM = 120
+ESTIMATED_TOKENS = 1000
+ACTUAL_TOKENS = 800
+LATENCY = 2.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SimulatedServer:
+    """
+    Token-bucket rate limited API. Like the real one, rejected requests still
+    count against the requests-per-minute limit.
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.tokens = float(TPM)
+        self.requests = float(RPM)
+        self.updated = 0.0
+        self.rejected = 0
+
+    def handle(self, tokens):
+        now = self.clock()
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(TPM, self.tokens + elapsed * TPM / 60.0)
+        self.requests = min(RPM, self.requests + elapsed * RPM / 60.0)
+        self.requests -= 1
+        if self.requests < 0 or self.tokens < tokens:
+            self.rejected += 1
+            return False
+        self.tokens -= tokens
+        return True
+
+
+def simulate(paced, workers=40, horizon=600.0):
+    clock = FakeClock()
+    server = SimulatedServer(clock)
+    limiter = AdmissionController({"gpt-4o": (TPM, RPM)}, max_wait=float("inf"), clock=clock)
+    rng = random.Random(1)
+    events = [(0.0, worker, 0, False) for worker in range(workers)]
+    completed = 0
+    while events:
+        t, worker, attempt, admitted = heapq.heappop(events)
+        if t > horizon:
+            break
+        clock.now = t
+        if paced and not admitted:
+            reservation = limiter.reserve("gpt-4o", ESTIMATED_TOKENS)
+            heapq.heappush(events, (t + reservation.wait, worker, attempt, reservation))
+            continue
+        if server.handle(ACTUAL_TOKENS):
+            completed += 1
+            if paced:
+                limiter.settle(admitted, ACTUAL_TOKENS)
+            heapq.heappush(events, (t + LATENCY, worker, 0, False))
+        else:
+            # SDK-style exponential backoff with jitter
+            backoff = min(0.5 * 2 ** attempt, 8.0) * (0.75 + rng.random() / 2)
+            heapq.heappush(events, (t + backoff, worker, attempt + 1, False))
+    return completed, server.rejected
+
+
+def test_paced_traffic_beats_unpaced_retries_on_simulated_server():
+    paced, paced_429s = simulate(paced=True)
+    unpaced, unpaced_429s = simulate(paced=False)
+    assert paced_429s == 0
+    assert unpaced_429s > 0
+    assert paced > unpaced
+    # Paced throughput sits close to what the server's token limit allows
+    assert paced >= 0.95 * (TPM / ACTUAL_TOKENS) * 10
+
+
+def test_admission_rejects_fast_and_settles_actual_usage():
+    clock = FakeClock()
+    limiter = AdmissionController({"o3": (10_000, 100)}, max_wait=1.0, clock=clock, sleep=clock.sleep)
+    first = limiter.reserve("o3", 9000)
+    assert first.wait == 0
+    # The API reported far fewer tokens than estimated: capacity comes back
+    limiter.settle(first, 1000)
+    assert limiter.reserve("o3", 8000).wait == 0
+    with pytest.raises(RateLimitExceeded):
+        limiter.reserve("o3", 9000)
+    assert limiter.rejected == 1
+    assert limiter.reserve("unlimited-model", 10 ** 9) is None
+
+
+def test_openai_usage_paces_calls_with_limiter(make_client):
+    clock = FakeClock()
+    limiter = AdmissionController({"gpt-4o": (100_000, 60)}, clock=clock, sleep=clock.sleep)
+    client = make_client(usage={"input_tokens": 50, "output_tokens": 50})
+    with OpenAIUsage(client, limiter=limiter) as usage:
+        for _ in range(63):
+            client.responses.create(model="gpt-4o", input="hello", max_output_tokens=100)
+    # 60 calls fit in the initial bucket, the next 3 wait one second each
+    assert clock.now == pytest.approx(3.0)
+    assert usage["input_tokens"] == 63 * 50
+
+
+def test_async_openai_usage_paces_calls_with_limiter(make_client):
+    client = make_client(asynchronous=True, usage={"input_tokens": 50, "output_tokens": 50})
+    limiter = AdmissionController({"gpt-4o": (100_000, 100)}, max_wait=0.0)
+
+    async def main():
+        async with AsyncOpenAIUsage(client, limiter=limiter):
+            results = await asyncio.gather(
+                *(client.responses.create(model="gpt-4o", input="x") for _ in range(150)),
+                return_exceptions=True,
+            )
+        return results
+
+    results = asyncio.run(main())
+    rejected = [r for r in results if isinstance(r, RateLimitExceeded)]
+    # 100 requests fit in the bucket; the rest fail locally instead of hitting the API
+    assert len(rejected) == 50
+    assert limiter.rejected == len(rejected)
+
+
+def test_reservations_are_returned_when_a_call_is_not_made_or_fails(make_client):
+    clock = FakeClock()
+    outer = AdmissionController({"gpt-4o": (10_000, 10)}, clock=clock, sleep=clock.sleep)
+    inner = AdmissionController({"gpt-4o": (10_000, 10)}, max_wait=0.0, clock=clock, sleep=clock.sleep)
+    inner.reserve("gpt-4o", 10_000)
+    client = make_client(usage={"input_tokens": 50, "output_tokens": 50})
+    with OpenAIUsage(client, limiter=outer):
+        with OpenAIUsage(client, limiter=inner):
+            for _ in range(20):
+                with pytest.raises(RateLimitExceeded):
+                    client.responses.create(model="gpt-4o", input="x", max_output_tokens=9000)
+    # The outer limiter got back every reservation the inner one turned down
+    assert outer.reserve("gpt-4o", 10_000).wait == 0
+
+    client = make_client(error=ConnectionError("reset"))
+    limiter = AdmissionController({"gpt-4o": (10_000, 100)}, max_wait=0.0, clock=clock, sleep=clock.sleep)
+    with OpenAIUsage(client, limiter=limiter):
+        for _ in range(5):
+            with pytest.raises(ConnectionError):
+                client.responses.create(model="gpt-4o", input="x", max_output_tokens=9000)
+    assert limiter.reserve("gpt-4o", 10_000).wait == 0
+
+
+def test_estimate_tokens():
+    assert estimate_tokens({"input": "x" * 400, "max_output_tokens": 50}) == 150
+    assert estimate_tokens({"input": [{"role": "user", "content": "hi"}]}) > 256
@@ -0,0 +1,81 @@
+import json
+
+from openai_usage.cli import main
+from openai_usage.report import report_files, split_lines
+
+
+def write_records(path, n):
+    with open(path, "w") as f:
+        for i in range(n):
+            model = ("gpt-4o", "o3")[i % 2]
+            usage = {"input_tokens": 100 + i, "input_tokens_details": {"cached_tokens": 0}, "output_tokens": 10}
+            if i % 3 == 0:
+                # Batch API output line
+                record = {"custom_id": f"req-{i}", "response": {"status_code": 200, "body": {"model": model, "usage": usage, "created_at": 1_700_000_000}}}
+            else:
+                record = {"model": model, "usage": usage, "created_at": 1_700_086_400, "metadata": {"tag": f"team-{i % 4}"}}
+            f.write(json.dumps(record) + "\n")
+        f.write("not json\n")
+
+
+def test_split_lines_covers_file_on_line_boundaries(tmp_path):
+    path = tmp_path / "usage.jsonl"
+    write_records(path, 100)
+    data = path.read_bytes()
+    ranges = split_lines(str(path), 7)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start and data[end - 1:end] == b"\n"
+
+
+def test_report_is_the_same_in_parallel_and_serial(tmp_path):
+    path = tmp_path / "usage.jsonl"
+    write_records(path, 1000)
+    serial = report_files([str(path)], group_by=("model", "day", "tag"), workers=1)
+    parallel = report_files([str(path)], group_by=("model", "day", "tag"), workers=3, chunk_size=4096)
+    assert serial.rows.keys() == parallel.rows.keys()
+    for key, row in serial.rows.items():
+        assert row[:4] == parallel.rows[key][:4]
+    assert serial.skipped == parallel.skipped == 1
+
+    by_model = report_files([str(path)], workers=1).rows
+    assert by_model[("gpt-4o",)][0] == 500
+    assert by_model[("gpt-4o",)][1] == sum(100 + i for i in range(0, 1000, 2))
+    assert by_model[("o3",)][7 - 4] == 500 * 10  # output_tokens
+
+
+def test_cli_report_json(tmp_path, capsys):
+    path = tmp_path / "usage.jsonl"
+    write_records(path, 12)
+    assert main(["report", str(path), "--group-by", "model,day", "--workers", "1", "--format", "json"]) == 0
+    rows = json.loads(capsys.readouterr().out)
+    assert {(r["model"], r["day"]) for r in rows} == {
+        ("gpt-4o", "2023-11-14"), ("gpt-4o", "2023-11-15"), ("o3", "2023-11-14"), ("o3", "2023-11-15"),
+    }
+    assert sum(r["calls"] for r in rows) == 12
+    assert all(r["cost_total"] > 0 for r in rows)
+
+
+def test_batch_output_lines_get_the_batch_discount(tmp_path):
+    usage = {"input_tokens": 1000, "input_tokens_details": {"cached_tokens": 0}, "output_tokens": 100}
+    plain = tmp_path / "plain.jsonl"
+    plain.write_text(json.dumps({"model": "gpt-4o", "usage": usage}) + "\n")
+    batch = tmp_path / "batch.jsonl"
+    batch.write_text(json.dumps({"custom_id": "a", "response": {"status_code": 200,
+                                                                "body": {"model": "gpt-4o", "usage": usage}}}) + "\n")
+    full = report_files([str(plain)], workers=1).rows[("gpt-4o",)]
+    discounted = report_files([str(batch)], workers=1).rows[("gpt-4o",)]
+    assert discounted[:4] == full[:4]
+    assert abs(discounted[7] - full[7] * 0.5) < 1e-12
+
+
+def test_list_and_dict_tags_are_grouped_as_json(tmp_path):
+    usage = {"input_tokens": 10, "output_tokens": 1}
+    path = tmp_path / "usage.jsonl"
+    with open(path, "w") as f:
+        for tag in (["a", "b"], ["a", "b"], {"team": "x"}, "plain"):
+            f.write(json.dumps({"model": "gpt-4o", "usage": usage, "created": 0, "metadata": {"tag": tag}}) + "\n")
+    rows = report_files([str(path)], group_by=("day", "tag"), workers=1).rows
+    assert {key: row[0] for key, row in rows.items()} == {
+        ("1970-01-01", '["a","b"]'): 2, ("1970-01-01", '{"team":"x"}'): 1, ("1970-01-01", "plain"): 1,
+    }
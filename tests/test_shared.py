@@ -0,0 +1,75 @@
+import multiprocessing
+import uuid
+
+import pytest
+
+from openai_usage.shared import SharedUsage
+from openai_usage.usage import CallRecord
+
+
+def call(model="gpt-4o", input_tokens=100, output_tokens=10, cost=0.5):
+    return CallRecord(model, "responses.create", 0.0, input_tokens, 20, output_tokens, 3, cost, 0.25)
+
+
+def _worker(name, model, calls):
+    shared = SharedUsage.attach(name)
+    for _ in range(calls):
+        shared.record(call(model))
+    shared.close()
+
+
+def _forked_worker(shared, calls):
+    # Inherited across fork: must claim its own shard, not the parent's
+    for _ in range(calls):
+        shared.record(call("o3"))
+
+
+@pytest.fixture
+def shared():
+    usage = SharedUsage(f"ou-test-{uuid.uuid4().hex[:12]}", max_processes=8, max_models=4)
+    yield usage
+    usage.close()
+    usage.unlink()
+
+
+def test_shared_usage_aggregates_across_processes(shared):
+    ctx = multiprocessing.get_context("fork")
+    shared.record(call("gpt-4o"))
+    processes = [ctx.Process(target=_worker, args=(shared.name, model, 200))
+                 for model in ("gpt-4o", "gpt-4o-mini", "gpt-4o")]
+    processes.append(ctx.Process(target=_forked_worker, args=(shared, 50)))
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0
+
+    snapshot = SharedUsage.attach(shared.name).snapshot()
+    assert snapshot["gpt-4o"]["calls"] == 401
+    assert snapshot["gpt-4o"]["input_tokens"] == 40100
+    assert snapshot["gpt-4o-mini"]["cost"] == pytest.approx(100.0)
+    assert snapshot["o3"]["calls"] == 50
+    assert shared.totals()["calls"] == 651
+
+
+def test_shared_usage_reuses_shards_of_exited_processes(shared):
+    ctx = multiprocessing.get_context("fork")
+    for _ in range(12):  # more processes than shards, one at a time
+        p = ctx.Process(target=_worker, args=(shared.name, "gpt-4o", 1))
+        p.start()
+        p.join()
+        assert p.exitcode == 0
+    assert shared.snapshot()["gpt-4o"]["calls"] == 12
+
+
+def test_shared_usage_limits_and_attach_errors(shared):
+    for i in range(6):
+        shared.record(call(f"model-{i}"))
+    shared.record(call("model-0"))
+    # Models beyond max_models - 1 share the last slot instead of failing
+    snapshot = shared.snapshot()
+    assert sorted(snapshot, key=str) == ["(other)", "model-0", "model-1", "model-2"]
+    assert snapshot["(other)"]["calls"] == 3
+    assert snapshot["model-0"]["calls"] == 2
+    with pytest.raises(ValueError):
+        SharedUsage.attach(None)  # type: ignore[arg-type]
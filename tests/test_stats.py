@@ -0,0 +1,108 @@
+import pytest
+
+from openai_usage.stats import LatencyHistogram, PromptCacheStats, UsageStats, prompt_fingerprint
+from openai_usage.usage import CallRecord, OpenAIUsage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def call(latency, model="gpt-4o", output_tokens=10, ttft=None):
+    return CallRecord(model, "responses.create", 0.0, 5, 0, output_tokens, 0, 0.0, latency, ttft)
+
+
+def test_histogram_percentiles_within_precision():
+    histogram = LatencyHistogram(precision=0.01)
+    for i in range(1, 1001):
+        histogram.record(i / 1000.0)
+
+    assert histogram.count == 1000
+    assert histogram.percentile(50) == pytest.approx(0.5, rel=0.01)
+    assert histogram.percentile(99) == pytest.approx(0.99, rel=0.01)
+    assert LatencyHistogram().percentile(50) is None
+    # Memory does not grow with the number of samples
+    assert len(histogram.counts) == len(LatencyHistogram(precision=0.01).counts)
+
+
+def test_rolling_window_rates_expire_old_seconds():
+    clock = FakeClock()
+    stats = UsageStats(window=10, clock=clock)
+    for _ in range(20):
+        stats.record(call(0.2, output_tokens=50))
+    clock.now += 5
+    for _ in range(10):
+        stats.record(call(2.0, output_tokens=100))
+
+    recent = stats.summary(last=5)
+    assert recent["calls"] == 10
+    assert recent["calls_per_second"] == pytest.approx(2.0)
+    assert recent["output_tokens_per_second"] == pytest.approx(200.0)
+    assert recent["latency_p50"] == pytest.approx(2.0, rel=0.02)
+
+    overall = stats.summary()
+    assert overall["calls"] == 30
+    assert overall["latency_p50"] == pytest.approx(0.2, rel=0.02)
+    assert overall["latency_p99"] == pytest.approx(2.0, rel=0.02)
+
+    clock.now += 20
+    assert stats.summary(last=10)["calls"] == 0
+
+
+def test_stats_sink_per_model_and_time_to_first_token():
+    stats = UsageStats()
+    stats.record(call(1.0, model="o3", ttft=0.3))
+    stats.record(call(0.1, model="gpt-4o-mini"))
+
+    assert sorted(stats.keys()) == [("gpt-4o-mini", "responses.create"), ("o3", "responses.create")]
+    o3 = stats.summary(model="o3")
+    assert o3["calls"] == 1
+    assert o3["time_to_first_token_p50"] == pytest.approx(0.3, rel=0.02)
+    assert stats.summary(model="gpt-4o-mini")["time_to_first_token_p50"] is None
+
+
+def test_stats_records_wrapped_calls(make_client):
+    client = make_client(usage={"input_tokens": 3, "output_tokens": 7})
+    stats = UsageStats()
+    with OpenAIUsage(client, sinks=[stats]):
+        client.responses.create(model="gpt-4o")
+        client.responses.create(model="gpt-4o")
+
+    summary = stats.summary(model="gpt-4o", endpoint="responses.create", last=60)
+    assert summary["calls"] == 2
+    assert summary["latency_p50"] is not None
+
+
+def test_prompt_cache_stats_per_model_and_prefix(make_client):
+    stable = "You are a support agent. " * 100
+
+    def usage(kwargs):
+        # The provider only finds the prefix cached when it is the same as last time
+        hit = kwargs["instructions"] == stable
+        return {"input_tokens": 3000, "input_tokens_details": {"cached_tokens": 2048 if hit else 0},
+                "output_tokens": 10}
+
+    client = make_client(usage=usage)
+    stats = PromptCacheStats(max_prefixes=2)
+    with OpenAIUsage(client, sinks=[stats]):
+        for i in range(4):
+            client.responses.create(model="gpt-4o", instructions=stable, input=f"question {i}")
+            client.responses.create(model="gpt-4o", instructions=f"Ticket {i}: " + stable, input="hi")
+
+    summary = stats.summary(model="gpt-4o")
+    assert summary["eligible_calls"] == 8
+    assert summary["hit_rate"] == 0.5
+    assert summary["token_hit_rate"] == pytest.approx(4 * 2048 / (8 * 3000))
+    assert summary["savings"] == pytest.approx(4 * 2048 / 1000.0 * (0.0025 - 0.00125))
+
+    # Each "Ticket i" prefix is new, so only the latest one and the stable one are kept
+    prefixes = stats.prefixes()
+    assert len(prefixes) == 2 and stats.evictions == 3
+    assert prefixes[0]["sample"].startswith("Ticket 3") and prefixes[0]["token_hit_rate"] == 0.0
+    assert prefixes[1]["calls"] == 4 and prefixes[1]["hit_rate"] == 1.0
+    assert prefixes[1]["fingerprint"] == prompt_fingerprint({"instructions": stable, "input": "other"})[0]
+    assert prompt_fingerprint({}) == (None, "")
@@ -0,0 +1,131 @@
+import asyncio
+
+from openai_usage.usage import AsyncOpenAIUsage, OpenAIUsage
+from openai_usage.streaming import UsageStream
+
+
+class Event:
+    def __init__(self, type, response=None):
+        self.type = type
+        self.response = response
+
+
+class FinalResponse:
+    def __init__(self, usage, model="gpt-4o-mini"):
+        self.usage = usage
+        self.model = model
+
+
+USAGE = {"input_tokens": 10, "output_tokens": 40, "total_tokens": 50}
+
+
+def make_events():
+    return [
+        Event("response.created"),
+        Event("response.output_text.delta"),
+        Event("response.output_text.delta"),
+        Event("response.completed", FinalResponse(USAGE)),
+    ]
+
+
+class Stream:
+    def __init__(self, **kwargs):
+        self.closed = False
+    def __iter__(self):
+        return iter(make_events())
+    def close(self):
+        self.closed = True
+
+
+def test_stream_passes_events_through_and_records_usage_at_end(make_client):
+    client = make_client(response=Stream)
+    with OpenAIUsage(client) as usage:
+        stream = client.responses.create(model="gpt-4o-mini", input="hi", stream=True)
+        assert isinstance(stream, UsageStream)
+        events = []
+        for event in stream:
+            # Nothing is recorded until the stream has ended
+            assert "output_tokens" not in usage
+            events.append(event.type)
+        assert events == [e.type for e in make_events()]
+        assert usage["output_tokens"] == 40
+        assert usage["cost_output_tokens"] == (40 / 1000.0) * 0.0006
+        assert stream.time_to_first_event is not None
+        assert stream.time_to_first_event <= stream.duration
+
+
+def test_stream_closed_early_records_once(make_client):
+    streams = []
+
+    def response(**kwargs):
+        streams.append(Stream())
+        return streams[-1]
+
+    client = make_client(response=response)
+    with OpenAIUsage(client) as usage:
+        with client.responses.create(model="gpt-4o-mini", stream=True) as stream:
+            next(stream)
+        stream.close()
+        assert streams[0].closed
+        # The final event never arrived, so there is no usage to record
+        assert usage == {}
+        assert stream.output_tokens_per_second is None
+
+
+def test_async_stream_records_usage_in_task_scope(make_client):
+    class AsyncStream:
+        def __init__(self):
+            self._events = iter(make_events())
+        def __aiter__(self):
+            return self
+        async def __anext__(self):
+            await asyncio.sleep(0.001)
+            try:
+                return next(self._events)
+            except StopIteration:
+                raise StopAsyncIteration
+        async def close(self):
+            pass
+
+    client = make_client(asynchronous=True, response=lambda **kwargs: AsyncStream())
+
+    async def main():
+        async with AsyncOpenAIUsage(client) as usage:
+            stream = await client.responses.create(stream=True)
+            async for _ in stream:
+                pass
+            return usage, stream
+
+    usage, stream = asyncio.run(main())
+    assert usage["input_tokens"] == 10
+    # Model comes from the final response when not passed explicitly
+    assert usage["cost_input_tokens"] == (10 / 1000.0) * 0.00015
+    assert stream.output_tokens_per_second > 0
+
+
+def test_stream_that_fails_or_is_dropped_is_still_finished(make_client):
+    from openai_usage.ratelimit import AdmissionController
+
+    def failing_events():
+        yield Event("response.created")
+        raise ConnectionError("reset mid-stream")
+
+    client = make_client(response=lambda **kwargs: failing_events())
+    limiter = AdmissionController({"gpt-4o-mini": (10_000, 100)}, max_wait=0.0)
+    with OpenAIUsage(client, limiter=limiter):
+        stream = client.responses.create(model="gpt-4o-mini", input="hi", max_output_tokens=9000, stream=True)
+        next(stream)
+        try:
+            next(stream)
+        except ConnectionError:
+            pass
+        assert isinstance(stream.error, ConnectionError)
+        assert stream.duration is not None
+    # The reservation was settled, giving the token estimate back
+    assert limiter.reserve("gpt-4o-mini", 10_000).wait == 0
+
+    finished = []
+    stream = UsageStream(iter(make_events()), finished.append, 0.0)
+    next(stream)
+    del stream
+    assert len(finished) == 1 and finished[0].usage is None
@@ -0,0 +1,196 @@
+import asyncio
+import gzip
+import json
+
+import httpx
+import pytest
+from openai import APIConnectionError, AsyncOpenAI, OpenAI
+
+from openai_usage.ratelimit import AdmissionController
+from openai_usage.transport import UsageTransport, parse_usage
+from openai_usage.usage import AsyncOpenAIUsage, OpenAIUsage
+
+CHAT_USAGE = {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+
+
+def handler(request):
+    path = request.url.path
+    if path.endswith("/embeddings"):
+        body = {"object": "list", "data": [{"object": "embedding", "index": 0, "embedding": [0.0]}],
+                "model": "text-embedding-3-small", "usage": {"prompt_tokens": 8, "total_tokens": 8}}
+    else:
+        body = {"id": "c", "object": "chat.completion", "created": 0, "model": "gpt-4o-2024-08-06",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "hi"}}],
+                "usage": CHAT_USAGE}
+    return httpx.Response(200, json=body)
+
+
+class StreamingTransport(httpx.BaseTransport):
+    """
+    Returns unread, gzip-encoded bodies like a real network transport.
+    """
+
+    def handle_request(self, request):
+        body = gzip.compress(json.dumps(handler(request).json()).encode())
+        return httpx.Response(200, headers={"content-type": "application/json", "content-encoding": "gzip"},
+                              stream=httpx.ByteStream(body))
+
+
+def make_client(transport):
+    return OpenAI(api_key="test", http_client=httpx.Client(transport=transport))
+
+
+def chat(client, model="gpt-4o"):
+    return client.chat.completions.create(model=model, messages=[{"role": "user", "content": "hi"}])
+
+
+def test_transport_mode_covers_every_endpoint():
+    client = make_client(StreamingTransport())
+
+    with OpenAIUsage(client, transport=True) as usage:
+        chat(client)
+        client.embeddings.create(model="text-embedding-3-small", input="hello")
+
+    assert usage["prompt_tokens"] == 108
+    assert usage["completion_tokens"] == 20
+    assert usage["cost_total"] > 0
+
+    # Outside the scope nothing is counted, and the hook stays installed
+    chat(client)
+    assert usage["prompt_tokens"] == 108
+    hook = client._client._transport
+    assert isinstance(hook, UsageTransport)
+    with OpenAIUsage(client, transport=True) as second:
+        chat(client)
+    assert client._client._transport is hook
+    assert second["prompt_tokens"] == 100
+
+
+def test_only_the_top_level_model_is_priced():
+    class Calls:
+        def __init__(self):
+            self.models = []
+
+        def record(self, call):
+            self.models.append(call.model)
+
+    calls = Calls()
+    client = make_client(httpx.MockTransport(handler))
+    with OpenAIUsage(client, transport=True, sinks=[calls]):
+        # The SDK writes input and metadata before the top-level model
+        client.responses.create(model="o3", input="hi", metadata={"model": "gpt-4.1-nano"})
+    assert calls.models == ["o3"]
+
+
+def test_no_active_scope_passes_responses_through_untouched():
+    seen = []
+
+    class Recorder(httpx.BaseTransport):
+        def handle_request(self, request):
+            response = StreamingTransport().handle_request(request)
+            seen.append((response, response.stream))
+            return response
+
+    client = make_client(Recorder())
+    with OpenAIUsage(client, transport=True):
+        chat(client)
+    chat(client)
+
+    # With a scope the body is observed; without one the transport's own
+    # stream is what httpx reads, so nothing runs per chunk.
+    (scoped, scoped_stream), (unscoped, unscoped_stream) = seen
+    assert type(scoped.stream._stream).__name__ == "_RecordingStream"
+    assert unscoped.stream._stream is unscoped_stream
+
+
+def test_parse_usage_from_event_streams():
+    chat_stream = (
+        b'data: {"choices":[{"delta":{"content":"hi"}}]}\n\n'
+        b'data: {"model":"gpt-4o","choices":[],"usage":{"prompt_tokens":3,"completion_tokens":1}}\n\n'
+        b"data: [DONE]\n\n"
+    )
+    assert parse_usage(chat_stream, True) == ({"prompt_tokens": 3, "completion_tokens": 1}, "gpt-4o")
+
+    responses_stream = (
+        b"event: response.completed\n"
+        b'data: {"type":"response.completed","response":{"model":"o3","usage":{"input_tokens":5}}}\n\n'
+    )
+    assert parse_usage(responses_stream, True) == ({"input_tokens": 5}, "o3")
+    assert parse_usage(b'{"data": []}', False) == (None, None)
+
+
+def test_async_transport_scopes_are_per_task():
+    async def main():
+        client = AsyncOpenAI(api_key="test", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+        async def handle(n):
+            async with AsyncOpenAIUsage(client, transport=True) as usage:
+                for _ in range(n):
+                    await client.chat.completions.create(model="gpt-4o", messages=[])
+            return usage["prompt_tokens"]
+
+        return await asyncio.gather(handle(1), handle(3))
+
+    assert asyncio.run(main()) == [100, 300]
+
+
+class ChunkedTransport(httpx.BaseTransport):
+    """
+    Streams a body in small chunks with the given headers.
+    """
+
+    def __init__(self, body, headers):
+        self.body = body
+        self.headers = headers
+
+    def handle_request(self, request):
+        chunks = [self.body[i:i + 7] for i in range(0, len(self.body), 7)]
+        return httpx.Response(200, headers=self.headers, stream=_Chunks(chunks))
+
+
+class _Chunks(httpx.SyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        yield from self.chunks
+
+
+def test_only_usage_lines_of_event_streams_are_kept():
+    events = b"".join(
+        b'data: {"id":"c","object":"chat.completion.chunk","created":0,"model":"gpt-4o","choices":[]}\n\n'
+        for _ in range(50)
+    ) + b'data: {"id":"c","object":"chat.completion.chunk","created":0,"model":"gpt-4o","choices":[],' \
+        b'"usage":{"prompt_tokens":3,"completion_tokens":1,"total_tokens":4}}\n\ndata: [DONE]\n\n'
+    headers = {"content-type": "text/event-stream", "content-encoding": "gzip"}
+    client = make_client(ChunkedTransport(gzip.compress(events), headers))
+    with OpenAIUsage(client, transport=True) as usage:
+        stream = client.chat.completions.create(model="gpt-4o", messages=[], stream=True)
+        call = stream.response.stream._stream._call
+        for _ in stream:
+            pass
+        assert call.chunks == [] and len(call.tail) < 100
+    assert usage["prompt_tokens"] == 3
+
+    audio = ChunkedTransport(b"\xff\xfb" * 1000, {"content-type": "audio/mpeg"})
+    client = make_client(audio)
+    with OpenAIUsage(client, transport=True) as usage:
+        with client.audio.speech.with_streaming_response.create(model="tts-1", voice="alloy", input="hi") as speech:
+            # Binary bodies are handed to the client untouched
+            assert type(speech.http_response.stream._stream).__name__ == "_Chunks"
+            assert len(speech.read()) == 2000
+    assert "prompt_tokens" not in usage
+
+
+def test_failed_requests_give_back_their_reservations():
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    client = OpenAI(api_key="test", max_retries=0, http_client=httpx.Client(transport=httpx.MockTransport(refuse)))
+    limiter = AdmissionController({"gpt-4o": (10_000, 100)}, max_wait=0.0)
+    with OpenAIUsage(client, transport=True, limiter=limiter):
+        for _ in range(5):
+            with pytest.raises(APIConnectionError):
+                client.chat.completions.create(model="gpt-4o", messages=[], max_tokens=9000)
+    assert limiter.reserve("gpt-4o", 10_000).wait == 0
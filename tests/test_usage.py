@@ -1,23 +1,16 @@
-from openai import OpenAI
-
-from openai_usage.usage import OpenAIUsage
-
-class DummyResponse:
-    def __init__(self, usage):
-        self.usage = usage
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 
-class DummyResponses:
-    def create(self, *args, **kwargs):
-        return DummyResponse({"token1": 1.0})
-    def parse(self, *args, **kwargs):
-        return DummyResponse({"token2": 2.0})
+import pytest
+from openai import OpenAI
+from openai.types.responses.response_usage import ResponseUsage
 
-class DummyClient:
-    def __init__(self):
-        self.responses = DummyResponses()
+from openai_usage.usage import AsyncOpenAIUsage, OpenAIUsage
 
-def test_openai_usage_collects_create_and_parse_usage():
-    client = DummyClient()
+def test_openai_usage_collects_create_and_parse_usage(make_client):
+    client = make_client(usage={"token1": 1.0}, parse_usage={"token2": 2.0})
     original_create = client.responses.create
     original_parse = client.responses.parse
 
@@ -28,38 +21,34 @@ def test_openai_usage_collects_create_and_parse_usage():
         assert resp_parse.usage == {"token2": 2.0}
         assert usage == {"token1": 1.0, "token2": 2.0}
 
-    # After context exit, methods should be restored to original
-    assert client.responses.create == original_create
-    assert client.responses.parse == original_parse
-def test_openai_usage_nested_usage():
-    class NestedDummyResponse:
-        def __init__(self, usage):
-            self.usage = usage
-
-    class NestedDummyResponses:
-        def create(self, *args, **kwargs):
-            # Simulate nested usage structure
-            return NestedDummyResponse({
-                "input_tokens": 11,
-                "input_tokens_details": {"cached_tokens": 0},
-                "output_tokens": 27,
-                "output_tokens_details": {"reasoning_tokens": 0},
-                "total_tokens": 38
-            })
-        def parse(self, *args, **kwargs):
-            return NestedDummyResponse({
-                "input_tokens": 5,
-                "input_tokens_details": {"cached_tokens": 2},
-                "output_tokens": 10,
-                "output_tokens_details": {"reasoning_tokens": 1},
-                "total_tokens": 15
-            })
-
-    class NestedDummyClient:
-        def __init__(self):
-            self.responses = NestedDummyResponses()
-
-    client = NestedDummyClient()
+    # After context exit, the wrappers stay installed and pass calls through
+    wrapped_create = client.responses.create
+    assert client.responses.create(prompt="again").usage == {"token1": 1.0}
+    assert usage == {"token1": 1.0, "token2": 2.0}
+    with OpenAIUsage(client) as again:
+        assert client.responses.create is wrapped_create
+        assert client.responses.create.__wrapped__ == original_create
+        assert client.responses.parse.__wrapped__ == original_parse
+        client.responses.create(prompt="hello")
+    assert again == {"token1": 1.0}
+def test_openai_usage_nested_usage(make_client):
+    # Simulate nested usage structure
+    client = make_client(
+        usage={
+            "input_tokens": 11,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": 27,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": 38
+        },
+        parse_usage={
+            "input_tokens": 5,
+            "input_tokens_details": {"cached_tokens": 2},
+            "output_tokens": 10,
+            "output_tokens_details": {"reasoning_tokens": 1},
+            "total_tokens": 15
+        },
+    )
     with OpenAIUsage(client) as usage:
         client.responses.create()
         client.responses.parse()
@@ -70,6 +59,225 @@ def test_openai_usage_nested_usage():
         assert usage["output_tokens_details.reasoning_tokens"] == 1
         assert usage["total_tokens"] == 53
     
+def test_openai_usage_response_usage_matches_dict_usage(make_client):
+    usage_fields = {
+        "input_tokens": 1200,
+        "input_tokens_details": {"cached_tokens": 300},
+        "output_tokens": 450,
+        "output_tokens_details": {"reasoning_tokens": 50},
+        "total_tokens": 1650,
+    }
+
+    client = make_client(usage=ResponseUsage(**usage_fields), parse_usage=usage_fields)
+    with OpenAIUsage(client) as typed_usage:
+        client.responses.create(model="gpt-4o", input="hi")
+    with OpenAIUsage(client) as dict_usage:
+        client.responses.parse(model="gpt-4o", input="hi")
+
+    assert typed_usage == dict_usage
+    assert typed_usage["input_tokens_details.cached_tokens"] == 300
+    # Cached tokens are billed at the cached rate, not as full-price input
+    assert typed_usage["cost_input_tokens"] == ((1200 - 300) / 1000.0) * 0.0025
+    assert typed_usage["cost_input_cached_tokens"] == (300 / 1000.0) * 0.00125
+    assert typed_usage["cost_output_tokens"] == (450 / 1000.0) * 0.01
+    assert typed_usage["cost"] == typed_usage["cost_total"]
+
+def test_async_openai_usage_per_task_scopes(make_client):
+    client = make_client(
+        asynchronous=True,
+        usage=lambda kwargs: {"input_tokens": kwargs["n"], "output_tokens": 1},
+        parse_usage=lambda kwargs: {"input_tokens": kwargs["n"], "output_tokens": 2},
+    )
+    original_create = client.responses.create
+
+    async def handler(n):
+        async with AsyncOpenAIUsage(client) as usage:
+            for _ in range(n):
+                await client.responses.create(n=n)
+            await client.responses.parse(n=n)
+            return dict(usage)
+
+    async def main():
+        async with AsyncOpenAIUsage(client) as total:
+            wrapped_create = client.responses.create
+            results = await asyncio.gather(*(handler(n) for n in range(1, 51)))
+            # Concurrent scopes share the one installed wrapper
+            assert client.responses.create is wrapped_create
+        return total, results
+
+    total, results = asyncio.run(main())
+    for n, usage in enumerate(results, start=1):
+        assert usage == {"input_tokens": n * n + n, "output_tokens": n + 2}
+    assert total["input_tokens"] == sum(n * n + n for n in range(1, 51))
+    assert total["output_tokens"] == sum(n + 2 for n in range(1, 51))
+    assert client.responses.create.__wrapped__ == original_create
+
+def test_usage_context_managers_reject_wrong_client_kind(make_client):
+    with pytest.raises(TypeError):
+        with OpenAIUsage(make_client(asynchronous=True)):
+            pass
+
+    async def main():
+        async with AsyncOpenAIUsage(make_client()):
+            pass
+
+    with pytest.raises(TypeError):
+        asyncio.run(main())
+
+def test_nested_scopes_record_once_and_roll_up(make_client):
+    client = make_client()
+
+    with OpenAIUsage(client, name="job") as job:
+        wrapper = client.responses.create
+        client.responses.create(model="gpt-4o")
+        with OpenAIUsage(client, name="step-1") as step1:
+            # Nesting reuses the installed wrapper instead of wrapping it again
+            assert client.responses.create is wrapper
+            client.responses.create(model="gpt-4o")
+            client.responses.create(model="gpt-4o")
+        with OpenAIUsage(client, name="step-2") as step2:
+            with OpenAIUsage(client, name="retry") as retry:
+                client.responses.create(model="gpt-4o-mini")
+            # Parents see the subtree totals before the block ends
+            assert job["input_tokens"] == 4000
+
+    assert client.responses.create is wrapper
+    assert step1["input_tokens"] == 2000
+    assert step2 == retry
+    assert job["input_tokens"] == 4000
+    assert job.own()["input_tokens"] == 1000
+    assert job["cost_total"] == pytest.approx(sum(s["cost_total"] for s in (step1, step2)) + job.own()["cost_total"])
+    assert [c["name"] for c in job.tree()["children"]] == ["step-1", "step-2"]
+
+    folded = job.folded().splitlines()
+    assert folded[0].startswith("job ")
+    assert folded[1].startswith("job;step-1 ")
+    assert folded[2].startswith("job;step-2;retry ")
+    assert len(folded) == 3
+    assert folded[1] == f"job;step-1 {round(step1['cost_total'] * 1e6)}"
+
+def test_nested_scopes_survive_out_of_order_exit(make_client):
+    client = make_client()
+    original_create = client.responses.create
+    outer = OpenAIUsage(client, name="outer")
+    inner = OpenAIUsage(client, name="inner")
+    outer_usage = outer.__enter__()
+    inner_usage = inner.__enter__()
+    outer.__exit__(None, None, None)
+    # The inner scope is still open and keeps counting, and rolls up into outer
+    client.responses.create(model="gpt-4o")
+    assert inner_usage["input_tokens"] == 1000
+    assert outer_usage["input_tokens"] == 1000
+    inner.__exit__(None, None, None)
+
+    assert client.responses.create.__wrapped__ == original_create
+    client.responses.create(model="gpt-4o")
+    assert outer_usage["input_tokens"] == 1000
+    assert client.responses.calls == 2
+
+def test_closed_scopes_leave_the_tree_as_summaries(make_client):
+    client = make_client()
+    with OpenAIUsage(client, name="server") as server:
+        for i in range(600):
+            with OpenAIUsage(client, name="request" if i % 2 else f"job-{i}"):
+                with OpenAIUsage(client, name="retry"):
+                    client.responses.create(model="gpt-4o")
+        # Reads no longer walk every scope ever opened
+        assert server.children == []
+        assert server["input_tokens"] == 600_000
+
+    tree = server.tree()
+    requests = next(c for c in tree["children"] if c["name"] == "request")
+    assert requests["scopes"] == 300 and requests["totals"]["input_tokens"] == 300_000
+    assert requests["children"][0]["name"] == "retry" and requests["children"][0]["scopes"] == 300
+    # Distinct names beyond the cap are summarized together
+    assert len(tree["children"]) == 256
+    other = tree["children"][-1]
+    assert other["name"] == "(other)" and other["scopes"] == 300 - 254
+    assert sum(c["totals"]["input_tokens"] for c in tree["children"]) == 600_000
+    assert server.folded().count("\n") == 256
+
+def test_failing_sink_does_not_lose_the_response(caplog, make_client):
+    class BrokenSink:
+        def record(self, call):
+            raise ValueError("full")
+
+    client = make_client()
+    with OpenAIUsage(client, sinks=[BrokenSink()]) as usage:
+        response = client.responses.create(model="gpt-4o")
+    assert response.usage["input_tokens"] == 1000
+    assert usage["input_tokens"] == 1000
+    assert usage["sink_errors"] == 1
+    assert "BrokenSink" in caplog.text
+
+def test_blocks_in_separate_threads_stay_separate(make_client):
+    client = make_client()
+    a_opened, b_opened, a_done = threading.Event(), threading.Event(), threading.Event()
+    results = {}
+
+    def thread_a():
+        with OpenAIUsage(client, exact_costs=True) as usage:
+            a_opened.set()
+            b_opened.wait()
+            client.responses.create(model="gpt-4o")
+        results["a"] = usage
+        a_done.set()
+
+    def thread_b():
+        a_opened.wait()
+        with OpenAIUsage(client) as usage:
+            b_opened.set()
+            a_done.wait()
+            client.responses.create(model="gpt-4o")
+            client.responses.create(model="gpt-4o")
+        results["b"] = usage
+
+    threads = [threading.Thread(target=thread_a), threading.Thread(target=thread_b)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results["a"]["input_tokens"] == 1000
+    assert results["b"]["input_tokens"] == 2000
+    assert not results["b"].exact
+
+def test_exact_costs_sum_as_integer_nanodollars(make_client):
+    client = make_client()
+
+    def calls(n):
+        for _ in range(n):
+            client.responses.create(model="gpt-4o-mini")
+
+    with OpenAIUsage(client, name="job", exact_costs=True) as job:
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(calls, [2500] * 4))
+        with OpenAIUsage(client, name="step") as step:
+            calls(10000)
+
+    # 1000 input tokens at 150 and 100 output tokens at 600 nano-dollars each
+    assert step.exact_total() == Decimal("2.1")
+    assert job.exact_total() == Decimal("4.2")
+    assert job.own()["cost_total"] == step["cost_total"] == 2.1
+    assert job["cost"] == job["cost_total"] == 4.2
+    assert job.exact_total("cost_output_tokens") == Decimal("1.2")
+    with OpenAIUsage(client) as inexact:
+        calls(1)
+    with pytest.raises(ValueError):
+        inexact.exact_total()
+    assert inexact["cost_total"] == pytest.approx(0.00021)
+
+def test_cached_tokens_priced_at_cached_rate_in_both_modes(make_client):
+    client = make_client(usage={"prompt_tokens": 2000, "prompt_tokens_details": {"cached_tokens": 1500},
+                                "completion_tokens": 0})
+    for exact in (False, True):
+        with OpenAIUsage(client, exact_costs=exact) as usage:
+            client.responses.create(model="gpt-4o")
+            # No cached rate: cached tokens are billed at the input rate
+            client.responses.create(model="o1-pro")
+        assert usage["cost_input_tokens"] == pytest.approx(0.5 * 0.0025 + 0.5 * 0.15)
+        assert usage["cost_input_cached_tokens"] == pytest.approx(1.5 * 0.00125 + 1.5 * 0.15)
+    assert usage.exact_total() == Decimal("0.30125") + Decimal("0.001875")
+
 def test_openai_client_usage_collection():
     openai_client = OpenAI()
     
@@ -154,4 +362,14 @@ def test_openai_client_usage_collection():
         assert usage["input_tokens_details.cached_tokens"] == resp_usage.input_tokens_details.cached_tokens + resp_usage2.input_tokens_details.cached_tokens
         assert usage["output_tokens"] == resp_usage.output_tokens + resp_usage2.output_tokens
         assert usage["output_tokens_details.reasoning_tokens"] == resp_usage.output_tokens_details.reasoning_tokens + resp_usage2.output_tokens_details.reasoning_tokens
-        assert usage["total_tokens"] == resp_usage.total_tokens + resp_usage2.total_tokens
\ No newline at end of file
+        assert usage["total_tokens"] == resp_usage.total_tokens + resp_usage2.total_tokens
+def test_model_argument_index_is_resolved_once_per_function():
+    from openai_usage.usage import _model_arg_index, _signature_model_index
+
+    class PositionalResponses:
+        def create(self, model, input=None):
+            pass
+
+    _signature_model_index.cache_clear()
+    assert [_model_arg_index(PositionalResponses().create) for _ in range(3)] == [0, 0, 0]
+    assert _signature_model_index.cache_info().misses == 1